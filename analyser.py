@@ -0,0 +1,107 @@
+'''
+Morphological analysis for ANALYSE.
+Every root and complex Fira form is stored in a trie, including the END and DERIVE endings (the words whose English
+starts with an underscore, e.g. _Feminine). A word is split into constituents by walking the trie from each position,
+keeping the best few segmentations that end at each position, so the work grows linearly with the word's length.
+'''
+import heapq
+from typing import Iterable, NamedTuple
+ # Local imports
+import search
+
+AFFIX_PREFIX = "_" # English words of END and DERIVE endings start with this
+SEPARATORS = "-' " # Skipped between constituents, as WITH JOIN commonly puts them there
+MIN_PARTIAL = 3 # Fewest characters of a word that count as a sliced constituent
+ # Costs used to rank segmentations. Lower is better
+SEGMENT_COST = 2
+PARTIAL_COST = 3 # Added to SEGMENT_COST for a constituent that was cut short by WITH SLICE or a capital END
+SEPARATOR_COST = 1
+ # Keys of trie nodes that aren't characters
+WORDS = 0 # English words whose Fira form ends at this node
+SHORTEST = 1 # (Fira, English) of the shortest word that starts with this node's prefix
+
+class Segment(NamedTuple):
+    '''One constituent of an analysed word.'''
+    fira: str # The part of the analysed word
+    eng: str # English word it was matched to. "" for a separator
+    partial: bool # Whether fira is only the start of the matched word's Fira form
+    others: int = 0 # How many other English words have the same Fira form
+
+    def english(self) -> str:
+        '''Returns the English word, marked with "~" if sliced and followed by the number of homographs, e.g. "sky (+2)".'''
+        return self.eng+("~" if self.partial else "")+(f" (+{self.others})" if self.others > 0 else "")
+
+class Analysis(NamedTuple):
+    '''One way of splitting a word into constituents.'''
+    cost: int
+    segments: tuple[Segment, ...]
+
+    def english(self) -> str:
+        '''Returns the constituents in English, e.g. "fire + _feminine".'''
+        return " + ".join(segment.english() for segment in self.segments if segment.eng != "")
+
+    def fira(self) -> str:
+        '''Returns the constituents in Fira, e.g. "ṟaş + ā".'''
+        return " + ".join(segment.fira for segment in self.segments if segment.eng != "")
+
+class Analyser:
+    '''Splits Fira words into the stored words they were built from.'''
+    def __init__(self, words: Iterable[tuple[str, str]]) -> None:
+        '''words are (English, Fira) pairs.'''
+        self.trie: dict = {}
+        self.size = 0
+        for word_eng, word_fira in words:
+            word_fira = search.normalise(str(word_fira)).lower()
+            if word_fira == "":
+                continue
+            node = self.trie
+            for char in word_fira:
+                node = node.setdefault(char, {})
+            node.setdefault(WORDS, []).append(word_eng)
+            self.size += 1
+        self._set_shortest(self.trie, "")
+
+    def _set_shortest(self, node: dict, prefix: str) -> tuple[str, str] | None:
+        '''Stores the shortest word under each node, for naming sliced constituents. Returns the one under node.'''
+        shortest = (prefix, node[WORDS][0]) if WORDS in node else None
+        for char, child in node.items():
+            if isinstance(char, str):
+                below = self._set_shortest(child, prefix+char)
+                if below is not None and (shortest is None or len(below[0]) < len(shortest[0])):
+                    shortest = below
+        node[SHORTEST] = shortest
+        return shortest
+
+    def _edges(self, word: str, start: int) -> Iterable[tuple[int, int, Segment]]:
+        '''Yields (end, cost, segment) for every constituent that can start at word[start].'''
+        if word[start] in SEPARATORS:
+            yield start+1, SEPARATOR_COST, Segment(word[start], "", False)
+        node = self.trie
+        for end in range(start+1, len(word)+1):
+            node = node.get(word[end-1])
+            if node is None:
+                return
+            part = word[start:end]
+            if WORDS in node:
+                 # Homographs are one segment, so that a common form doesn't multiply the segmentations
+                words = node[WORDS] if start > 0 else [word for word in node[WORDS] if not word.startswith(AFFIX_PREFIX)] # An ending can't start a word
+                if len(words) > 0:
+                    yield end, SEGMENT_COST, Segment(part, words[0], False, len(words)-1)
+            if WORDS not in node and end-start >= MIN_PARTIAL and part[-1] not in SEPARATORS:
+                yield end, SEGMENT_COST+PARTIAL_COST, Segment(part, node[SHORTEST][1], True)
+
+    def analyse(self, word: str, limit: int = 5) -> list[Analysis]:
+        '''Returns up to limit segmentations of word that use up every character, best first.'''
+        word = search.normalise(word).lower()
+        if word == "" or limit <= 0:
+            return []
+        best: list[list[Analysis]] = [[] for _ in range(len(word)+1)] # Best segmentations of word[:i]
+        best[0] = [Analysis(0, ())]
+        for start in range(len(word)):
+            if len(best[start]) == 0:
+                continue
+            for end, cost, segment in self._edges(word, start):
+                best[end].extend(Analysis(analysis.cost+cost, analysis.segments+(segment,)) for analysis in best[start])
+                if len(best[end]) > limit:
+                    best[end] = heapq.nsmallest(limit, best[end])
+        return [analysis for analysis in sorted(best[-1])[:limit] if analysis.english() != ""]
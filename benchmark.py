@@ -0,0 +1,217 @@
+'''
+Benchmarks for the FiraScript interpreter, run against synthetic lexicons.
+
+Usage:
+    python benchmark.py [--sizes 1000 10000 ...] [--samples N] [--output results.json]
+    python benchmark.py --generate lexicon.fira --sizes 100000
+    python benchmark.py --compare old.json new.json
+'''
+ # Library imports
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from zemia import sql
+ # Local imports
+import fs_errors as Fs
+from fs import FiraScript
+
+DEFAULT_SIZES = [1000, 10000] # 100000 and 1000000 are supported but take a while
+CONSONANTS = "bcdfklmnprstvyzçłṉṟşƶ"
+VOWELS = "aeiouāēīōū"
+PREAMBLE = [ # Suffixes and digits that the generated DEFROOT/DEFWORD/DEFNUM lines rely on
+    "DEFROOT _feminine a", "DEFROOT _masculine ī", "DEFROOT _neutral ū", "DEFROOT _plural o", "DEFROOT _verb e",
+    "DEFROOT _instance v", "DEFROOT _object p", "DEFROOT _place iamī", "DEFROOT _subject ş",
+    "DEFROOT Zero Pū", "DEFROOT One Şū", "DEFROOT Two Ładū", "DEFROOT Three Puivū", "DEFROOT Four Ştū",
+    "DEFROOT Five Cavū", "DEFROOT Six Łislū", "DEFROOT Seven Şimū", "DEFROOT Eight Devyū", "DEFROOT Nine Ṉonū",
+    "DEFROOT And Veƶ",
+]
+
+def _fira_word(rng: random.Random) -> str:
+    '''Returns a random word made of 1-3 CV/CVC syllables.'''
+    word = ""
+    for _ in range(rng.randint(1, 3)):
+        word += rng.choice(CONSONANTS)+rng.choice(VOWELS)
+        if rng.random() < 0.3:
+            word += rng.choice(CONSONANTS)
+    return word
+
+def _eng_word(index: int, rng: random.Random) -> str:
+    '''Returns a unique English name, sometimes with a space so it has to be [bracketed].'''
+    if rng.random() < 0.1:
+        return f"[w{index} phrase]"
+    return f"w{index}"
+
+def generate_lines(size: int, seed: int = 0):
+    '''Yields the lines of a synthetic .fira lexicon defining roughly size words.
+    About 60% are DEFROOT, 32% DEFWORD (concatenation, WITH SLICE/JOIN/DERIVE, END and NOTE) and 8% DEFNUM.'''
+    rng = random.Random(seed)
+    yield from PREAMBLE
+    words: list[str] = [] # English names of words defined so far, for DEFWORD to build on
+    next_number = 10
+    for i in range(size):
+        roll, word_eng = rng.random(), _eng_word(i, rng)
+        if roll < 0.6 or len(words) < 10:
+            line = f"DEFROOT {word_eng} {_fira_word(rng)}"
+            if rng.random() < 0.4:
+                line += f" END {rng.choice('mfnp')}"
+            if rng.random() < 0.1:
+                line += f" NOTE [Generated root {i}]"
+        elif roll < 0.92:
+            line = f"DEFWORD {word_eng} FROM"
+            kind = rng.random()
+            if kind < 0.25:
+                line += f" {rng.choice(words)} {rng.choice(words)}"
+            elif kind < 0.5:
+                line += f" {rng.choice(words)} {rng.choice(words)} WITH SLICE 0 -1 1 0"
+            elif kind < 0.75:
+                line += f" {rng.choice(words)} {rng.choice(words)} WITH JOIN [-]"
+            else:
+                line += f" {rng.choice(words)} WITH DERIVE {rng.choice('isopv')}"
+            if rng.random() < 0.3:
+                line += f" END {rng.choice('mfnp')}"
+            if rng.random() < 0.1:
+                line += f" NOTE [Generated word {i}]"
+        else:
+            next_number += rng.randint(1, 97)
+            line, word_eng = f"DEFNUM n{next_number} {next_number}", ""
+        if word_eng != "":
+            words.append(word_eng)
+        yield line
+
+def generate_lexicon(path: str, size: int, seed: int = 0) -> None:
+    '''Writes a synthetic lexicon of roughly size words to path.'''
+    with open(path, "w", encoding="utf-8") as f:
+        for line in generate_lines(size, seed):
+            f.write(line+"\n")
+
+def percentiles(timings: list[float]) -> dict[str, float]:
+    '''Summarises a list of latencies (in seconds) as throughput and percentiles in milliseconds.'''
+    if len(timings) == 0:
+        return {}
+    ordered = sorted(timings)
+    def pick(fraction: float) -> float:
+        return ordered[min(len(ordered)-1, int(fraction*len(ordered)))]*1000
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "ops_per_sec": len(ordered)/total if total > 0 else 0.0,
+        "p50_ms": pick(0.5), "p90_ms": pick(0.9), "p99_ms": pick(0.99), "max_ms": ordered[-1]*1000,
+    }
+
+def _time_commands(fira: FiraScript, lines: list[str]) -> dict[str, float]:
+    '''Runs each line through decode and returns the percentiles of how long each took, and how many failed.
+    FiraScript errors (e.g. a word deleted earlier) are timed too, as they are expected of random samples.'''
+    timings, failures = [], 0
+    for line in lines:
+        start = time.perf_counter()
+        try:
+            fira.instructions.decode(line)
+        except Fs.FSError:
+            failures += 1
+        timings.append(time.perf_counter()-start)
+    return {**percentiles(timings), "failures": failures}
+
+def run_size(size: int, samples: int, seed: int = 0) -> dict[str, dict]:
+    '''Benchmarks READ, TRANSLATE, LISTWORDS, ANALYSE, UPDATE and DELETE on a lexicon of the given size.'''
+    rng = random.Random(seed)
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w", encoding="utf-8") as devnull:
+        lexicon_path = os.path.join(folder, "lexicon.fira")
+        generate_lexicon(lexicon_path, size, seed)
+        connection = sql.connect(os.path.join(folder, "bench.db"))
+        fira = FiraScript(FiraScript.create_tables(connection), connection)
+        fira.instructions.output = devnull
+
+        start = time.perf_counter()
+        fira.instructions.decode(f"READ {lexicon_path}") # Every later timing is meaningless if this fails
+        elapsed = time.perf_counter()-start
+        results["READ"] = {"lines": size+len(PREAMBLE), "seconds": elapsed, "lines_per_sec": (size+len(PREAMBLE))/elapsed}
+
+        roots = [row[0] for row in fira.instructions.repo.list_words("root", ["wordEng"])]
+        every_word = roots+[row[0] for row in fira.instructions.repo.list_words("complex", ["wordEng"])]
+        def sample(population: list[str]) -> list[str]:
+            return [f"[{word}]" if " " in word else word for word in rng.choices(population, k=samples)]
+
+        results["TRANSLATE"] = _time_commands(fira, [f"TRANSLATE {word} TO f" for word in sample(every_word)])
+        results["TRANSLATE"]["cache"] = fira.instructions.cache.stats()
+        results["LISTWORDS"] = _time_commands(fira, [f"LISTWORDS {word}" for word in sample(every_word)])
+        results["LISTWORDS PREFIX"] = _time_commands(fira, [f"LISTWORDS {word.split()[0][:3]} MATCH PREFIX LIMIT 20"
+                                                             for word in rng.choices(every_word, k=samples)])
+        fira_words = [row[0] for row in fira.instructions.repo.list_words("root", ["wordFira"])]
+        results["ANALYSE"] = _time_commands(fira, [f"ANALYSE {''.join(rng.choices(fira_words, k=3))}" for _ in range(samples)])
+        results["UPDATE"] = _time_commands(fira, [f"UPDATE {word} {''.join(rng.choices(CONSONANTS+VOWELS, k=4))}" for word in sample(roots)])
+        results["DELETE"] = _time_commands(fira, [f"DELETE {word}" for word in sample(every_word)])
+        connection.close()
+    return results
+
+def _git_commit() -> str:
+    '''Returns the current commit hash, or "" if it can't be found.'''
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def compare(old_path: str, new_path: str) -> None:
+    '''Prints the change in throughput for each size and operation between two result files.'''
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{old.get('commit', '')[:8] or old_path} -> {new.get('commit', '')[:8] or new_path}")
+    for size, operations in new["results"].items():
+        for operation, stats in operations.items():
+            key = "lines_per_sec" if operation == "READ" else "ops_per_sec"
+            before = old["results"].get(size, {}).get(operation, {}).get(key)
+            if before is None or key not in stats:
+                continue
+            change = (stats[key]-before)/before*100 if before else 0.0
+            print(f"{size:>8} {operation:<10} {before:>12.1f} -> {stats[key]:>12.1f} {key} ({change:+.1f}%)")
+
+def main(argv: list[str] = None) -> None:
+    '''Command line entry point.'''
+    parser = argparse.ArgumentParser(description="Benchmark the FiraScript interpreter on synthetic lexicons.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Number of words in each lexicon.")
+    parser.add_argument("--samples", type=int, default=1000, help="Commands timed per operation.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="", help="Where to save the results as JSON.")
+    parser.add_argument("--generate", default="", help="Only write a lexicon of the first size to this path.")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files.")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.generate:
+        generate_lexicon(args.generate, args.sizes[0], args.seed)
+        return
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split(" ")[0],
+        "platform": platform.platform(),
+        "samples": args.samples,
+        "results": {},
+    }
+    for size in args.sizes:
+        print(f"Benchmarking {size} words ...", file=sys.stderr)
+        report["results"][str(size)] = run_size(size, args.samples, args.seed)
+        for operation, stats in report["results"][str(size)].items():
+            if stats.get("failures", 0) > 0:
+                print(f"{stats['failures']} of {stats['count']} {operation} commands failed.", file=sys.stderr)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
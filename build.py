@@ -0,0 +1,272 @@
+'''
+Parallel builds of lexicons made of definitions.
+Files that only use DEFROOT, DEFWORD and DEFNUM are built without running their lines one at a time:
+    1. The lines are parsed and compiled into derivation plans by a pool of worker processes, a chunk at a time.
+    2. Each definition is put in the wave after the last wave that defines a word it uses, so a wave only uses words
+       from earlier waves. The waves are evaluated in order. Large waves are split across the pool, each chunk sent
+       with the forms of the words it uses, and the workers look them up, resolve and assemble the definitions.
+    3. The rows are written in file order by the one connection, in one transaction.
+Words already in the database are looked up and the rows written in the main process, so more jobs only speed up the
+parsing and the large waves. With one CPU, jobs=1 is fastest, as the workers only add the cost of sending them work.
+A word is looked up as TRANSLATE would have at that line: only definitions from earlier lines (or already in the
+database) are seen, root words come before complex words, and the smallest Fira form wins, as it does in the index.
+So the database ends up exactly as if the files had been READ in order. Files that use other instructions are READ.
+
+Usage:
+    python build.py --db lexicon.db words.fira [more.fira ...] [--jobs N]
+'''
+ # Library imports
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Iterable
+ # Local imports
+import derivation
+import fs_errors as Fs
+import fs_parser
+import numerals
+from derivation import DerivationPlan
+from repository import LexiconRepository, WORD_TABLES
+
+CHUNK_SIZE = 4096 # Lines (or definitions) sent to a worker at a time
+PARALLEL_WAVE = 16384 # Smaller waves are evaluated here, as sending them to the workers would take longer
+NUMERAL_WORDS = [word.lower() for word in numerals.DIGIT_WORDS+[numerals.AND_WORD]] # Used by every DEFNUM
+NUMERIC = re.compile(r"\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*") # Text that SQLite would store as a number
+
+class Lexicon:
+    '''The Fira forms of each English word while files are built, to look words up as they were at each line.'''
+    def __init__(self, repo: LexiconRepository | None) -> None:
+        self.repo = repo
+        self.defined: dict[str, dict[str, list[tuple[int, str]]]] = {table_key: {} for table_key in WORD_TABLES} # word: [(index, form)]
+        self._stored: dict[tuple[str, str], str | None] = {} # Smallest form of each word already in the database
+        self._empty = {table_key: repo is None or repo.list_words(table_key, ["wordEng"], limit=1).fetchone() is None for table_key in WORD_TABLES}
+
+    def add(self, table_key: str, word: str, index: int, form: str) -> None:
+        '''Records that the definition at index gave word a form.'''
+        self.defined[table_key].setdefault(word, []).append((index, form))
+
+    def _stored_form(self, table_key: str, word: str) -> str | None:
+        '''Returns the smallest form a word had in the database before the build, or None.'''
+        if self._empty[table_key]: # Building into a new table, so there is nothing to look up
+            return None
+        if (table_key, word) not in self._stored:
+            stored = self.repo.lookup_by_eng(table_key, word)
+            self._stored[(table_key, word)] = stored[0] if len(stored) > 0 else None
+        return self._stored[(table_key, word)]
+
+    def lookup(self, word: str, index: int) -> str:
+        '''Returns what TRANSLATE <word> TO f would have returned at the definition at index. Raises FSSyntaxError if nothing.'''
+        key = word.lower()
+        for table_key in WORD_TABLES: # Root words first
+            forms = [form for defined_at, form in self.defined[table_key].get(key, []) if defined_at < index]
+            stored = self._stored_form(table_key, key)
+            if stored is not None:
+                forms.append(stored)
+            if len(forms) > 0:
+                return min(forms) # The first row of the (wordEng, wordFira) index
+        raise Fs.FSSyntaxError(f"TRANSLATE ERROR: No translation found for 「{word} TO f」.")
+
+    def subset(self, words: Iterable[str]) -> "Lexicon":
+        '''Returns a Lexicon of only the lowercase words given, without the repository, to be sent to a worker.'''
+        lexicon = Lexicon(None)
+        for word in dict.fromkeys(words):
+            for table_key in WORD_TABLES:
+                if word in self.defined[table_key]:
+                    lexicon.defined[table_key][word] = self.defined[table_key][word]
+                lexicon._stored[(table_key, word)] = self._stored_form(table_key, word)
+        lexicon._empty = dict(self._empty)
+        return lexicon
+
+def _compile_lines(lines: list[str]) -> list:
+    '''Parses and compiles a chunk of lines. Each line becomes a DerivationPlan, None if it does nothing, an FSError if
+    it is invalid, or its instruction if it has to be READ.'''
+    compiled = []
+    for line in lines:
+        command = fs_parser.parse_line(line)
+        if command.error != "":
+            compiled.append(Fs.FSSyntaxError(command.error))
+        elif command.instruction in ["", "#"]:
+            compiled.append(None)
+        elif command.instruction not in derivation.SUBCOMMANDS or (command.instruction == "DEFNUM" and command.params[:1] == ("RANGE",)):
+            compiled.append(command.instruction)
+        else:
+            try:
+                compiled.append(derivation.compile_params(command.instruction, command.params))
+            except Fs.FSError as e:
+                compiled.append(e)
+    return compiled
+
+def _evaluate_definitions(lexicon: Lexicon, definitions: list[tuple[int, DerivationPlan]]) -> list:
+    '''Looks up the words that (index, plan) definitions from one wave use and builds their Fira forms. Each becomes its
+    form, or the FSError it raised.'''
+    forms = []
+    for index, plan in definitions:
+        try:
+            forms.append(derivation.assemble(plan, derivation.resolve(plan, lambda word, index=index: lexicon.lookup(word, index))))
+        except Fs.FSError as e:
+            forms.append(e)
+    return forms
+
+def _evaluate_chunk(chunk: tuple[Lexicon, list[tuple[int, tuple]]]) -> list:
+    '''Evaluates a chunk of definitions in a worker. Plans are sent as plain tuples, which pickle much faster.'''
+    lexicon, definitions = chunk
+    return _evaluate_definitions(lexicon, [(index, DerivationPlan._make(fields)) for index, fields in definitions])
+
+def _map_chunks(pool: Executor | None, function, items: list) -> list:
+    '''Runs function over items a chunk at a time, on the pool if there is one, and joins the results in order.'''
+    chunks = [items[start:start+CHUNK_SIZE] for start in range(0, len(items), CHUNK_SIZE)]
+    results = pool.map(function, chunks) if pool is not None else map(function, chunks)
+    return [result for chunk in results for result in chunk]
+
+def _uses(plan: DerivationPlan) -> list[str]:
+    '''Returns the lowercase English words a definition looks up.'''
+    match plan.instruction:
+        case "DEFNUM":
+            return NUMERAL_WORDS
+        case "DEFROOT":
+            return [ending.lower() for ending, _ in plan.endings]
+    return [word.lower() for word in dict.fromkeys(plan.dependencies)]
+
+def _load(paths: list[str], pool: Executor | None) -> tuple[list[str], list[tuple[str, int]], list] | None:
+    '''Reads and compiles the files. Returns their lines, the (file, line number) of each and what each compiled to,
+    or None if the files have to be READ instead.'''
+    lines, sources = [], []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                text = f.read().decode("utf-8")
+        except FileNotFoundError as e:
+            raise Fs.FSSyntaxError(f"READ ERROR: File not found: 「{path}」.") from e
+        except UnicodeDecodeError as e:
+            raise Fs.FSOSError(f"READ ERROR: File is not valid UTF-8: 「{path}」.") from e
+        file_lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n") # As fs_parser.parse splits them
+        lines += file_lines
+        sources += [(path, line_number) for line_number in range(1, len(file_lines)+1)]
+    compiled = _map_chunks(pool, _compile_lines, lines)
+    for item in compiled:
+        if isinstance(item, str): # Another instruction, whose effects depend on the order lines run in
+            return None
+        if isinstance(item, DerivationPlan) and NUMERIC.fullmatch(item.word_fira):
+            return None # Would be stored as a number
+    return lines, sources, compiled
+
+def _waves(compiled: list) -> list[list[int]] | None:
+    '''Groups the definitions into waves. Every word a definition uses is defined in an earlier wave (or not in the files).
+    Returns None if a definition uses a number, as numbers are looked up in the number table instead.'''
+    waves: list[list[int]] = []
+    last_wave: dict[str, int] = {} # Latest wave of any definition of each word so far
+    for index, plan in enumerate(compiled):
+        if not isinstance(plan, DerivationPlan):
+            continue
+        uses = _uses(plan)
+        if any(word.isdigit() for word in uses):
+            return None
+        wave = 1+max((last_wave.get(word, -1) for word in uses), default=-1)
+        if plan.instruction != "DEFNUM": # Numbers aren't looked up by name
+            word = plan.word_eng.lower()
+            last_wave[word] = max(last_wave.get(word, -1), wave)
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(index)
+    return waves
+
+def _evaluate(compiled: list, waves: list[list[int]], lexicon: Lexicon, pool: Executor | None) -> dict[int, str | Fs.FSError]:
+    '''Evaluates the definitions wave by wave. Returns {index: Fira form, or the FSError the definition raised}.'''
+    forms: dict[int, str | Fs.FSError] = {}
+    for wave in waves:
+        definitions = [(index, compiled[index]) for index in wave]
+        if pool is None or len(definitions) < PARALLEL_WAVE:
+            evaluated = _evaluate_definitions(lexicon, definitions)
+        else: # Each chunk only takes the forms of the words it uses
+            chunks = [definitions[start:start+CHUNK_SIZE] for start in range(0, len(definitions), CHUNK_SIZE)]
+            subsets = [lexicon.subset(word for _, plan in chunk for word in _uses(plan)) for chunk in chunks]
+            sent = [[(index, tuple(plan)) for index, plan in chunk] for chunk in chunks]
+            evaluated = [form for forms_chunk in pool.map(_evaluate_chunk, zip(subsets, sent)) for form in forms_chunk]
+        for (index, plan), form in zip(definitions, evaluated):
+            forms[index] = form
+            if plan.instruction != "DEFNUM" and isinstance(form, str):
+                lexicon.add("root" if plan.instruction == "DEFROOT" else "complex", plan.word_eng.lower(), index, form.lower())
+    return forms
+
+def _read_each(instructions, paths: list[str]) -> int:
+    '''READs the files in order, for files that can't be built in parallel. Returns -1, as the definitions aren't counted.'''
+    for path in paths:
+        if instructions.read([path]):
+            break
+    return -1
+
+def build(instructions, paths: list[str], jobs: int = 1) -> int:
+    '''Builds the definitions in .fira files into the instructions' database with jobs worker processes, reading the
+    files as usual if they use other instructions. Raises the error a READ of the files would have raised at the first
+    invalid line, writing nothing. Returns the number of definitions written, or -1 if the files were READ.'''
+    paths = [path if re.search(".fira$", path) else f"{path}.fira" for path in paths]
+    if len(instructions.chain) > 1: # Lexicon only knows how words are looked up in one namespace
+        return _read_each(instructions, paths)
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        loaded = _load(paths, pool)
+        waves = _waves(loaded[2]) if loaded is not None else None
+        if waves is None:
+            return _read_each(instructions, paths)
+        lines, sources, compiled = loaded
+        forms = _evaluate(compiled, waves, Lexicon(instructions.repo), pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if any(isinstance(form, str) and NUMERIC.fullmatch(form) for form in forms.values()):
+        return _read_each(instructions, paths) # A word that looks like a number would be stored as one
+
+    for index, item in enumerate(compiled): # The first error is the one READ would have stopped at
+        error = forms.get(index) if isinstance(item, DerivationPlan) else item
+        if isinstance(error, Fs.FSSyntaxError):
+            path, line_number = sources[index]
+            raise Fs.FSSyntaxError(f"READ ERROR: Error in file 「{path}」 at line {line_number}: {error}") from error
+        if isinstance(error, Fs.FSError):
+            raise error
+
+     # Write the rows in file order, so that they are stored as READ would have stored them
+    repo = instructions.repo
+    repo.begin()
+    try:
+        for index in sorted(forms):
+            plan, form = compiled[index], forms[index].lower()
+            match plan.instruction:
+                case "DEFROOT":
+                    repo.insert("root", plan.word_eng.lower(), form, plan.note)
+                case "DEFWORD":
+                    repo.insert("complex", plan.word_eng.lower(), form, lines[index], plan.note)
+                    for dependency in dict.fromkeys(dependency.lower() for dependency in plan.dependencies):
+                        repo.insert("deps", dependency, plan.word_eng.lower())
+                case "DEFNUM":
+                    repo.insert("num", plan.value, plan.word_eng.lower(), form, plan.note)
+    except Exception:
+        repo.rollback()
+        raise
+    finally:
+        instructions.cache.clear()
+    repo.commit()
+    return len(forms)
+
+
+if __name__ == "__main__":
+    from fs import FiraScript
+    parser = argparse.ArgumentParser(description="Builds .fira files of definitions into a database in parallel.")
+    parser.add_argument("files", nargs="+", help=".fira files to build, in order")
+    parser.add_argument("--db", default="fira.db", help="database file to build into (default: fira.db)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
+    fira_instructions = FiraScript.open_instructions(args.db)
+    start = time.perf_counter()
+    try:
+        count = build(fira_instructions, args.files, args.jobs)
+    except Fs.FSError as e:
+        sys.exit(str(e))
+    finally:
+        fira_instructions.repo.close()
+    if count == -1:
+        print(f"Read {len(args.files)} files in order in {time.perf_counter()-start:.2f}s, as they don't only define words.")
+    else:
+        print(f"Built {count} definitions from {len(args.files)} files in {time.perf_counter()-start:.2f}s with {args.jobs} jobs.")
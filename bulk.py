@@ -0,0 +1,85 @@
+'''Transactional bulk writes, used by READ to load whole files in one transaction.'''
+from sqlite3 import Connection, Cursor
+
+class BulkWriter:
+    '''Buffers inserts and flushes them in batches, all inside one transaction.
+    begin/commit/rollback can be nested - only the outermost pair touches the database.'''
+    def __init__(self, connection: Connection, batch_size: int = 1000) -> None:
+        self.connection = connection
+        self.batch_size = batch_size
+        self.depth = 0
+        self._pending: dict[str, list[tuple]] = {}
+        self._pending_count = 0
+
+    @property
+    def active(self) -> bool:
+        '''Whether a bulk transaction is currently open.'''
+        return self.depth > 0
+
+    def begin(self) -> None:
+        '''Opens the transaction, or joins the one that is already open.'''
+        if self.depth == 0:
+            if self.connection.in_transaction:
+                self.connection.commit()
+            self.connection.execute("BEGIN")
+        self.depth += 1
+
+    def commit(self) -> None:
+        '''Leaves the transaction, flushing and committing it if this is the outermost level.'''
+        self.depth -= 1
+        if self.depth == 0:
+            self.flush()
+            self.connection.commit()
+
+    def rollback(self) -> None:
+        '''Leaves the transaction. The outermost level discards all buffered and written rows.'''
+        self.depth -= 1
+        if self.depth == 0:
+            self._pending.clear()
+            self._pending_count = 0
+            self.connection.rollback()
+
+    def checkpoint(self) -> None:
+        '''Commits the rows written so far and carries on in a new transaction, if this is the outermost level.'''
+        if self.depth == 1:
+            self.flush()
+            self.connection.commit()
+            self.connection.execute("BEGIN")
+
+    def savepoint(self) -> None:
+        '''Opens a savepoint inside the transaction, which rollback_to_savepoint returns to.'''
+        self.flush()
+        self.connection.execute("SAVEPOINT bulk")
+
+    def release_savepoint(self) -> None:
+        '''Closes the latest savepoint, keeping what was written since it was opened.'''
+        self.flush()
+        self.connection.execute("RELEASE bulk")
+
+    def rollback_to_savepoint(self) -> None:
+        '''Closes the latest savepoint, discarding what was written (or buffered) since it was opened.'''
+        self._pending.clear()
+        self._pending_count = 0
+        self.connection.execute("ROLLBACK TO bulk")
+        self.connection.execute("RELEASE bulk")
+
+    def add(self, table_name: str, *values) -> None:
+        '''Buffers a row to be inserted into table_name. Rows that break a constraint are skipped, like add_record.'''
+        self._pending.setdefault(table_name, []).append(values)
+        self._pending_count += 1
+        if self._pending_count >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        '''Writes all buffered rows with one batched insert per table.'''
+        for table_name, rows in self._pending.items():
+            if len(rows) > 0:
+                placeholders = ", ".join("?" for _ in rows[0])
+                self.connection.executemany(f"INSERT OR IGNORE INTO {table_name} VALUES ({placeholders})", rows)
+        self._pending.clear()
+        self._pending_count = 0
+
+    def execute(self, statement: str, params: tuple = ()) -> Cursor:
+        '''Runs a statement inside the transaction, after writing any buffered rows so that it sees them.'''
+        self.flush()
+        return self.connection.execute(statement, params)
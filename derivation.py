@@ -0,0 +1,209 @@
+'''
+Derivation plans for DEFROOT, DEFWORD and DEFNUM.
+The params of a command are compiled in one pass into a DerivationPlan: the subwords, how they are combined, the endings
+and the note. Plans are cached by the text of the line, which is also the formula stored for complex words, so a word
+recomputed after one of its constituents changed only has its dependencies looked up again.
+'''
+from typing import Callable, NamedTuple
+ # Local imports
+import fs_errors as Fs
+import fs_parser
+import numerals
+
+SUBCOMMANDS = {"DEFROOT": ["END", "NOTE"], "DEFWORD": ["WITH", "END", "NOTE"], "DEFNUM": ["NOTE"]}
+WITH_TYPES = ["SLICE", "JOIN", "DERIVE"]
+ENDINGS = {"m": "_Masculine", "f": "_Feminine", "n": "_Neutral", "p": "_Plural", "v": "_Verb"} # Used for the END subcommand
+DERIVATIONS = {"i": "_Instance", "s": "_Subject", "o": "_Object", "p": "_Place", "v": "_Verb"} # Used for WITH DERIVE
+PLAN_CACHE_SIZE = 1 << 14
+_plans: dict[str, "DerivationPlan"] = {} # Compiled plans, keyed by the line they were compiled from
+
+class DerivationPlan(NamedTuple):
+    '''How one DEFROOT, DEFWORD or DEFNUM command builds its word.'''
+    instruction: str
+    params: tuple[str, ...] # As written, for messages
+    word_eng: str
+    word_fira: str = "" # DEFROOT only. DEFWORD builds it from the subwords and DEFNUM from the value
+    value: int = 0 # DEFNUM only
+    subwords: tuple[str, ...] = () # English words whose translations are combined (DEFWORD only)
+    with_type: str = "" # "" to append the subwords, or one of WITH_TYPES
+    slices: tuple[tuple[int, int], ...] = () # (start, end) of each subword for WITH SLICE. An end of 0 keeps the rest
+    separator: str = "" # String put between the subwords by WITH JOIN
+    derive: str = "" # English word of the WITH DERIVE ending, e.g. _Instance
+    endings: tuple[tuple[str, bool], ...] = () # (English word, whether it replaces the last letter) for each END, in order
+    note: str = ""
+
+    @property
+    def dependencies(self) -> list[str]:
+        '''English words the word is built from, recorded so it can be recomputed when they change.'''
+        if self.instruction != "DEFWORD":
+            return []
+        return [*self.subwords, *(ending for ending, _ in self.endings), *([self.derive] if self.derive != "" else [])]
+
+def _error(instruction: str, message: str, params: tuple[str, ...]) -> Fs.FSSyntaxError:
+    '''Returns the error for invalid params of a command.'''
+    return Fs.FSSyntaxError(f"{instruction} ERROR: {message} in 「{' '.join(params)}」.")
+
+def compile_params(instruction: str, params: tuple[str, ...]) -> DerivationPlan:
+    '''Compiles the params of a DEFROOT, DEFWORD or DEFNUM command. Raises FSSyntaxError if they are invalid.'''
+    if len(params) == 2 and instruction == "DEFROOT": # The most common command, with nothing to split
+        return DerivationPlan(instruction, params, params[0], params[1])
+    if len(params) == 0:
+        raise _error(instruction, "No params provided", params)
+    start = 2 # Where the subcommands may begin
+    if instruction == "DEFWORD":
+        if len(params) < 3 or params[1] != "FROM":
+            raise Fs.FSSyntaxError(f"{instruction} ERROR: 「{' '.join(params)}」 not in format '<string> FROM <string> <params>'.")
+        start = 3
+    elif len(params) < 2:
+        raise _error(instruction, "Invalid number of params", params)
+
+     # Split the params at each subcommand. Each subcommand's params run until the next one
+    keywords = SUBCOMMANDS[instruction]
+    positions = [i for i in range(start, len(params)) if params[i] in keywords]
+    head = params[:positions[0]] if len(positions) > 0 else params
+    fields = {"word_eng": params[0], "note": ""}
+    endings = []
+    match instruction:
+        case "DEFROOT":
+            if len(head) > 2:
+                raise _error(instruction, "Invalid subcommand", params)
+            fields["word_fira"] = params[1]
+        case "DEFWORD":
+            fields["subwords"] = head[2:]
+        case "DEFNUM":
+            if len(head) > 2:
+                raise _error(instruction, "Invalid subcommand", params)
+            try:
+                fields["value"] = int(params[1])
+            except ValueError as e:
+                raise _error(instruction, "Invalid value", params) from e
+    for position, end in zip(positions, positions[1:]+[len(params)]):
+        subparams = params[position+1:end]
+        match params[position]:
+            case "NOTE":
+                if len(subparams) == 0:
+                    raise _error(instruction, "No note provided", params)
+                fields["note"] = subparams[0]
+            case "END":
+                if len(subparams) != 1 or subparams[0].lower() not in ENDINGS:
+                    raise _error(instruction, "Invalid END value", params)
+                endings.append((ENDINGS[subparams[0].lower()], subparams[0].isupper())) # A capital replaces the last letter
+            case "WITH":
+                fields.update(_compile_with(subparams, fields["subwords"], params))
+    fields["endings"] = tuple(endings)
+    return DerivationPlan(instruction, params, **fields)
+
+def _compile_with(subparams: tuple[str, ...], subwords: tuple[str, ...], params: tuple[str, ...]) -> dict:
+    '''Compiles the params of a WITH subcommand of DEFWORD.'''
+    if len(subparams) == 0 or subparams[0] not in WITH_TYPES:
+        raise _error("DEFWORD", "Invalid WITH type", params)
+    with_type, with_params = subparams[0], subparams[1:]
+    match with_type:
+        case "SLICE":
+            try:
+                ints = [int(param) for param in with_params]
+            except ValueError as e:
+                raise _error("DEFWORD", "Invalid WITH SLICE value", params) from e
+            if len(ints) < 2*len(subwords):
+                raise _error("DEFWORD", f"Invalid number of WITH SLICE params. Expecting: {2*len(subwords)}, Found: {len(ints)}", params)
+            return {"with_type": with_type, "slices": tuple(zip(ints[0::2], ints[1::2]))}
+        case "JOIN":
+            if len(with_params) > 1:
+                raise _error("DEFWORD", f"Invalid number of WITH JOIN params. Expecting: 1, Found: {len(with_params)}", params)
+            return {"with_type": with_type, "separator": with_params[0] if len(with_params) == 1 else ""}
+        case "DERIVE":
+            if len(subwords) != 1:
+                raise _error("DEFWORD", "WITH DERIVE must only have one subword", params)
+            if len(with_params) != 1:
+                raise _error("DEFWORD", "Invalid number of WITH DERIVE params", params)
+            derive = DERIVATIONS.get(with_params[0][:1].lower())
+            if derive is None or with_params[0].lower() not in [derive[1].lower(), derive[1:].lower()]: # e.g. i or instance
+                raise _error("DEFWORD", "Invalid WITH DERIVE value", params)
+            return {"with_type": with_type, "derive": derive}
+
+def resolve(plan: DerivationPlan, lookup: Callable[[str], str]) -> dict[str, str]:
+    '''Translates each word a plan uses with lookup, which raises an FSError for words it can't translate.
+    Returns {word as written: translation}. Words are looked up, and errors reported, in the order DEFWORD uses them.'''
+    if plan.instruction == "DEFNUM":
+        return {word: lookup(word) for word in numerals.DIGIT_WORDS+[numerals.AND_WORD]}
+    translations = {}
+    try:
+        for word in plan.subwords:
+            translations[word] = lookup(word)
+    except Fs.FSError as e:
+        raise Fs.FSSyntaxError(f"DEFWORD ERROR: Error in 「{' '.join(plan.subwords)}」: {e}") from e
+    if plan.derive != "":
+        try:
+            translations[plan.derive] = lookup(plan.derive)
+        except Fs.FSError as e:
+            raise Fs.FSSyntaxError(f"DEFWORD ERROR: WITH DERIVE {plan.derive[1:]} Error: {e} in 「{' '.join(plan.params)}」") from e
+    for ending, _ in plan.endings:
+        translations[ending] = lookup(ending)
+    return translations
+
+def assemble(plan: DerivationPlan, translations: dict[str, str]) -> str:
+    '''Builds the Fira form of a plan from the translations returned by resolve.'''
+    match plan.instruction, plan.with_type:
+        case "DEFNUM", _:
+            digits = [translations[word].lower() for word in numerals.DIGIT_WORDS]
+            return "-".join(numerals.encode(plan.value, digits, translations[numerals.AND_WORD].lower()))
+        case "DEFROOT", _:
+            word_fira = plan.word_fira
+        case _, "SLICE":
+            word_fira = "".join(translations[word][start:len(translations[word]) if end == 0 else end] # An end of 0 slices to the end
+                                for word, (start, end) in zip(plan.subwords, plan.slices))
+        case _, "DERIVE":
+            word_fira = translations[plan.subwords[0]]+translations[plan.derive]
+        case _: # Appended, or WITH JOIN
+            word_fira = plan.separator.join(translations[word] for word in plan.subwords)
+    for ending, replace in plan.endings:
+        word_fira = (word_fira[:-1] if replace else word_fira)+translations[ending]
+    return word_fira
+
+def to_line(plan: DerivationPlan) -> str:
+    '''Returns the canonical line of a plan, which compiles back into the same plan: subcommands in a fixed order, one-letter
+    END and DERIVE values and strings quoted only where needed. Raises ValueError if a string can't be written.'''
+    params = [plan.word_eng]
+    match plan.instruction:
+        case "DEFROOT":
+            params.append(plan.word_fira)
+        case "DEFWORD":
+            params += ["FROM", *plan.subwords]
+        case "DEFNUM":
+            params.append(str(plan.value))
+    match plan.with_type:
+        case "SLICE":
+            params += ["WITH", "SLICE", *(str(value) for pair in plan.slices for value in pair)]
+        case "JOIN":
+            params += ["WITH", "JOIN", plan.separator]
+        case "DERIVE":
+            params += ["WITH", "DERIVE", plan.derive[1].lower()]
+    for ending, replace in plan.endings:
+        letter = next(letter for letter, word in ENDINGS.items() if word == ending)
+        params += ["END", letter.upper() if replace else letter]
+    if plan.note not in ["", None]:
+        params += ["NOTE", plan.note]
+    return " ".join([plan.instruction, *(fs_parser.quote(param) for param in params)])
+
+def plan(command: fs_parser.Command) -> DerivationPlan:
+    '''Returns the plan of a parsed DEFROOT, DEFWORD or DEFNUM command, compiling it the first time its line is seen.'''
+    cached = _plans.get(command.line)
+    if cached is None:
+        cached = compile_params(command.instruction, command.params)
+        if len(_plans) >= PLAN_CACHE_SIZE:
+            del _plans[next(iter(_plans))] # The oldest plan
+        _plans[command.line] = cached
+    return cached
+
+def compile_formula(formula: str, cache: bool = True) -> DerivationPlan:
+    '''Returns the plan of a DEFROOT, DEFWORD or DEFNUM line, e.g. the formula of a complex word.
+    cache=False compiles it without caching the plan, for formulas that are only looked at once.'''
+    cached = _plans.get(formula)
+    if cached is not None:
+        return cached
+    command = fs_parser.parse_line(formula)
+    if command.error != "":
+        raise Fs.FSSyntaxError(command.error)
+    if command.instruction not in SUBCOMMANDS:
+        raise Fs.FSSyntaxError(f"ERROR: 「{formula}」 is not a DEFROOT, DEFWORD or DEFNUM command.")
+    return plan(command) if cache else compile_params(command.instruction, command.params)
@@ -2,27 +2,30 @@
 The main reader for 'FiraScript'.
 '''
  # Library imports
+import argparse
+import os
+import sys
 from zemia import sql
 from zemia.common import Colours
  # Local imports
 import fs_errors as Fs
+import fs_parser
 from instructions import Instructions
+import schema
 
 class FiraScript: # pylint: disable=R0903
     '''Methods to decode FiraScript.'''
-    def __init__(self, tables: dict[str, sql.Table]) -> None:
+    def __init__(self, tables: dict[str, sql.Table], connection: sql.Connection) -> None:
         '''Sets the tables for the Instructions.'''
         self.root_word_table = tables["root"]
         self.word_table = tables["complex"]
         self.num_table = tables["num"]
         self.instructions = Instructions()
-        self.instructions.set_tables(tables)
+        self.instructions.set_connection(connection)
 
     @staticmethod
-    def main(db_path: str = "") -> None:
-        '''Main function. Do not include the file name in db_path.'''
-        # Set up db connection
-        sql_connection = sql.connect(db_path)
+    def create_tables(sql_connection: sql.Connection) -> dict[str, sql.Table]:
+        '''Creates (if needed) and returns the tables used by FiraScript, upgrading the schema of older databases.'''
         tables = {
             "root": sql.Table(
                 sql_connection,
@@ -55,21 +58,170 @@ class FiraScript: # pylint: disable=R0903
                     "note STRING", 
                     "PRIMARY KEY (value)"
                 ]
+            ),
+            "deps": sql.Table(
+                sql_connection,
+                "dependencyTable",
+                [
+                    "wordEng STRING NOT NULL", 
+                    "dependent STRING NOT NULL", 
+                    "PRIMARY KEY (wordEng, dependent)"
+                ]
+            ),
+            "imports": sql.Table( # Lines of each file read with READ ... INCREMENTAL
+                sql_connection,
+                "importTable",
+                [
+                    "file STRING NOT NULL",
+                    "line STRING NOT NULL",
+                    "count INT NOT NULL",
+                    "PRIMARY KEY (file, line)"
+                ]
+            ),
+            "import_rows": sql.Table( # The words those lines defined: wordEng, or value for numTable
+                sql_connection,
+                "importRowTable",
+                [
+                    "file STRING NOT NULL",
+                    "line STRING NOT NULL",
+                    "tableKey STRING NOT NULL",
+                    "word TEXT NOT NULL" # Not STRING, which would store the values of numbers as ints
+                ]
+            ),
+            "files": sql.Table( # Files applied with IMPORT-ONCE, and the files each of them imports
+                sql_connection,
+                "fileTable",
+                [
+                    "file STRING NOT NULL",
+                    "hash STRING NOT NULL", # sha256 of the contents when it was last applied
+                    "stamp STRING NOT NULL", # Modification time and size, so an untouched file is skipped without reading it
+                    "imports STRING NOT NULL", # Files its IMPORT-ONCE lines import, one per line
+                    "PRIMARY KEY (file)"
+                ]
+            ),
+            "progress": sql.Table( # How far READ ... RESUME got through each file it didn't finish
+                sql_connection,
+                "progressTable",
+                [
+                    "file STRING NOT NULL",
+                    "hash STRING NOT NULL", # sha256 of the lines before the checkpoint
+                    "line INT NOT NULL", # Lines applied, i.e. the line number of the checkpoint
+                    "PRIMARY KEY (file)"
+                ]
             )
         }
-        # Create FiraScript object
-        fira = FiraScript(tables)
+        schema.migrate(sql_connection)
+        return tables
+
+    @staticmethod
+    def open_instructions(db_path: str, dry_run: bool = False, snapshot_path: str = "", in_memory: bool = False) -> Instructions:
+        '''Returns Instructions for the database, or for a read-only snapshot if snapshot_path is given.
+        in_memory loads the database into a LexiconModel, which is saved back when the Instructions' repo is closed.'''
+        if snapshot_path != "":
+            instructions = Instructions()
+            instructions.set_snapshot(snapshot_path)
+            return instructions
+        sql_connection = FiraScript.connect(db_path, dry_run)
+        instructions = FiraScript(FiraScript.create_tables(sql_connection), sql_connection).instructions
+        if in_memory:
+            instructions.set_model(sql_connection)
+        return instructions
+
+    @staticmethod
+    def main(db_path: str = "", snapshot_path: str = "", in_memory: bool = False) -> None:
+        '''Main function. Do not include the file name in db_path.'''
+        instructions = FiraScript.open_instructions(db_path, snapshot_path=snapshot_path, in_memory=in_memory)
         # Read input
         print("Enter FiraScript code below. Type 'HELP' for commands.")
         end = False
         while not end:
-            user_inp = input("> ")
             try:
-                end = fira.instructions.decode(user_inp, db_path=db_path)
+                user_inp = input("> ")
+            except EOFError: # End of piped input
+                break
+            try:
+                end = instructions.decode(user_inp, db_path=db_path)
             except Fs.FSError as e:
                 print(Colours.FAIL, e, Colours.ENDC)
+        instructions.repo.close() # Saves an in-memory lexicon
+
+    @staticmethod
+    def connect(db_path: str, dry_run: bool = False) -> sql.Connection:
+        '''Opens the database. A dry run opens an in-memory copy of it instead, so nothing is written to db_path.'''
+        if not dry_run:
+            return sql.connect(db_path)
+        memory_connection = sql.connect(":memory:")
+        if os.path.exists(db_path):
+            file_connection = sql.connect(db_path)
+            file_connection.backup(memory_connection)
+            file_connection.close()
+        return memory_connection
+
+    @staticmethod
+    def batch(db_path: str, paths: list[str], dry_run: bool = False, snapshot_path: str = "", in_memory: bool = False) -> int:
+        '''Runs .fira files (or the standard input for "-") in order, without prompts.
+        Stops at the first error. Returns the exit code: 0 if everything ran, 1 if an FSError was raised.'''
+        try:
+            instructions = FiraScript.open_instructions(db_path, dry_run, snapshot_path, in_memory)
+        except Fs.FSError as e:
+            print(e, file=sys.stderr)
+            return 1
+        try:
+            for path in paths:
+                if path != "-":
+                    if instructions.execute(fs_parser.Command("READ", (path,), f"READ {path}"), db_path=db_path):
+                        break
+                    continue
+                 # Standard input, streamed a line at a time in one transaction like READ
+                instructions.repo.begin()
+                exited = False
+                try:
+                    for line_number, line in enumerate(sys.stdin, 1):
+                        try:
+                            exited = instructions.execute(fs_parser.parse_line(line.rstrip("\n")), db_path=db_path, source=("<stdin>", line_number))
+                            if exited:
+                                break
+                        except Fs.FSSyntaxError as e:
+                            raise Fs.FSSyntaxError(f"ERROR: Error in <stdin> at line {line_number}: {e}") from e
+                except Exception:
+                    instructions.repo.rollback()
+                    instructions.cache.clear()
+                    raise
+                instructions.repo.commit()
+                if exited: # EXIT stops the files after it too, as it does in a file
+                    break
+        except Fs.FSError as e:
+            sys.stdout.flush()
+            print(e, file=sys.stderr)
+            return 1
+        finally:
+            instructions.repo.close()
+        if dry_run:
+            print(f"Dry run of {', '.join(paths)} succeeded. {db_path} was not changed.", file=sys.stderr)
+        return 0
+
+    @staticmethod
+    def cli(argv: list[str] | None = None) -> int:
+        '''Command-line entry point. Starts the interactive prompt if no files are given. Returns the exit code.'''
+        parser = argparse.ArgumentParser(description="Runs FiraScript. With no files, starts the interactive prompt.")
+        parser.add_argument("files", nargs="*", help=".fira files to run in order, or - to read commands from the standard input")
+        parser.add_argument("--db", default="fira.db", help="database file to use (default: fira.db)")
+        parser.add_argument("--dry-run", action="store_true", help="check the files against an in-memory copy of the database, leaving it unchanged")
+        parser.add_argument("--snapshot", default="", help="translate from this snapshot (made with EXPORT SNAPSHOT) instead of the database")
+        parser.add_argument("--in-memory", action="store_true", help="load the whole database into memory, run everything there and save it when done")
+        args = parser.parse_args(argv)
+        if len(args.files) == 0:
+            if args.dry_run:
+                parser.error("--dry-run needs at least one file (or - for the standard input)")
+            try:
+                FiraScript.main(args.db, args.snapshot, args.in_memory)
+            except Fs.FSError as e:
+                print(e, file=sys.stderr)
+                return 1
+            return 0
+        sys.stdout.reconfigure(line_buffering=False) # Batch output is flushed in blocks, not every line
+        return FiraScript.batch(args.db, args.files, args.dry_run, args.snapshot, args.in_memory)
 
 
 if __name__ == "__main__":
-    DATABASE_PATH = "fira.db"
-    FiraScript.main(DATABASE_PATH)
+    sys.exit(FiraScript.cli())
@@ -5,6 +5,8 @@ class FSError(Exception):
 class FSSyntaxError(FSError):
     '''Raised when the syntax of the FiraScript is incorrect.'''
 class FSRecursionError(FSError):
-    '''Raised when the recursion depth is too high.'''
+    '''Raised when the recursion depth is too high, or files import themselves.'''
 class FSOSError(FSError):
     '''Raised when there is an OS/file error.'''
+class FSDatabaseError(FSError):
+    '''Raised when the database can't be read or upgraded.'''
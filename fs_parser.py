@@ -0,0 +1,111 @@
+'''Lexer and parser for FiraScript, plus the compiled (.firac) cache used by READ.'''
+import hashlib
+import marshal
+import os
+from typing import NamedTuple
+
+FORMAT_VERSION = 1 # Bump when the layout of Command changes, to invalidate old .firac files
+CACHE_FOLDER = "__firacache__"
+WHITESPACE = " \t\r\n"
+
+class Command(NamedTuple):
+    '''One parsed line of FiraScript.'''
+    instruction: str # First token, e.g. "DEFROOT". "" for blank lines, "#" for comments
+    params: tuple[str, ...] # Remaining tokens, with [bracketed strings] already merged and unwrapped
+    line: str # The original line, stored as the formula of complex words
+    error: str = "" # Set if the line could not be lexed. Raised when the command is executed
+
+    @property
+    def tokens(self) -> list[str]:
+        '''The instruction followed by the params, as used by the Instructions methods.'''
+        return [self.instruction, *self.params]
+
+def tokenise(line: str) -> list[str]:
+    '''Splits a line into tokens in a single pass. Raises ValueError if a [string] is never closed.'''
+    tokens = []
+    i, length = 0, len(line)
+    while i < length:
+        if line[i] in WHITESPACE: # Skip whitespace between tokens
+            i += 1
+            continue
+        if line[i] == "[": # A string runs until a ] that ends a token, so it can contain spaces (and ]s)
+            end = i+1
+            while True:
+                end = line.find("]", end)
+                if end == -1:
+                    raise ValueError(f"Unclosed [ in 「{line}」.")
+                if end+1 == length or line[end+1] in WHITESPACE:
+                    break
+                end += 1
+            tokens.append(line[i+1:end])
+            i = end+1
+        else:
+            start = i
+            while i < length and line[i] not in WHITESPACE:
+                i += 1
+            tokens.append(line[start:i])
+            if tokens[0] == "#": # Comment - ignore the rest of the line
+                break
+    return tokens
+
+def quote(token: str) -> str:
+    '''Returns token as it must be written for tokenise to read it back, in [brackets] if it is empty or has whitespace.
+    Raises ValueError if it can't be written, e.g. a string containing a ] followed by a space.'''
+    if token != "" and token[0] != "[" and not any(char in WHITESPACE for char in token):
+        return token
+    if any(token[i] == "]" and token[i+1] in WHITESPACE for i in range(len(token)-1)) or token.endswith("]"):
+        raise ValueError(f"「{token}」 can't be written as a FiraScript string.")
+    return f"[{token}]"
+
+def parse_line(line: str) -> Command:
+    '''Parses a line of FiraScript into a Command.'''
+    try:
+        tokens = tokenise(line)
+    except ValueError as e:
+        return Command("", (), line, f"SYNTAX ERROR: {e}")
+    if len(tokens) == 0:
+        return Command("", (), line)
+    return Command(tokens[0], tuple(tokens[1:]), line)
+
+def parse(text: str, parsed: dict[str, tuple] | None = None) -> list[Command]:
+    '''Parses a whole file of FiraScript, one Command per line. Lines in parsed ({line: command tuple}) aren't parsed again.'''
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    if parsed is None:
+        return [parse_line(line) for line in lines]
+    return [Command(*parsed[line]) if line in parsed else parse_line(line) for line in lines]
+
+def cache_path(source_path: str) -> str:
+    '''Returns where the compiled version of a .fira file is stored.'''
+    folder, name = os.path.split(os.path.abspath(source_path))
+    return os.path.join(folder, CACHE_FOLDER, f"{name}c")
+
+def compile_file(source_path: str, use_cache: bool = True) -> tuple[list[Command], str]:
+    '''Returns the parsed commands of a .fira file and the sha256 of its contents.
+    The commands are loaded from the .firac cache if it matches the path and contents, and the cache is written otherwise.'''
+    with open(source_path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    source = os.path.abspath(source_path)
+    compiled = cache_path(source_path)
+
+    parsed = None
+    if use_cache:
+        try:
+            with open(compiled, "rb") as f:
+                header, commands = marshal.loads(f.read()) # Much faster than marshal.load, which reads the file in tiny pieces
+            if header == (FORMAT_VERSION, source, digest):
+                return [Command(*command) for command in commands], digest
+            if header[:2] == (FORMAT_VERSION, source): # An older version of the file - only the edited lines need parsing
+                parsed = {command[2]: command for command in commands}
+        except (OSError, EOFError, ValueError, TypeError):
+            pass # Missing or unreadable cache - recompile
+
+    commands = parse(data.decode("utf-8"), parsed)
+    if use_cache:
+        try:
+            os.makedirs(os.path.dirname(compiled), exist_ok=True)
+            with open(compiled, "wb") as f:
+                marshal.dump(((FORMAT_VERSION, source, digest), [tuple(command) for command in commands]), f)
+        except OSError:
+            pass # Read-only location - the cache is only an optimisation
+    return commands, digest
@@ -1,9 +1,35 @@
 '''Instructions module for the FiraScript language.'''
+import hashlib
+import io
+import itertools
+import os
+from collections import Counter
 import re
+import sys
+import tempfile
+from contextlib import contextmanager
 from zemia.common import empty, Colours
-from zemia import sql, file
+from zemia import file
+from sqlite3 import Connection
+from typing import Iterator, TextIO
  # Local imports
 import fs_errors as Fs
+import build
+import derivation
+import fs_parser
+import schema
+import search
+import snapshot
+import transfer
+import verify
+from analyser import Analyser, Analysis
+from derivation import DerivationPlan
+from lexicon_cache import LexiconCache
+from model import LexiconModel, ModelRepository
+from numerals import NumeralEngine
+from profiler import Profiler, tracks_depth
+import numerals
+from repository import LexiconRepository, TABLE_NAMES, WORD_TABLES
 
 class Instructions:
     '''Instructions for the FiraScript language.'''
@@ -12,23 +38,137 @@ class Instructions:
         self.silent = True
         self.max_recursion_depth = 10
         self.print_read = False
-
-    END_DICT = {"m": "_Masculine", "f": "_Feminine", "n": "_Neutral", "p": "_Plural", "v": "_Verb"} # Used for the END subcommand
-    DIGIT_WORDS = ["Zero", "One", "Two", "three", "four", "five", "six", "seven", "eight", "nine"] # Used for DEFNUM
-    root_word_table: sql.Table = None
-    word_table: sql.Table = None
-    num_table: sql.Table = None
+        self.compile_cache = True # Whether READ stores parsed files in __firacache__
+        self.output: TextIO | None = None # Where commands print, or None for stdout
+         # Translation cache, kept in sync by the commands that write to the tables
+        self.cache = LexiconCache()
+        self.numerals = NumeralEngine(lambda word: self.translate([word, "TO", "f"]))
+        self.profiler = Profiler() # Started by DEBUG PROFILE
+        self.analyser: Analyser | None = None # Built by ANALYSE, and rebuilt after the lexicon changes
+        self.analyser_generation = -1
+        self.import_rows: list[tuple[str, str]] | None = None # Words defined by the line READ ... INCREMENTAL is running
+        self.reading: list[str] = [] # Absolute paths of the files being read, outermost first, to detect circular imports
+        self.chain = ["main"] # Namespaces translations are looked up in, top first. Words are written to the top one
+        self.caches = {("main",): self.cache} # A translation cache for each chain used, as each can translate a word differently
+        self.chain_generation = self.cache.generation # Generation of the cache when the chain was last switched to
+
+    INSTRUCTIONS = ["DEFROOT", "DEFWORD", "DEFNUM", "LISTWORDS", "TRANSLATE", "ANALYSE", "UPDATE", "DELETE", "HELP", "READ", "IMPORT-ONCE", "VERIFY", "EXPORT", "IMPORT", "LEXICON", "DEBUG", "EXIT"]
+    NUMERAL_WORDS = {word.lower() for word in numerals.DIGIT_WORDS+[numerals.AND_WORD]} # Numbers are recomputed when these change
+    ORDER_DEPENDENT = ["UPDATE", "DELETE", "READ", "VERIFY", "IMPORT", "LEXICON", "DEBUG", "EXIT"] # READ ... INCREMENTAL re-runs files with these in full
+    WORD_PATTERN = re.compile(r"\w+(?:['-]\w+)*") # What counts as a word when translating text
+    STREAM_CHUNK = 1 << 16 # Characters of text translated at a time by TRANSLATE FILE/STDIN
+    CHECKPOINT_LINES = 10000 # Lines READ ... RESUME runs between checkpoints, unless given
+    repo: LexiconRepository | ModelRepository | snapshot.SnapshotRepository = None
     db_path: str = ""
 
-    def set_tables(self, tables: dict[str, sql.Table]) -> None:
-        '''Sets the tables for the Instructions.'''
-        self.root_word_table = tables["root"]
-        self.word_table = tables["complex"]
-        self.num_table = tables["num"]
+    def set_connection(self, connection: Connection) -> None:
+        '''Sets the database the Instructions read and write. The tables must already exist.'''
+        self.repo = LexiconRepository(connection)
+
+    def set_model(self, connection: Connection) -> None:
+        '''Loads the whole lexicon into memory and runs every command on it there. It is saved back to the database when the
+        repository is closed (or before EXPORT).'''
+        self.repo = ModelRepository(LexiconModel.load(connection), connection)
+        self.cache.clear()
+
+    def set_snapshot(self, path: str) -> None:
+        '''Answers translations from a snapshot made by EXPORT SNAPSHOT instead of a database. Commands that write are refused.'''
+        self.repo = snapshot.SnapshotRepository(path)
+        self.cache.clear()
+
+    def _direct_dependents(self, word_eng: str) -> list[str]:
+        '''Returns the complex words whose formulas directly use word_eng.'''
+        return self.repo.dependents(word_eng)
+
+    def _dependents(self, *words: str) -> list[str]:
+        '''Returns every complex word that depends on one of words, directly or not, in the order they must be recomputed.
+        Each word is searched from once, so words that share dependents are as quick to search as one.'''
+        func_name = self._dependents.__name__.upper()
+
+        # Iterative depth-first search - the reverse of the post-order is a topological order
+        post_order, done = [], set()
+        for word_eng in words:
+            if word_eng in done: # Already found as a dependent of an earlier word
+                continue
+            visiting = {word_eng}
+            stack = [(word_eng, iter(self._direct_dependents(word_eng)))]
+            while stack:
+                word, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    visiting.discard(word)
+                    done.add(word)
+                    post_order.append(word)
+                elif child in visiting:
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: Circular definition between 「{word}」 and 「{child}」.")
+                elif child not in done:
+                    visiting.add(child)
+                    stack.append((child, iter(self._direct_dependents(child))))
+            post_order.pop() # word_eng itself
+        return post_order[::-1]
+
+    def _recompute(self, *words: str) -> int:
+        '''Re-evaluates the formulas of all complex words that depend on one of words. Returns the number of words changed.'''
+        func_name = self._recompute.__name__.upper()
+        changed = 0
+        for dependent in self._dependents(*words):
+            for old_fira, formula in self.repo.formulas(dependent):
+                new_fira = self.evaluate(derivation.compile_formula(formula)).lower()
+                if new_fira != old_fira:
+                    if self.repo.update_complex_fira(dependent, old_fira, new_fira) == 0:
+                        raise Fs.FSSyntaxError(f"{func_name} ERROR: Could not update 「{dependent}」 to 「{new_fira}」.")
+                    self.cache.invalidate(dependent, old_fira, new_fira)
+                    changed += 1
+        if any(word_eng.lower() in self.NUMERAL_WORDS for word_eng in words):
+            changed += self._recompute_numbers()
+        return changed
+
+    def _recompute_numbers(self) -> int:
+        '''Rewrites every number from its value, after a word used to write numbers changed. Returns the number of numbers changed.'''
+        engine = self.numeral_engine()
+        changed = 0
+        for value, old_fira in self.repo.all_numbers():
+            new_fira = engine.to_fira(value)
+            if new_fira != old_fira:
+                self.repo.update_number(value, new_fira)
+                self.cache.invalidate(str(value), old_fira, new_fira)
+                changed += 1
+        return changed
+
+    def _insert_word(self, table_key: str, *values) -> None:
+        '''Adds a row to a word or number table, noting its word for READ ... INCREMENTAL if it is running a line.'''
+        self.repo.insert(table_key, *values)
+        if self.import_rows is not None:
+            self.import_rows.append((table_key, str(values[0]))) # wordEng, or the value of a number
+
+    def _delete_defined(self, table_key: str, word: str) -> None:
+        '''Deletes a word (or number) that was defined by a line READ ... INCREMENTAL no longer finds.'''
+        self.repo.delete_eng(table_key, word)
+        if table_key == "complex":
+            self.repo.delete_dependencies(word)
+        self.cache.invalidate(word)
+
+    def _add_dependencies(self, word_eng: str, dependencies: list[str]) -> None:
+        '''Records that the complex word word_eng is defined using each of dependencies.'''
+        for dependency in dict.fromkeys(dependency.lower() for dependency in dependencies):
+            self.repo.insert("deps", dependency, word_eng.lower())
 
 
     def decode(self, line: str, **kwargs) -> bool:
         '''Reads a line of FiraScript.'''
+        return self.execute(fs_parser.parse_line(line), **kwargs)
+
+    def execute(self, command: fs_parser.Command, **kwargs) -> bool:
+        '''Executes a parsed line of FiraScript. Returns True if the program should exit.'''
+        if not self.profiler.enabled or command.instruction in ["", "#"]:
+            return self._execute(command, **kwargs)
+        instruction = command.instruction if command.instruction in self.INSTRUCTIONS else "TRANSLATE" # Implicit TRANSLATE
+        with self.profiler.measure(instruction, kwargs.get("source"), command.line):
+            return self._execute(command, **kwargs)
+
+    def _execute(self, command: fs_parser.Command, **kwargs) -> bool:
+        '''Executes a parsed line of FiraScript, without profiling it.'''
          # Kwargs
         depth = kwargs.get("depth", 0)
         if "db_path" in kwargs:
@@ -36,66 +176,74 @@ class Instructions:
 
         if depth > self.max_recursion_depth:
             raise Fs.FSRecursionError(f"ERROR: Max recursion depth ({self.max_recursion_depth}) reached.")
+        if command.error != "":
+            raise Fs.FSSyntaxError(command.error)
 
-        command_list = line.split(" ")
-        for i, command in enumerate(command_list):
-            if command == "": # Skip empty commands
-                continue
-            if re.search("^\\[", command) is not None: # Check if the command is a group (i.e. it starts with a [)
-                if re.search("\\]$", command) is None: # Check if the command is the start of a multi-word String (i.e. it doesn't end with a ])
-                    merge_end = -1
-                    # Find the end of the string
-                    for j in range(i+1, len(command_list)):
-                        if re.search("\\]$", command_list[j]):
-                            merge_end = j
-                            break
-                    # Merge the string
-                    for k in range(i+1, merge_end+1):
-                        command_list[i] += f" {command_list[k]}"
-                    # Remove other parts from the list
-                    for _ in range(merge_end-i):
-                        command_list.pop(i+1)
-                # Remove the quotes
-                command_list[i] = command_list[i][1:-1]
+        command_list, line = command.tokens, command.line
         match command_list[0]:
             case "" | "#":
                 pass
             case "DEFROOT":
-                defroot_dict = self.defroot(command_list[1:], silent=self.silent)
-                self.root_word_table.add_record(
-                    f"\"{defroot_dict["wordEng"].lower()}\"",
-                    f"\"{defroot_dict["wordFira"].lower()}\"",
-                    f"\"{defroot_dict["note"]}\""
+                defroot_dict = self.defroot(derivation.plan(command), silent=self.silent)
+                self.cache.discard(defroot_dict["wordEng"], defroot_dict["wordFira"])
+                self._insert_word(
+                    "root",
+                    defroot_dict["wordEng"].lower(),
+                    defroot_dict["wordFira"].lower(),
+                    defroot_dict["note"]
                 )
             case "DEFWORD":
-                defword_dict = self.defword(command_list[1:], silent=self.silent)
-                self.word_table.add_record(
-                    f"\"{defword_dict["wordEng"].lower()}\"",
-                    f"\"{defword_dict["wordFira"].lower()}\"",
-                    f"\"{line}\"",
-                    f"\"{defword_dict["note"]}\""
+                defword_dict = self.defword(derivation.plan(command), silent=self.silent)
+                self.cache.discard(defword_dict["wordEng"], defword_dict["wordFira"])
+                self._insert_word(
+                    "complex",
+                    defword_dict["wordEng"].lower(),
+                    defword_dict["wordFira"].lower(),
+                    line,
+                    defword_dict["note"]
                 )
+                self._add_dependencies(defword_dict["wordEng"], defword_dict["dependencies"])
+            case "DEFNUM" if command_list[1:2] == ["RANGE"] and len(command_list) > 3:
+                self.defnum_range(command_list[2:], silent=self.silent)
             case "DEFNUM":
-                defnum_dict = self.defnum(command_list[1:], silent=self.silent)
-                self.num_table.add_record(
-                    f"\"{defnum_dict["value"]}\"",
-                    f"\"{defnum_dict["wordEng"].lower()}\"",
-                    f"\"{defnum_dict["wordFira"].lower()}\"",
-                    f"\"{defnum_dict["note"]}\""
+                defnum_dict = self.defnum(derivation.plan(command), silent=self.silent)
+                self.cache.discard(str(defnum_dict["value"]), defnum_dict["wordEng"], defnum_dict["wordFira"])
+                self._insert_word(
+                    "num",
+                    defnum_dict["value"],
+                    defnum_dict["wordEng"].lower(),
+                    defnum_dict["wordFira"].lower(),
+                    defnum_dict["note"]
                 )
             case "LISTWORDS":
                 self.listwords(command_list[1:], silent=self.silent)
             case "TRANSLATE":
-                print(self.translate(command_list[1:], silent=self.silent).capitalize())
+                if len(command_list) > 4 or command_list[1:2] in (["FILE"], ["STDIN"]): # Many words
+                    self.translate_text(command_list[1:], silent=self.silent)
+                else:
+                    print(self.translate(command_list[1:], silent=self.silent).capitalize(), file=self.output)
+            case "ANALYSE":
+                for rank, analysis in enumerate(self.analyse(command_list[1:], silent=self.silent), 1):
+                    print(f"{rank}. {analysis.english()}  ({analysis.fira()})", file=self.output)
             case "UPDATE":
                 self.update(command_list[1:], silent=self.silent)
             case "DELETE":
                 self.delete(command_list[1:], silent=self.silent)
+            case "VERIFY":
+                self.verify(command_list[1:], silent=self.silent)
+            case "EXPORT":
+                self.export(command_list[1:], silent=self.silent)
+            case "IMPORT":
+                self.import_(command_list[1:], silent=self.silent)
+            case "LEXICON":
+                self.lexicon(command_list[1:], silent=self.silent)
             case "HELP":
                 for i in self.help(silent=self.silent):
-                    print(i)
+                    print(i, file=self.output)
             case "READ":
                 return self.read(command_list[1:], depth)
+            case "IMPORT-ONCE":
+                return self.import_once(command_list[1:], depth)
             case "DEBUG":
                 self.debug(command_list[1:])
             case "#": # Comment
@@ -104,10 +252,10 @@ class Instructions:
                 return True
             case _: # Implicit TRANSLATE
                 #raise FSSyntaxError(f"ERROR: Invalid command: 「{command_list[0]}」.")
-                print(self.translate(command_list+["TO","f"], silent=self.silent).capitalize())
+                print(self.translate(command_list+["TO","f"], silent=self.silent).capitalize(), file=self.output)
         return False
 
-    def defroot(self, command_list: list[str], **kwargs) -> dict[str, str]:
+    def defroot(self, plan: DerivationPlan, **kwargs) -> dict[str, str]:
         '''Defines a root word.'''
         func_name = self.defroot.__name__.upper()
 
@@ -115,270 +263,229 @@ class Instructions:
         silent = kwargs.get("silent", True)
 
         if not silent:
-            print(func_name, command_list, end=" ... ") # Begin proccessing
-
-        if empty(command_list):
-            raise Fs.FSSyntaxError(f"{func_name} ERROR: No params provided in 「{' '.join(command_list)}」.")
-
-        returndict = {"wordEng": command_list[0], "wordFira": command_list[1], "note": ""}
+            print(func_name, list(plan.params), end=" ... ", file=self.output) # Begin proccessing
 
-        if len(command_list) > 2:
-            for i in range(len(command_list)-1, -1, -1):
-                match command_list[i]:
-                    case "END":
-                        returndict = self.defroot(command_list[:i]) # Recursion without this subcommand
-                        returndict["wordFira"] += self.translate([self.END_DICT[command_list[i+1]],"TO","f"])
-                        break
-                    case "NOTE":
-                        returndict = self.defroot(command_list[:i]) # Recursion without this subcommand
-                        if len(command_list) <= i+1:
-                            raise Fs.FSSyntaxError(f"{func_name} ERROR: No note provided in 「{' '.join(command_list)}」.")
-                        returndict["note"] = command_list[i+1]
-                        break
-            if i == 0:
-                raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid subcommand in 「{' '.join(command_list)}」.")
+        returndict = {"wordEng": plan.word_eng, "wordFira": self.evaluate(plan), "note": plan.note}
 
         if not silent:
-            print("DONE") # Proccessing complete
+            print("DONE", file=self.output) # Proccessing complete
 
         return returndict
 
-    def defword(self, command_list: list[str], **kwargs) -> dict[str, list|str]:
+    def defword(self, plan: DerivationPlan, **kwargs) -> dict[str, list|str]:
         '''Defines a word.'''
         func_name = self.defword.__name__.upper()
 
          # Kwargs
         silent = kwargs.get("silent", True)
-        iteration = kwargs.get("iteration", False) # Whether this is an iteration of def_word and so should not apply WITH subcommands
 
         if not silent:
-            print(func_name, command_list, end=" ... ") # Begin proccessing
-
-         # Check params
-        if empty(command_list):
-            raise Fs.FSSyntaxError(f"{func_name} ERROR: No params provided in 「{' '.join(command_list)}」.")
-        if len(command_list) < 3 or command_list[1] != "FROM":
-            raise Fs.FSSyntaxError(f"{self.defword.__name__.upper()} ERROR: 「{' '.join(command_list)}」 not in format '<string> FROM <string> <params>'.")
+            print(func_name, list(plan.params), end=" ... ", file=self.output) # Begin proccessing
 
         returndict: dict[str, list|str] = {
-            "wordEng": command_list[0], "wordFira": command_list[1], "note": "", # Used for the final return
-            "subwords": [], # Translations of consituent words
-            "append": "", # Additional characters to append to the final word, used for END subcommand
-            "with_type": "", "with_params": [] # WITH subcommand and its parameters
+            "wordEng": plan.word_eng, "wordFira": self.evaluate(plan), "note": plan.note,
+            "dependencies": plan.dependencies # English words the formula uses, recorded so the word can be recomputed when they change
             }
 
-        for i in range(len(command_list)-1, -1, -1):
-            match command_list[i]:
-                case "WITH":
-                    returndict = self.defword(list(command_list[:i]), iteration=True) # Recursion without this subcommand
-                    returndict["with_type"] = command_list[i+1]
-                    returndict["with_params"] = command_list[i+2:]
-                    command_list = command_list[:i]
-                    break
-                case "END":
-                    returndict = self.defword(list(command_list[:i]), iteration=True) # Recursion without this subcommand
-                    returndict["append"] += self.translate([self.END_DICT[command_list[i+1]], "TO", "Fira"])
-                    break
-                case "NOTE":
-                    returndict = self.defword(list(command_list[:i]), iteration=True) # Recursion without this subcommand
-                    returndict["note"] = command_list[i+1]
-                    break
-        if i == 0: # Base case
-             # Remove engWord and FROM
-            returndict["wordEng"] = command_list[0]
-            command_list = command_list[2:]
-             # Get all subwords
-            for _, command in enumerate(command_list):
-                if command == "WITH":
-                    break
-                try:
-                    returndict["subwords"].append(self.translate([command, "TO", "Fira"], silent=True))
-                except Fs.FSError as e:
-                    raise Fs.FSSyntaxError(f"{func_name} ERROR: Error in 「{' '.join(command_list)}」: {e}") from e
-
-        # Assemble the word
-        if not iteration:
-            returndict["wordFira"] = ""
-            match returndict["with_type"]:
-                case "":
-                    for word in returndict["subwords"]:
-                        returndict["wordFira"] += word
-                case "SLICE":
-                    for i, word in enumerate(returndict["subwords"]):
-                        start = int(returndict["with_params"][i*2])
-                        end = int(returndict["with_params"][i*2+1])
-                        end = len(word) if end == 0 else end # If end is 0, set it to the end of the word
-                        returndict["wordFira"] += word[start:end]
-                case "JOIN":
-                    match len(returndict["with_params"]):
-                        case 0:
-                            returndict["wordFira"] = "".join(returndict["subwords"])
-                        case 1:
-                            returndict["wordFira"] = returndict["with_params"][0].join(returndict["subwords"])
-                        case _:
-                            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid number of WITH JOIN params in「{' '.join(command_list)}」.\nExpecting: 1, Found: {len(returndict['with_params'])}.")
-                case "DERIVE":
-                    if len(returndict["subwords"]) != 1:
-                        raise Fs.FSSyntaxError(f"{func_name} ERROR: WITH DERIVE must only have one subword 「{' '.join(command_list)}」.")
-                    if len(returndict["with_params"]) != 1:
-                        raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid number of with_params in 「{' '.join(command_list)}」.")
-                    der_word, der_type = "", ""
-                    match returndict["with_params"][0].lower():
-                        case "i"|"instance": der_word, der_type = "_Instance", "Instance"
-                        case "s"|"subject":  der_word, der_type = "_Subject", "Subject"
-                        case "o"|"object":   der_word, der_type = "_Object", "Object"
-                        case "p"|"place":    der_word, der_type = "_Place", "Place"
-                        case "v"|"verb":     der_word, der_type = "_Verb", "Verb"
-                        case _: raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid with_params value in 「{' '.join(command_list)}」.")
-                    derive = ""
-                    try:
-                        derive = self.translate([der_word, "TO", "f"])
-                    except Fs.FSError as e:
-                        raise Fs.FSSyntaxError(f"{func_name} ERROR: WITH DERIVE {der_type} Error: {e} in 「{' '.join(command_list)}」") from e
-                    returndict["wordFira"] = returndict["subwords"][0]+derive
-                case _:
-                    raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid WITH type in 「{' '.join(command_list)}」.")
-            returndict["wordFira"] += returndict["append"]
-
         if not silent:
-            print("DONE") # Proccessing complete
+            print("DONE", file=self.output) # Proccessing complete
 
         return returndict
 
-    def _translate_num(self, num: int|str, **kwargs) -> str|list[str]:
-        '''ONLY USED BY DEFNUM for recursion. Translates a number.'''
-        func_name = self._translate_num.__name__.upper()
+    def evaluate(self, plan: DerivationPlan) -> str:
+        '''Builds the Fira form of a DEFROOT or DEFWORD plan, translating each word it uses once.'''
+        return derivation.assemble(plan, derivation.resolve(plan, lambda word: self.translate([word, "TO", "f"], silent=True)))
+
+    def numeral_engine(self) -> NumeralEngine:
+        '''Returns the numeral engine, with its digit forms up to date with the lexicon.'''
+        self.numerals.load(self.cache.generation)
+        return self.numerals
+
+    def defnum(self, plan: DerivationPlan, **kwargs) -> dict[str, int|str]:
+        '''Defines a number.'''
+        func_name = self.defnum.__name__.upper()
 
          # Kwargs
         silent = kwargs.get("silent", True)
-        fold = kwargs.get("fold", True)
 
         if not silent:
-            print(func_name, num, end=" ... ") # Begin proccessing
-
-        in_zero, zero_count = False, 0
-        translated_num = []
-        for _, digit in enumerate(str(num)):
-            if digit == "0":
-                if in_zero:
-                    zero_count += 1
-                else:
-                    in_zero = True
-                    zero_count = 1
-            else:
-                if in_zero:
-                    translated_num.append(self.translate(["Zero", "TO", "f"]))
-                    if zero_count > 1:
-                        translated_num.append(*self._translate_num(zero_count, fold=False))
-                    translated_num.append(self.translate(["And", "TO", "f"]))
-                    in_zero = False
-                translated_num.append(self.translate([self.DIGIT_WORDS[int(digit)], "TO", "f"]))
-        if in_zero: # Trailing zeros
-            translated_num.append(self.translate(["Zero", "TO", "f"]))
-            if zero_count > 1:
-                translated_num.append(*self._translate_num(zero_count, fold=False))
+            print(func_name, list(plan.params), end=" ... ", file=self.output) # Begin proccessing
+
+        returndict: dict[str, int|str] = {
+            "wordEng": plan.word_eng,
+            "wordFira": self.numeral_engine().to_fira(plan.value),
+            "value": plan.value,
+            "note": plan.note
+        }
 
         if not silent:
-            print("DONE") # Proccessing complete
+            print("DONE", file=self.output) # Proccessing complete
 
-        return "-".join(translated_num) if fold else translated_num
+        return returndict
 
-    def defnum(self, command_list: list[str], **kwargs) -> dict[str, int|str]:
-        '''Defines a number.'''
-        func_name = self.defnum.__name__.upper()
+
+    def defnum_range(self, command_list: list[str], **kwargs) -> int:
+        '''Defines every number from start to end (inclusive) in one batched write. Returns how many were defined.'''
+        func_name = self.defnum_range.__name__.upper()
 
          # Kwargs
         silent = kwargs.get("silent", True)
 
         if not silent:
-            print(func_name, command_list, end=" ... ") # Begin proccessing
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
 
-        if empty(command_list):
-            raise Fs.FSSyntaxError(f"{func_name} ERROR: No params provided in 「{' '.join(command_list)}」.")
-        if len(command_list) < 2:
-            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid number of params in 「{' '.join(command_list)}」.")
+        if len(command_list) not in [2, 4] or (len(command_list) == 4 and command_list[2] != "STEP"):
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{' '.join(command_list)}」 not in format 'RANGE <int> <int> <STEP <int>>'.")
         try:
-            value = int(command_list[1])
+            start, end = int(command_list[0]), int(command_list[1])
+            step = int(command_list[3]) if len(command_list) == 4 else 1
         except ValueError as e:
             raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid value in 「{' '.join(command_list)}」.") from e
+        if step <= 0 or start < 0 or end < start:
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid range in 「{' '.join(command_list)}」.")
 
-        returndict: dict[str, int|str] = {
-            "wordEng": command_list[0],
-            "wordFira": self._translate_num(value),
-            "value": value,
-            "note": ""
-        }
-
-        while len(command_list) > 2: # Has optional params
-            for i in range(len(command_list)-1, -1, -1):
-                match command_list[i]:
-                    case "NOTE":
-                        returndict["note"] = command_list[i+1]
-            if i == 0:
-                raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid subcommand in 「{' '.join(command_list)}」.")
-            command_list = command_list[:i] # Remove the subcommand
+        engine = self.numeral_engine()
+        self.repo.begin()
+        try:
+            for value in range(start, end+1, step):
+                word_eng, word_fira = numerals.english(value).lower(), engine.to_fira(value)
+                self._insert_word("num", value, word_eng, word_fira, "")
+                self.cache.discard(str(value), word_eng, word_fira)
+        except Exception:
+            self.repo.rollback()
+            raise
+        self.repo.commit()
 
         if not silent:
-            print("DONE") # Proccessing complete
+            print("DONE", file=self.output) # Proccessing complete
 
-        return returndict
+        return len(range(start, end+1, step))
 
+    def listwords(self, command_list: list[str], **kwargs) -> int:
+        '''Lists all words that match a string, prefix, regex or misspelling, streaming them a page at a time. Returns the number listed.'''
+        listed = 0
+        for row in self.search_words(command_list, **kwargs):
+            print(row, file=self.output)
+            listed += 1
+        return listed
 
-    def listwords(self, command_list: list[str], **kwargs) -> None:
-        '''Lists all words that match a regex string.'''
+    def search_words(self, command_list: list[str], **kwargs) -> Iterator[tuple]:
+        '''Checks the params of a LISTWORDS command and returns an iterator over the rows it matches, read from the database as needed.'''
         func_name = self.listwords.__name__.upper()
 
          # Kwargs
         silent = kwargs.get("silent", True)
 
         if not silent:
-            print(func_name, command_list, end=" ... ") # Begin proccessing
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
 
-        tables: list[sql.Table] = [self.root_word_table, self.word_table]
-        if empty(command_list): # If blank, return everything
-            conditions = [""]
+        tables = list(WORD_TABLES)
+        mode, folded, max_distance = "EXACT", False, 1
+        limit, offset = -1, 0
+        if empty(command_list) or command_list[0] == "": # If blank, return everything
+            lang, word = "", ""
             columns = ["*"]
         else:
-            conditions = [f"wordEng = \"{command_list[0]}\" OR wordFira = \"{command_list[0]}\""]
+            lang, word = "both", command_list[0]
             columns = ["wordEng", "wordFira"]
 
         # Check params
         while len(command_list) > 1: # Has optional params
-            for i in range(len(command_list)-1, -1, -1):
-                match command_list[i]:
-                    case "LANG":
-                        match command_list[i+1]:
-                            case "e":
-                                conditions = [f"wordEng = \"{command_list[0]}\""]
-                            case "f":
-                                conditions = [f"wordFira = \"{command_list[0]}\""]
-                            case _:
-                                raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid LANG value in 「{' '.join(command_list)}」.")
-                    case "TYPE":
-                        match command_list[i+1]:
+            for i in range(len(command_list)-1, 0, -1):
+                subparams = command_list[i+1:]
+                match command_list[i], len(subparams):
+                    case "LANG", 1:
+                        if subparams[0] not in ["e", "f"]:
+                            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid LANG value in 「{' '.join(command_list)}」.")
+                        lang = subparams[0]
+                        break
+                    case "TYPE", 1:
+                        match subparams[0]:
                             case "r":
-                                tables = [self.root_word_table]
+                                tables = ["root"]
                             case "c":
-                                tables = [self.word_table]
+                                tables = ["complex"]
                             case _:
                                 raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid TYPE value in 「{' '.join(command_list)}」.")
-                    case "NOTE":
-                        columns.append("note")
-            if i == 0:
+                        break
+                    case "NOTE", 0:
+                        if columns != ["*"]:
+                            columns.append("note")
+                        break
+                    case "FOLD", 0:
+                        folded = True
+                        break
+                    case "MATCH", 1 | 2:
+                        mode = subparams[0]
+                        if mode not in search.MODES or (len(subparams) == 2 and mode != "FUZZY"):
+                            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid MATCH value in 「{' '.join(command_list)}」.")
+                        if len(subparams) == 2:
+                            max_distance = self._non_negative_int(subparams[1], func_name, command_list)
+                        break
+                    case "LIMIT", 1:
+                        limit = self._non_negative_int(subparams[0], func_name, command_list)
+                        break
+                    case "OFFSET", 1:
+                        offset = self._non_negative_int(subparams[0], func_name, command_list)
+                        break
+            else:
                 raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid subcommand in 「{' '.join(command_list)}」.")
             command_list = command_list[:i] # Remove the last subcommand
 
+        if mode != "REGEX": # Regexes ignore case instead, as lowercasing one would change escapes such as \W
+            word = word.lower()
+        else:
+            try:
+                search.compile_pattern(search.fold(word) if folded else word)
+            except re.error as e:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid regex 「{word}」: {e}.") from e
+
         if not silent:
-            print("DONE") # Proccessing complete
+            print("DONE", file=self.output) # Proccessing complete
+
+        # Each table returns at most offset+limit rows, so only the requested page is ever read past
+        table_limit = -1 if limit == -1 else offset+limit
+        rows = itertools.chain.from_iterable(
+            self.repo.list_words(table_key, columns, word, lang, mode, folded, max_distance, table_limit) for table_key in tables
+        )
+        return itertools.islice(rows, offset, None if limit == -1 else offset+limit)
+
+    @staticmethod
+    def _non_negative_int(value: str, func_name: str, command_list: list[str]) -> int:
+        '''Parses a subcommand's int param.'''
+        if not value.isdigit():
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid int 「{value}」 in 「{' '.join(command_list)}」.")
+        return int(value)
+
+    def analyse(self, command_list: list[str], **kwargs) -> list[Analysis]:
+        '''Splits a Fira word that may not be stored into the stored words and endings it was built from, best first.'''
+        func_name = self.analyse.__name__.upper()
 
-        if not empty(conditions):
-            for table in tables:
-                for row in table.list_record("WHERE "+" AND ".join(conditions), ", ".join(columns)):
-                    print(row)
-        else:
-            for table in tables:
-                for row in table.list_record("", ", ".join(columns)):
-                    print(row)
+         # Kwargs
+        silent = kwargs.get("silent", True)
+
+        if not silent:
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
+
+        match command_list:
+            case [word]:
+                limit = 5
+            case [word, "LIMIT", value]:
+                limit = self._non_negative_int(value, func_name, command_list)
+            case _:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{' '.join(command_list)}」 not in format '<string> <LIMIT <int>>'.")
+
+        if self.analyser is None or self.analyser_generation != self.cache.generation:
+            self.analyser = Analyser(itertools.chain.from_iterable(self.repo.all_words(table_key) for table_key in WORD_TABLES))
+            self.analyser_generation = self.cache.generation
+        analyses = self.analyser.analyse(word, limit)
+        if len(analyses) == 0:
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{word}」 can't be split into known words.")
+
+        if not silent:
+            print("DONE", file=self.output) # Proccessing complete
+
+        return analyses
 
     def translate(self, command_list: list[str], **kwargs) -> str:
         '''Translates a word.'''
@@ -388,7 +495,7 @@ class Instructions:
         silent = kwargs.get("silent", True)
 
         if not silent:
-            print(func_name, command_list, end=" ... ") # Begin proccessing
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
 
         if empty(command_list):
             raise Fs.FSSyntaxError(f"{func_name} ERROR: No params provided in 「{' '.join(command_list)}」.")
@@ -400,15 +507,22 @@ class Instructions:
         root_translation, complex_translation = [], []
         if command_list[1] == "TO":
             word = command_list[0].lower()
+            lang = str.lower(command_list[2])[:1]
+            if lang in ["e", "f"]:
+                cached = self.cache.get(lang, word)
+                if cached is not None:
+                    if not silent:
+                        print("DONE", file=self.output) # Proccessing complete
+                    return cached
             if str.lower(command_list[2]) in ["e", "english"]:
-                root_translation = self.root_word_table.list_record(f"WHERE wordFira = \"{word}\"", "wordEng")
-                complex_translation = self.word_table.list_record(f"WHERE wordFira = \"{word}\"", "wordEng")
+                root_translation = self.repo.lookup_by_fira("root", word)
+                complex_translation = self.repo.lookup_by_fira("complex", word)
             elif str.lower(command_list[2]) in ["f", "fira"]:
-                root_translation = self.root_word_table.list_record(f"WHERE wordEng = \"{word}\"", "wordFira")
-                complex_translation = self.word_table.list_record(f"WHERE wordEng = \"{word}\"", "wordFira")
+                root_translation = self.repo.lookup_by_eng("root", word)
+                complex_translation = self.repo.lookup_by_eng("complex", word)
                 # If the word is a digit, check the num table
-                if word.isdigit():
-                    num_translation = self.num_table.list_record(f"WHERE value = {word}", "wordFira")
+                if word.isascii() and word.isdigit():
+                    num_translation = self.repo.lookup_by_value(int(word))
                     if len(num_translation) > 0:
                         complex_translation = num_translation
             else:
@@ -417,15 +531,111 @@ class Instructions:
             raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{' '.join(command_list)}」 not in format '<string> TO <e|f>', missing TO.")
 
         if not silent:
-            print("DONE") # Proccessing complete
+            print("DONE", file=self.output) # Proccessing complete
 
         if len(root_translation) > 0:
-            return root_translation[0][0]
+            self.cache.put(lang, word, root_translation[0])
+            return root_translation[0]
         if len(complex_translation) > 0:
-            return complex_translation[0][0]
+            self.cache.put(lang, word, complex_translation[0])
+            return complex_translation[0]
+        try: # Numbers don't need to be stored, they can be worked out
+            if lang == "f" and word.isascii() and word.isdigit():
+                return self.numeral_engine().to_fira(int(word))
+            if lang == "e":
+                return str(self.numeral_engine().to_int(word))
+        except Fs.FSError:
+            pass
 
         raise Fs.FSSyntaxError(f"{func_name} ERROR: No translation found for 「{' '.join(command_list)}」.")
 
+    def translate_many(self, words: list[str], lang: str) -> dict[str, str]:
+        '''Translates many lowercase words into lang ("e" or "f"), with one query per table for all the words not in the cache.
+        Returns {word: translation}. Words with no translation are left out.'''
+        found, missing = {}, []
+        for word in dict.fromkeys(words):
+            cached = self.cache.get(lang, word)
+            if cached is None:
+                missing.append(word)
+            else:
+                found[word] = cached
+        if empty(missing):
+            return found
+
+        root_translations = self.repo.lookup_many("root", missing, lang)
+        complex_translations = self.repo.lookup_many("complex", missing, lang)
+        if lang == "f": # Digits are checked in the num table too, as in translate
+            digits = {int(word): word for word in missing if word.isascii() and word.isdigit()}
+            for value, translation in self.repo.lookup_many("num", list(digits), lang).items():
+                complex_translations[digits[value]] = translation
+        for word in missing:
+            translation = root_translations.get(word, complex_translations.get(word))
+            if translation is not None:
+                translation = str(translation) # Words that look like numbers are stored as them
+                self.cache.put(lang, word, translation)
+                found[word] = translation
+        return found
+
+    def _translate_stream(self, stream: io.TextIOBase, lang: str) -> tuple[int, int]:
+        '''Translates text from stream a chunk at a time, writing each chunk to the output as soon as it is done.
+        Words without a translation are kept as they are. Returns the number of words and how many were not translated.'''
+        total, untranslated = 0, 0
+        while True:
+            lines = stream.readlines(self.STREAM_CHUNK)
+            if empty(lines):
+                break
+            text = "".join(lines)
+            translations = self.translate_many([match.group(0).lower() for match in self.WORD_PATTERN.finditer(text)], lang)
+            def replace(match: re.Match) -> str:
+                nonlocal total, untranslated
+                total += 1
+                word = match.group(0)
+                translation = translations.get(word.lower())
+                if translation is None:
+                    untranslated += 1
+                    return word
+                return translation[:1].upper()+translation[1:] if word[:1].isupper() else translation
+            output = self.output or sys.stdout
+            output.write(self.WORD_PATTERN.sub(replace, text))
+            output.flush()
+        return total, untranslated
+
+    def translate_text(self, command_list: list[str], **kwargs) -> None:
+        '''Translates several words, a text file or stdin and prints the translation.'''
+        func_name = self.translate_text.__name__.upper()
+
+         # Kwargs
+        silent = kwargs.get("silent", True)
+
+        if not silent:
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
+
+        if len(command_list) < 3 or command_list[-2] != "TO":
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{' '.join(command_list)}」 not in format '<strings|FILE <path>|STDIN> TO <e|f>'.")
+        if command_list[-1].lower() in ["e", "english"]:
+            lang = "e"
+        elif command_list[-1].lower() in ["f", "fira"]:
+            lang = "f"
+        else:
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{' '.join(command_list)}」 not in format '<strings> TO <e|f>', missing <e|f>.")
+
+        source = command_list[:-2]
+        if source[0] == "FILE":
+            if len(source) != 2:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{' '.join(command_list)}」 not in format 'FILE <path> TO <e|f>'.")
+            try:
+                with open(source[1], "r", encoding="utf-8") as f:
+                    total, untranslated = self._translate_stream(f, lang)
+            except OSError as e:
+                raise Fs.FSOSError(f"{func_name} ERROR: Could not read 「{source[1]}」: {e}") from e
+        elif source == ["STDIN"]:
+            total, untranslated = self._translate_stream(sys.stdin, lang)
+        else:
+            total, untranslated = self._translate_stream(io.StringIO(" ".join(source)+"\n"), lang)
+
+        if not silent:
+            print(f"DONE ({total} words, {untranslated} not translated)", file=self.output) # Proccessing complete
+
     def update(self, command_list: list[str], **kwargs) -> None:
         '''Updates a word.'''
         func_name = self.update.__name__.upper()
@@ -434,19 +644,38 @@ class Instructions:
         silent = kwargs.get("silent", True)
 
         if not silent:
-            print(func_name, command_list, end=" ... ") # Begin proccessing
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
 
         if empty(command_list):
             raise Fs.FSSyntaxError(f"{func_name} ERROR: No params provided in 「{' '.join(command_list)}」.")
-        if len(command_list) != 2:
+        if len(command_list) < 2:
             raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid number of params in 「{' '.join(command_list)}」.")
+        if len(command_list) > 2: # A pattern
+            options = self._pattern_options(command_list[2:], "f", func_name, command_list)
+            self._in_savepoint(lambda: self._update_matching(command_list[0], command_list[1].lower(), options, func_name), options["preview"])
+            if not silent:
+                print("DONE", file=self.output) # Proccessing complete
+            return
 
         word_eng, word_fira = command_list[0].lower(), command_list[1].lower()
-        if not self.root_word_table.update_record("wordFira", f"\"{word_fira}\"", f"WHERE wordEng = \"{word_eng}\""):
-            raise Fs.FSSyntaxError(f"{func_name} ERROR: No record found for 「{' '.join(command_list)}」.")
+         # Update the word and recompute its dependents in one transaction
+        self.repo.begin()
+        try:
+            if self.repo.update_fira("root", word_eng, word_fira) == 0:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: No record found for 「{' '.join(command_list)}」.")
+            self.cache.invalidate(word_eng, word_fira)
+            try:
+                changed = self._recompute(word_eng)
+            except Fs.FSError as e:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: Could not recompute the words that depend on 「{word_eng}」: {e}") from e
+        except Exception:
+            self.repo.rollback()
+            self.cache.clear()
+            raise
+        self.repo.commit()
 
         if not silent:
-            print("DONE") # Proccessing complete
+            print(f"DONE ({changed} dependent words recomputed)", file=self.output) # Proccessing complete
 
     def delete(self, command_list: list[str], **kwargs) -> None:
         '''Deletes a word.'''
@@ -456,17 +685,159 @@ class Instructions:
         silent = kwargs.get("silent", True)
 
         if not silent:
-            print(func_name, command_list, end=" ... ") # Begin proccessing
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
 
         if empty(command_list):
             raise Fs.FSSyntaxError(f"{func_name} ERROR: No params provided in 「{' '.join(command_list)}」.")
-        if len(command_list) != 1:
-            raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{' '.join(command_list)}」 not in format '<string>'.")
-        self.root_word_table.delete_record(f"WHERE wordEng = \"{command_list[0].lower()}\" OR wordFira = \"{command_list[0].lower()}\"")
-        self.word_table.delete_record(f"WHERE wordEng = \"{command_list[0].lower()}\" OR wordFira = \"{command_list[0].lower()}\"")
+        if len(command_list) > 1: # A pattern
+            options = self._pattern_options(command_list[1:], "both", func_name, command_list)
+            self._in_savepoint(lambda: self._delete_matching(command_list[0], options, func_name), options["preview"])
+            if not silent:
+                print("DONE", file=self.output) # Proccessing complete
+            return
+        for table_key in WORD_TABLES:
+            self.repo.delete_word(table_key, command_list[0].lower())
+        self.repo.delete_dependencies(command_list[0].lower()) # The deleted word no longer depends on anything
+        self.cache.invalidate(command_list[0])
 
         if not silent:
-            print("DONE") # Proccessing complete
+            print("DONE", file=self.output) # Proccessing complete
+
+    def _pattern_options(self, subparams: list[str], lang: str, func_name: str, command_list: list[str]) -> dict:
+        '''Parses the subcommands of the pattern forms of UPDATE and DELETE. lang is the LANG to use if none is given.'''
+        options = {"mode": "EXACT", "tables": None, "lang": lang, "cascade": False, "preview": False}
+        i = 0
+        while i < len(subparams):
+            match subparams[i], subparams[i+1:i+2]:
+                case "MATCH", [mode] if mode in search.PATTERN_MODES:
+                    options["mode"] = mode
+                    i += 1
+                case "TYPE", ["r" | "c" as table_type]:
+                    options["tables"] = ["root"] if table_type == "r" else ["complex"]
+                    i += 1
+                case "LANG", ["e" | "f" as lang]:
+                    options["lang"] = lang
+                    i += 1
+                case "CASCADE", _:
+                    options["cascade"] = True
+                case "PREVIEW", _:
+                    options["preview"] = True
+                case _:
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid subcommand 「{subparams[i]}」 in 「{' '.join(command_list)}」.")
+            i += 1
+        if options["mode"] == "REGEX":
+            try:
+                search.compile_pattern(command_list[0])
+            except re.error as e:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid regex 「{command_list[0]}」: {e}.") from e
+        return options
+
+    def _in_savepoint(self, change, preview: bool) -> None:
+        '''Runs a change to many words in one transaction. A preview undoes it once it has printed what it changed.'''
+        self.repo.begin()
+        self.repo.savepoint()
+        try:
+            change()
+        except Exception:
+            self.repo.rollback_to_savepoint()
+            self.repo.rollback()
+            self.cache.clear() # May hold words from the rolled back rows
+            raise
+        if preview:
+            self.repo.rollback_to_savepoint()
+        else:
+            self.repo.release_savepoint()
+        self.repo.commit()
+        self.cache.clear() # Too many words may have changed to invalidate them one at a time
+
+    def _matched(self, table_key: str, word: str, lang: str, mode: str) -> list[str]:
+        '''Returns the English words of the rows of a word table that a pattern matches.'''
+        return list(dict.fromkeys(str(row[0]) for row in self.repo.list_words(table_key, ["wordEng"], word, lang, mode)))
+
+    def _translates(self, word_eng: str) -> bool:
+        '''Whether a word is still in a word table.'''
+        return any(len(self.repo.lookup_by_eng(table_key, word_eng)) > 0 for table_key in WORD_TABLES)
+
+    def _delete_matching(self, word: str, options: dict, func_name: str) -> None:
+        '''Deletes the root and complex words a pattern matches, with one statement per table, and with CASCADE the
+        complex words built from them.'''
+        word = word if options["mode"] == "REGEX" else word.lower()
+        tables, lang, mode = options["tables"] or WORD_TABLES, options["lang"], options["mode"]
+        matched = {table_key: self._matched(table_key, word, lang, mode) for table_key in tables}
+        deleted = {table_key: self.repo.delete_matching(table_key, word, lang, mode) for table_key in tables}
+        for word_eng in matched.get("complex", []):
+            self.repo.delete_dependencies(word_eng) # The deleted words no longer depend on anything
+        gone = [word_eng for word_eng in dict.fromkeys(itertools.chain(*matched.values())) if not self._translates(word_eng)]
+        try:
+            users = self._dependents(*gone)
+        except Fs.FSError as e:
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: Could not find the words built from the deleted words: {e}") from e
+        if options["cascade"]:
+            for user in users:
+                self.repo.delete_eng("complex", user)
+                self.repo.delete_dependencies(user)
+
+        counts = f"{deleted.get('root', 0)} root words and {deleted.get('complex', 0)} complex words"
+        if options["cascade"]:
+            counts += f", and {len(users)} complex words built from them"
+        elif len(users) > 0:
+            counts += f". {len(users)} complex words are built from them: delete them with CASCADE, or see VERIFY"
+        print(f"{'Would delete' if options['preview'] else 'Deleted'} {counts}.", file=self.output)
+
+    def _update_matching(self, word: str, replacement: str, options: dict, func_name: str) -> None:
+        '''Rewrites the words a pattern matches with one statement per table: the Fira of root words (LANG f), recomputing
+        the words built from them with CASCADE, or the English of root and complex words (LANG e).'''
+        word = word if options["mode"] == "REGEX" else word.lower()
+        lang, mode, preview = options["lang"], options["mode"], options["preview"]
+        if lang == "f":
+            if options["tables"] == ["complex"]:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: The Fira of complex words comes from their formulas. Update the words they use instead.")
+            matched = self._matched("root", word, lang, mode)
+            changed = self.repo.rewrite_matching("root", word, lang, mode, replacement)
+            try:
+                recomputed = self._recompute(*matched) if options["cascade"] else len(self._dependents(*matched))
+            except Fs.FSError as e:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: Could not recompute the words that depend on the updated words: {e}") from e
+            message = f"{'Would update' if preview else 'Updated'} {changed} root words"
+            if options["cascade"]:
+                message += f" and {'recompute' if preview else 'recomputed'} {recomputed} dependent words"
+            elif recomputed > 0:
+                message += f". {recomputed} complex words are built from them: recompute them with CASCADE, or VERIFY FIX"
+            print(f"{message}.", file=self.output)
+            return
+
+        if options["cascade"]:
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: CASCADE only applies to LANG f, as renamed words keep their translations.")
+        tables = options["tables"] or WORD_TABLES
+        pattern, template = search.substitution(mode, search.normalise(word), replacement)
+        matched = {table_key: self._matched(table_key, word, lang, mode) for table_key in tables}
+        renamed = {word_eng: search.substitute(pattern, template, word_eng) for table_key in tables for word_eng in matched[table_key]}
+        changed = {table_key: self.repo.rewrite_matching(table_key, word, lang, mode, replacement) for table_key in tables}
+        gone = {old: new for old, new in renamed.items() if old != new and not self._translates(old)}
+        for old in gone:
+            if old in self.NUMERAL_WORDS:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: Can't rename 「{old}」, which numbers are written with.")
+
+         # Rewrite the formulas that name the renamed words: the renamed complex words' own, and those of the words built from them
+        formulas = {renamed[old]: old for old in matched.get("complex", [])} # Current name: name in the dependency index
+        for old in gone:
+            for dependent in self.repo.dependents(old):
+                formulas.setdefault(renamed.get(dependent, dependent) if dependent in matched.get("complex", []) else dependent, dependent)
+        for word_eng, indexed_as in formulas.items():
+            self.repo.delete_dependencies(indexed_as)
+            for word_fira, formula in self.repo.formulas(word_eng):
+                plan = derivation.compile_formula(formula, cache=False)
+                if any(word.lower() in gone for word in [*(ending for ending, _ in plan.endings), plan.derive]):
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: Can't rename the END or DERIVE words in 「{formula}」.")
+                plan = plan._replace(word_eng=word_eng if plan.word_eng.lower() != word_eng else plan.word_eng,
+                                     subwords=tuple(gone.get(subword.lower(), subword) for subword in plan.subwords))
+                try:
+                    self.repo.update_formula(word_eng, word_fira, derivation.to_line(plan))
+                except ValueError as e:
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: Can't write the formula of 「{word_eng}」 with the new names: {e}.") from e
+                self._add_dependencies(word_eng, plan.dependencies)
+        print(f"{'Would rename' if preview else 'Renamed'} {changed.get('root', 0)} root words and {changed.get('complex', 0)} complex words, "
+              f"rewriting {len(formulas)} formulas.", file=self.output)
 
     def help(self, **kwargs) -> list[str]:
         '''Prints a list of commands.'''
@@ -476,12 +847,12 @@ class Instructions:
         silent = kwargs.get("silent", True)
 
         if not silent:
-            print(func_name, end=" ... ") # Begin proccessing
+            print(func_name, end=" ... ", file=self.output) # Begin proccessing
 
         f = file.read("docs/fs_info.md", "utf-8")
 
         if not silent:
-            print("DONE") # Proccessing complete
+            print("DONE", file=self.output) # Proccessing complete
 
         return ["Info (read from fs_info.md):"]+f
 
@@ -490,29 +861,499 @@ class Instructions:
         func_name = self.read.__name__.upper()
 
          # Check for errors
-        if empty(command_list) or len(command_list) != 1:
+        incremental = command_list[1:] == ["INCREMENTAL"]
+        parallel = command_list[1:2] == ["PARALLEL"] and len(command_list) <= 3
+        resume = command_list[1:2] == ["RESUME"] and len(command_list) <= 3
+        if empty(command_list) or (len(command_list) != 1 and not incremental and not parallel and not resume):
             raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid number of params in 「{' '.join(command_list)}」.")
         if not re.search(".fira$", command_list[0]):
             # Not a .fira file - try adding '.fira' to it
-            return self.read([f"{command_list[0]}.fira"], depth)
+            return self.read([f"{command_list[0]}.fira", *command_list[1:]], depth)
             #raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid file type: 「{command_list[0]}」.")
+        with self._reading(command_list[0], func_name):
+            if parallel:
+                jobs = self._non_negative_int(command_list[2], func_name, command_list) if len(command_list) == 3 else os.cpu_count() or 1
+                build.build(self, [command_list[0]], max(jobs, 1))
+                return False
+            try:
+                commands, _ = fs_parser.compile_file(command_list[0], self.compile_cache)
+            except FileNotFoundError as e:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: File not found: 「{command_list[0]}」.") from e
+            except UnicodeDecodeError as e:
+                raise Fs.FSOSError(f"{func_name} ERROR: File is not valid UTF-8: 「{command_list[0]}」.") from e
+            if incremental:
+                return self._read_incremental(command_list[0], commands, depth)
+            if resume:
+                every = self._non_negative_int(command_list[2], func_name, command_list) if len(command_list) == 3 else self.CHECKPOINT_LINES
+                return self._read_resumable(command_list[0], commands, max(every, 1), depth)
+
+             # Read the file line by line, in one transaction so that a failing line rolls back the whole file
+            self.repo.begin()
+            end = False
+            try:
+                for line_number, file_command in enumerate(commands):
+                    if self.print_read:
+                        print(Colours.OKCYAN, f"Reading {command_list[0]} line {line_number+1} |", Colours.ENDC, f"{file_command.line}", file=self.output)
+                    try:
+                        end = self.execute(file_command, depth=depth+1, source=(command_list[0], line_number+1))
+                        if end:
+                            break
+                    except Fs.FSSyntaxError as e:
+                        raise Fs.FSSyntaxError(f"{func_name} ERROR: Error in file 「{command_list[0]}」 at line {line_number+1}: {e}") from e
+            except Exception:
+                self.repo.rollback()
+                self.cache.clear() # May hold words from the rolled back rows
+                raise
+            self.repo.commit()
+            return end
+
+    def _read_resumable(self, path: str, commands: list[fs_parser.Command], every: int, depth: int) -> bool:
+        '''Runs a file in checkpoints of every lines, continuing from the last checkpoint of a run that failed. Each checkpoint
+        is a savepoint, committed (if this is the outermost transaction) along with the file's progress, so a failing line
+        only undoes the lines since the last checkpoint. Returns True if the program should exit.'''
+        func_name = self.read.__name__.upper()
+        file = os.path.abspath(path)
+        applied = hashlib.sha256() # Of the lines before the checkpoint
+        position = 0 # Lines before the checkpoint
+        progress = self.repo.read_progress(file)
+        if progress is not None:
+            for file_command in commands[:progress[1]]:
+                applied.update(file_command.line.encode("utf-8")+b"\n")
+            if progress[1] <= len(commands) and applied.hexdigest() == progress[0]:
+                position = progress[1]
+            else: # Lines that were already applied have changed
+                print(Colours.WARNING, f"Lines before line {progress[1]+1} of {path} changed since it stopped. Reading it from the start.", Colours.ENDC, file=self.output)
+                applied = hashlib.sha256()
+            if not self.silent and position > 0:
+                print(f"Resuming {path} at line {position+1}.", file=self.output)
+
+        outermost = not self.repo.in_transaction
+        self.repo.begin()
+        end = False
+        try:
+            while position < len(commands) and not end:
+                chunk = commands[position:position+every]
+                self.repo.savepoint()
+                try:
+                    for line_number, file_command in enumerate(chunk, position+1):
+                        if self.print_read:
+                            print(Colours.OKCYAN, f"Reading {path} line {line_number} |", Colours.ENDC, f"{file_command.line}", file=self.output)
+                        try:
+                            end = self.execute(file_command, depth=depth+1, source=(path, line_number))
+                        except Fs.FSSyntaxError as e:
+                            raise Fs.FSSyntaxError(f"{func_name} ERROR: Error in file 「{path}」 at line {line_number}: {e}") from e
+                        if end:
+                            break
+                except Exception:
+                    self.repo.rollback_to_savepoint()
+                    raise
+                for file_command in chunk:
+                    applied.update(file_command.line.encode("utf-8")+b"\n")
+                position += len(chunk)
+                self.repo.set_progress(file, applied.hexdigest(), position)
+                self.repo.release_savepoint()
+                self.repo.checkpoint()
+        except Fs.FSError as e:
+            self.cache.clear() # May hold words from the rolled back rows
+            if not outermost: # The enclosing transaction decides what to keep
+                self.repo.rollback()
+                raise
+            self.repo.commit() # Keep the checkpoints
+            raise type(e)(f"{e} The first {position} lines were kept: fix the file and READ it with RESUME to carry on from line {position+1}.") from e
+        except Exception:
+            self.repo.rollback()
+            self.cache.clear()
+            raise
+        self.repo.clear_progress(file)
+        self.repo.commit()
+        return end
+
+    @contextmanager
+    def _reading(self, path: str, func_name: str) -> Iterator[None]:
+        '''Notes that a file is being read for the duration of the with block. Raises FSRecursionError if it is already
+        being read, i.e. it imports itself through the files it reads.'''
+        file = os.path.abspath(path)
+        if file in self.reading:
+            cycle = self.reading[self.reading.index(file):]+[file]
+            raise Fs.FSRecursionError(f"{func_name} ERROR: Circular import: {' -> '.join(f'「{os.path.relpath(step)}」' for step in cycle)}.")
+        self.reading.append(file)
+        try:
+            yield
+        finally:
+            self.reading.pop()
+
+    def import_once(self, command_list: list[str], depth: int = 0) -> bool:
+        '''Reads a .fira file unless it has already been applied and hasn't changed since. Files it imports are checked
+        the same way, so a file is skipped only if nothing it imports has changed either. A changed file is applied as
+        READ ... INCREMENTAL would. Returns True if the program should exit.'''
+        func_name = "IMPORT-ONCE"
+
+        if len(command_list) != 1:
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid number of params in 「{' '.join(command_list)}」.")
+        self.repo.begin() # The files it imports are applied together or not at all
         try:
-            f = file.read(command_list[0], "utf-8")
+            end = self._import_once(command_list[0], depth, set())
+        except Exception:
+            self.repo.rollback()
+            self.cache.clear() # May hold words from the rolled back rows
+            raise
+        self.repo.commit()
+        return end
+
+    def _import_once(self, path: str, depth: int, checked: set[str]) -> bool:
+        '''Applies a file for IMPORT-ONCE, then the files it imports. checked holds the files already looked at by this
+        IMPORT-ONCE, which aren't looked at again. Returns True if the program should exit.'''
+        func_name = "IMPORT-ONCE"
+        path = path if re.search(".fira$", path) else f"{path}.fira"
+        file = os.path.abspath(path)
+        if file in checked and file not in self.reading:
+            return False
+        checked.add(file)
+        try:
+            stat = os.stat(path)
         except FileNotFoundError as e:
-            raise Fs.FSSyntaxError(f"{func_name} ERROR: File not found: 「{command_list[0]}」.") from e
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: File not found: 「{path}」.") from e
+        stamp, record, end = f"{stat.st_mtime_ns}:{stat.st_size}", self.repo.file_record(file), False
+        with self._reading(path, func_name):
+            if record is not None and record[1] == stamp: # Untouched since it was applied
+                imports = record[2]
+            else:
+                try:
+                    commands, digest = fs_parser.compile_file(path, self.compile_cache)
+                except UnicodeDecodeError as e:
+                    raise Fs.FSOSError(f"{func_name} ERROR: File is not valid UTF-8: 「{path}」.") from e
+                imports = [os.path.abspath(command.params[0] if re.search(".fira$", command.params[0]) else f"{command.params[0]}.fira")
+                           for command in commands if command.instruction == "IMPORT-ONCE" and len(command.params) == 1]
+                if record is None or record[0] != digest:
+                    if not self.silent:
+                        print(f"Importing {os.path.relpath(file)} ({'changed' if record is not None else 'new'}).", file=self.output)
+                    end = self._read_incremental(path, commands, depth)
+                    record = None
+                self.repo.set_file_record(file, digest, stamp, imports)
+            if record is not None and not self.silent:
+                print(f"{os.path.relpath(file)} is up to date.", file=self.output)
+            for imported in imports:
+                if end:
+                    break
+                end = self._import_once(imported, depth+1, checked)
+        return end
+
+    def verify(self, command_list: list[str], **kwargs) -> list["verify.Finding"]:
+        '''Re-evaluates the formula of every complex word against the current lexicon, in parallel over a snapshot of it,
+        and reports words whose Fira has drifted, formulas that use missing words or are invalid, and cycles.
+        FIX updates drifted words that aren't part of a cycle, and the words built from them. Returns the findings.'''
+        func_name = self.verify.__name__.upper()
+
+         # Kwargs
+        silent = kwargs.get("silent", True)
+
+        if not silent:
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
 
-         # Read the file line by line
-        for line_number, file_line in enumerate(f):
-            if self.print_read:
-                print(Colours.OKCYAN, f"Reading {command_list[0]} line {line_number+1} |", Colours.ENDC, f"{file_line}")
+        fix, jobs, i = False, os.cpu_count() or 1, 0
+        while i < len(command_list):
+            match command_list[i]:
+                case "FIX":
+                    fix = True
+                case "JOBS" if i+1 < len(command_list):
+                    jobs = max(self._non_negative_int(command_list[i+1], func_name, command_list), 1)
+                    i += 1
+                case _:
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid subcommand 「{command_list[i]}」 in 「{' '.join(command_list)}」.")
+            i += 1
+        if not isinstance(self.repo, (LexiconRepository, ModelRepository)):
+            raise Fs.FSDatabaseError(f"{func_name} ERROR: Can only verify a database.")
+        if self.chain != ["main"]:
+            raise Fs.FSDatabaseError(f"{func_name} ERROR: Can only verify the main lexicon. Run LEXICON USE main first.")
+
+        self.repo.flush() # The snapshot reads the tables directly
+        handle, snapshot_path = tempfile.mkstemp(suffix=".snap")
+        os.close(handle)
+        try:
+            snapshot.export(self.repo.connection, snapshot_path, verify.INDEXES)
+            checked, findings, cyclic = verify.verify(self.repo.all_rows("complex"), snapshot_path, jobs)
+        except OSError as e:
+            raise Fs.FSOSError(f"{func_name} ERROR: Could not write a snapshot of the lexicon: {e}.") from e
+        finally:
+            os.remove(snapshot_path)
+
+        fixed = 0
+        if fix:
+            self.repo.begin()
             try:
-                end = self.decode(file_line, depth=depth+1)
-                if end:
-                    return True
-            except Fs.FSSyntaxError as e:
-                raise Fs.FSSyntaxError(f"{func_name} ERROR: Error in file 「{command_list[0]}」 at line {line_number+1}: {e}") from e
-        return False
+                for finding in findings:
+                    if finding.kind == "DRIFT" and finding.word_eng not in cyclic: # Would never settle
+                        fixed += self._fix_drift(finding.word_eng)
+            except Exception:
+                self.repo.rollback()
+                self.cache.clear() # May hold words from the rolled back rows
+                raise
+            self.repo.commit()
+
+        if not silent:
+            print("DONE", file=self.output) # Proccessing complete
+        for finding in findings:
+            print(finding, file=self.output)
+        counts = Counter(finding.kind for finding in findings)
+        print(f"Verified {checked} complex words: {', '.join(f'{counts[kind]} {kind.lower()}' for kind in verify.KINDS)}."
+              + (f" Fixed {fixed} words." if fix else ""), file=self.output)
+        return findings
+
+    def _fix_drift(self, word_eng: str) -> int:
+        '''Evaluates each formula of a complex word again and stores the result if it changed, then recomputes the words
+        built from it. Returns the number of words changed.'''
+        changed = 0
+        for old_fira, formula in self.repo.formulas(word_eng):
+            new_fira = self.evaluate(derivation.compile_formula(formula)).lower()
+            if new_fira != old_fira and self.repo.update_complex_fira(word_eng, old_fira, new_fira) > 0:
+                self.cache.invalidate(word_eng, old_fira, new_fira)
+                changed += 1
+        return changed+(self._recompute(word_eng) if changed > 0 else 0)
+
+    def export(self, command_list: list[str], **kwargs) -> None:
+        '''Exports the lexicon to a file.'''
+        func_name = self.export.__name__.upper()
+
+         # Kwargs
+        silent = kwargs.get("silent", True)
+
+        if not silent:
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
+
+        if len(command_list) != 2:
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid number of params in 「{' '.join(command_list)}」.")
+        if not isinstance(self.repo, (LexiconRepository, ModelRepository)):
+            raise Fs.FSDatabaseError(f"{func_name} ERROR: Can only export from a database.")
+        if command_list[0] not in ["SNAPSHOT"]+transfer.FORMATS:
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid export format in 「{' '.join(command_list)}」.")
+        try:
+            if command_list[0] == "SNAPSHOT":
+                if self.chain != ["main"]:
+                    raise Fs.FSDatabaseError(f"{func_name} ERROR: Can only snapshot the main lexicon. Run LEXICON USE main first.")
+                self.repo.flush() # The snapshot reads the tables directly
+                count = sum(snapshot.export(self.repo.connection, command_list[1]).values())
+            else:
+                count = transfer.export(self.repo, file_format=command_list[0], path=command_list[1])
+        except OSError as e:
+            raise Fs.FSOSError(f"{func_name} ERROR: Could not write 「{command_list[1]}」: {e}.") from e
+
+        if not silent:
+            print("DONE", file=self.output) # Proccessing complete
+        print(f"Exported {count} {'entries' if command_list[0] == 'SNAPSHOT' else 'words'} to {command_list[1]}.", file=self.output)
+
+    def import_(self, command_list: list[str], **kwargs) -> int:
+        '''Imports words exported by EXPORT CSV, JSONL or FIRA. Returns the number of words imported, or -1 if a FIRA file
+        had to be READ.'''
+        func_name = self.import_.__name__.rstrip("_").upper()
+
+         # Kwargs
+        silent = kwargs.get("silent", True)
+
+        if not silent:
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
+
+        if len(command_list) != 2:
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid number of params in 「{' '.join(command_list)}」.")
+        if command_list[0] not in transfer.FORMATS:
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid import format in 「{' '.join(command_list)}」.")
+        if command_list[0] == "FIRA": # Every word is recomputed from its definition
+            count = build.build(self, [command_list[1]], os.cpu_count() or 1)
+        else: # The rows already hold their Fira forms, so they are inserted as they are
+            count = 0
+            self.repo.begin()
+            try:
+                for table_key, row in transfer.read_records(file_format=command_list[0], path=command_list[1]):
+                    self._insert_word(table_key, *row)
+                    if table_key == "complex":
+                        self._add_dependencies(row[0], derivation.compile_formula(row[2]).dependencies)
+                    count += 1
+            except Exception:
+                self.repo.rollback()
+                raise
+            finally:
+                self.cache.clear()
+            self.repo.commit()
+
+        if not silent:
+            print("DONE", file=self.output) # Proccessing complete
+        if count >= 0:
+            print(f"Imported {count} words from {command_list[1]}.", file=self.output)
+        return count
+
+    def lexicon(self, command_list: list[str], **kwargs) -> None:
+        '''Attaches lexicons in other files as namespaces, layers them over the main one and merges them into it.'''
+        func_name = self.lexicon.__name__.upper()
+
+         # Kwargs
+        silent = kwargs.get("silent", True)
+
+        if not silent:
+            print(func_name, command_list, end=" ... ", file=self.output) # Begin proccessing
+
+        if empty(command_list):
+            raise Fs.FSSyntaxError(f"{func_name} ERROR: No params provided in 「{' '.join(command_list)}」.")
+        if not isinstance(self.repo, LexiconRepository):
+            raise Fs.FSDatabaseError(f"{func_name} ERROR: Namespaces can only be attached to a database opened from a file.")
+        if self.repo.in_transaction and command_list[0] in ["ATTACH", "DETACH"]:
+            raise Fs.FSDatabaseError(f"{func_name} ERROR: Can't {command_list[0].lower()} a namespace while a file is being read.")
+        namespaces = self.repo.namespaces()
+        match command_list:
+            case ["ATTACH", namespace, path]:
+                if not namespace.isidentifier() or namespace.lower() in ["main", "temp"] or namespace in namespaces:
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid or taken namespace 「{namespace}」.")
+                from fs import FiraScript # Imported here, as fs imports this module
+                try:
+                    connection = FiraScript.connect(path)
+                except Exception as e:
+                    raise Fs.FSOSError(f"{func_name} ERROR: Could not open 「{path}」: {e}.") from e
+                try:
+                    FiraScript.create_tables(connection) # So that a new file can be used as a draft
+                finally:
+                    connection.close()
+                self.repo.attach(namespace, path)
+                message = f"Attached {path} as {namespace}."
+            case ["USE", *chain]:
+                if len(chain) in [0, 2] or len(chain) > 2 and chain[1] != "OVER":
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{' '.join(command_list)}」 not in format 'USE <name> [OVER <name> ...]'.")
+                chain = chain[:1]+chain[2:]
+                chain += ["main"] if chain[-1] != "main" else []
+                for namespace in chain:
+                    if namespace not in namespaces:
+                        raise Fs.FSSyntaxError(f"{func_name} ERROR: No namespace 「{namespace}」 attached.")
+                if len(set(chain)) != len(chain) or chain.index("main") != len(chain)-1:
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: Each namespace can only be used once, over main, in 「{' '.join(command_list)}」.")
+                self._use(chain)
+                message = f"Using {' -> '.join(chain)}."
+            case ["MERGE", namespace]:
+                if namespace not in self.chain[:-1]:
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{namespace}」 is not layered over another namespace.")
+                target = self.chain[self.chain.index(namespace)+1]
+                message = f"Merged {namespace} into {target}: {self._merge(namespace, target)} dependent words recomputed."
+            case ["DETACH", namespace]:
+                if namespace not in namespaces or namespace == "main":
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: No namespace 「{namespace}」 attached.")
+                if namespace in self.chain:
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: 「{namespace}」 is in use. Run LEXICON USE without it first.")
+                self.repo.detach(namespace)
+                self.caches = {chain: cache for chain, cache in self.caches.items() if namespace not in chain}
+                message = f"Detached {namespace}."
+            case ["LIST"]:
+                message = "\n".join(f"{'*' if namespace in self.chain else ' '} {namespace}: {path or '(memory)'}"
+                                    for namespace, path in namespaces.items())+f"\nUsing {' -> '.join(self.chain)}."
+            case _:
+                raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid subcommand in 「{' '.join(command_list)}」.")
 
+        if not silent:
+            print("DONE", file=self.output) # Proccessing complete
+        print(message, file=self.output)
+
+    def _use(self, chain: list[str]) -> None:
+        '''Looks translations up through a chain of namespaces, top first, and writes words to the top one.'''
+        if self.cache.generation != self.chain_generation: # Words were written to the top namespace
+            self._forget(self.chain[0])
+        self.chain = chain
+        self.repo.set_layers(chain)
+        self.cache = self.caches.setdefault(tuple(chain), LexiconCache(self.cache.max_size))
+        self.chain_generation = self.cache.generation
+        self.numerals.generation = -1 # The digit forms may come from another namespace
+        self.analyser = None
+
+    def _forget(self, *namespaces: str) -> None:
+        '''Clears the translation caches of the other chains that use the namespaces, after words in them changed.'''
+        for chain, cache in self.caches.items():
+            if list(chain) != self.chain and not set(namespaces).isdisjoint(chain):
+                cache.clear()
+
+    def _merge(self, source: str, target: str) -> int:
+        '''Moves the words of a namespace into the one under it, then recomputes the words of the target built from them.
+        Returns the number of words recomputed.'''
+        chain = self.chain
+        moved = self.repo.merge(source, target)
+        self._forget(source, target)
+        self.cache.clear()
+        self._use(chain[chain.index(target):]) # The target's words are only built from the namespaces under it
+        self.repo.begin()
+        try:
+            recomputed = self._recompute(*moved)
+        except Exception:
+            self.repo.rollback()
+            self.cache.clear() # May hold words from the rolled back rows
+            self._use(chain)
+            raise
+        self.repo.commit()
+        self._use(chain)
+        return recomputed
+
+    def _read_incremental(self, path: str, commands: list[fs_parser.Command], depth: int) -> bool:
+        '''Runs only the lines of a file that changed since it was last read with READ ... INCREMENTAL. The words defined by
+        removed lines are deleted, added lines are run and complex words that depend on any of those words are recomputed.
+        If either version of the file uses an ORDER_DEPENDENT instruction, its words are deleted and it is run in full instead.
+        Returns True if the program should exit.'''
+        func_name = self.read.__name__.upper()
+        file = os.path.abspath(path)
+        old = self.repo.import_lines(file)
+        new = Counter(command.line.strip() for command in commands if command.instruction not in ["", "#"] or command.error != "")
+        instructions = {command.instruction for command in commands}|{line.split(None, 1)[0] for line in old}
+        incremental = len(old) > 0 and instructions.isdisjoint(self.ORDER_DEPENDENT)
+        to_run = new-Counter(old) if incremental else Counter(new)
+        planned = sum(to_run.values())
+
+        self.repo.begin()
+        end, outer_rows, undone, recomputed = False, self.import_rows, set(), 0
+        try:
+             # Forget the removed lines, and delete their words unless another line still defines them
+            for line in old:
+                if not incremental or line not in new:
+                    undone.update(self.repo.import_rows(file, line))
+                    self.repo.set_import_line(file, line, 0)
+            for table_key, word in undone:
+                if self.repo.import_row_users(table_key, word) == 0:
+                    self._delete_defined(table_key, word)
+
+             # Run the new lines, noting the words each defines
+            for line_number, file_command in enumerate(commands):
+                line = file_command.line.strip()
+                if to_run[line] <= 0:
+                    continue
+                to_run[line] -= 1
+                if self.print_read:
+                    print(Colours.OKCYAN, f"Reading {path} line {line_number+1} |", Colours.ENDC, f"{file_command.line}", file=self.output)
+                self.import_rows = []
+                try:
+                    end = self.execute(file_command, depth=depth+1, source=(path, line_number+1))
+                except Fs.FSSyntaxError as e:
+                    raise Fs.FSSyntaxError(f"{func_name} ERROR: Error in file 「{path}」 at line {line_number+1}: {e}") from e
+                for table_key, word in self.import_rows:
+                    self.repo.insert("import_rows", file, line, table_key, word)
+                self.import_rows = outer_rows
+                if end:
+                    break
+            for line, count in new.items():
+                if not incremental or old.get(line) != count:
+                    self.repo.set_import_line(file, line, count)
+
+             # Words defined elsewhere may use the words that were undone (and maybe defined again differently).
+             # Newly defined words can't have been used by anything yet
+            for table_key, word in undone:
+                if table_key in WORD_TABLES:
+                    try:
+                        recomputed += self._recompute(word)
+                    except Fs.FSSyntaxError as e:
+                        raise Fs.FSSyntaxError(f"{func_name} ERROR: Could not recompute the words using 「{word}」 from 「{path}」: {e}") from e
+        except Exception:
+            self.import_rows = outer_rows
+            self.repo.rollback()
+            self.cache.clear() # May hold words from the rolled back rows
+            raise
+        self.repo.commit()
+
+        if not self.silent:
+            removed = sum(count for line, count in old.items() if line not in new) if incremental else sum(old.values())
+            print(f"{path}: {removed} lines undone, {planned-sum(to_run.values())} run "
+                  f"({'incremental' if incremental else 'in full'}), {recomputed} dependent words recomputed.", file=self.output)
+        return end
+
+    @tracks_depth
     def debug(self, command_list: list[str]) -> None:
         '''Used for debugging.'''
         func_name = self.debug.__name__.upper()
@@ -521,7 +1362,7 @@ class Instructions:
             raise Fs.FSSyntaxError(f"{func_name} ERROR: No params provided in 「{' '.join(command_list)}」.")
 
         for i in range(len(command_list)-1, -1, -1):
-            if command_list[i] in ["SILENT", "MAX-RECUR"]:
+            if command_list[i] in ["SILENT", "MAX-RECUR", "CACHE", "REINDEX", "SCHEMA", "PROFILE"]:
                 break
         if i > 0:
             self.debug(command_list[:i]) # Recursion without this subcommand
@@ -537,7 +1378,7 @@ class Instructions:
                     else: # toggle
                         self.silent = not self.silent
                         #raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid SILENT value in 「{' '.join(command_list)}」.")
-                print(f"Silent mode set to {self.silent}.")
+                print(f"Silent mode set to {self.silent}.", file=self.output)
             case "MAX-RECUR":
                 old_max = self.max_recursion_depth
                 if i == len(command_list)-1: # No param
@@ -547,7 +1388,7 @@ class Instructions:
                         self.max_recursion_depth = int(command_list[i+1])
                     except ValueError as e:
                         raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid MAX-RECUR value in 「{' '.join(command_list)}」.") from e
-                print(f"Max recursion depth updated from {old_max} to {self.max_recursion_depth}.")
+                print(f"Max recursion depth updated from {old_max} to {self.max_recursion_depth}.", file=self.output)
             case "PRINT-READ": # Toggle printing the current read file line number
                 if i == len(command_list)-1: # No param
                     self.print_read = not self.print_read
@@ -561,9 +1402,61 @@ class Instructions:
                         #raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid PRINT-READ value in 「{' '.join(command_list)}」.")
             case "RDB":
                 # Delete all records in the database
-                self.root_word_table.delete_record()
-                self.word_table.delete_record()
-                self.num_table.delete_record()
-
+                for table_key in TABLE_NAMES:
+                    self.repo.delete_all(table_key)
+                self.cache.clear()
+            case "REINDEX": # Rebuild the dependency index from the stored formulas, e.g. for databases made before it existed
+                self.repo.delete_all("deps")
+                for word_eng, formula in self.repo.all_formulas():
+                    try:
+                        self._add_dependencies(word_eng, derivation.compile_formula(formula).dependencies)
+                    except Fs.FSError as e:
+                        print(Colours.WARNING, f"Could not index 「{word_eng}」: {e}", Colours.ENDC, file=self.output)
+                print("Dependency index rebuilt.", file=self.output)
+            case "SCHEMA": # Print the schema version and check that lookups use indexes
+                print(f"Schema version {schema.get_version(self.repo.connection)} (latest {schema.SCHEMA_VERSION}).", file=self.output)
+                for problem in schema.check_query_plans(self.repo.connection):
+                    print(Colours.WARNING, f"Full table scan: {problem}", Colours.ENDC, file=self.output)
+            case "CACHE": # Print the translation cache counters, or clear/resize the cache
+                if i < len(command_list)-1:
+                    if command_list[i+1].upper() == "CLEAR":
+                        self.cache.clear()
+                    else:
+                        try:
+                            self.cache.max_size = int(command_list[i+1])
+                        except ValueError as e:
+                            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid CACHE value in 「{' '.join(command_list)}」.") from e
+                        self.cache.clear()
+                print(self.cache.stats(), file=self.output)
+            case "PROFILE": # Time commands and count the SQL they run
+                subparams = command_list[i+1:]
+                match [subparam.upper() for subparam in subparams[:1]]+subparams[1:]:
+                    case []: # Toggle
+                        if self.profiler.enabled:
+                            self.profiler.stop()
+                        else:
+                            self.profiler.start(self.repo.connection)
+                    case ["ON"]:
+                        self.profiler.start(self.repo.connection)
+                    case ["OFF"]:
+                        self.profiler.stop()
+                    case ["RESET"]:
+                        self.profiler.reset()
+                    case ["REPORT"] | ["REPORT", _]:
+                        if len(subparams) == 2 and not subparams[1].isdigit():
+                            raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid PROFILE REPORT value in 「{' '.join(command_list)}」.")
+                        for line in self.profiler.report(int(subparams[1]) if len(subparams) == 2 else 10):
+                            print(line, file=self.output)
+                        return
+                    case ["DUMP", path]:
+                        try:
+                            self.profiler.dump(path)
+                        except OSError as e:
+                            raise Fs.FSOSError(f"{func_name} ERROR: Could not write 「{path}」: {e}.") from e
+                        print(f"Profile written to {path}.", file=self.output)
+                        return
+                    case _:
+                        raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid PROFILE value in 「{' '.join(command_list)}」.")
+                print(f"Profiling {'on' if self.profiler.enabled else 'off'}.", file=self.output)
             case _:
                 raise Fs.FSSyntaxError(f"{func_name} ERROR: Invalid subcommand in 「{' '.join(command_list)}」.")
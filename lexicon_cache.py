@@ -0,0 +1,62 @@
+'''Bounded in-process cache for translations made by the FiraScript interpreter.'''
+from collections import OrderedDict
+
+class LexiconCache:
+    '''LRU cache of translations, keyed on the target language and the (lowercase) word being translated.'''
+    def __init__(self, max_size: int = 4096) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0 # Increased whenever entries are removed, so things built from translations know to rebuild
+        self._entries: OrderedDict[tuple[str, str], str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, lang: str, word: str) -> str|None:
+        '''Returns the cached translation of word into lang ("e" or "f"), or None if it is not cached.'''
+        key = (lang, word)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, lang: str, word: str, translation: str) -> None:
+        '''Stores a translation, evicting the least recently used entry if the cache is full.'''
+        if self.max_size <= 0:
+            return
+        key = (lang, word)
+        self._entries[key] = translation
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, *words: str) -> None:
+        '''Removes the entries for translating each word in either direction.'''
+        self.generation += 1
+        for word in words:
+            word = word.lower()
+            self._entries.pop(("e", word), None)
+            self._entries.pop(("f", word), None)
+
+    def invalidate(self, *words: str) -> None:
+        '''Removes every entry where one of the words is either the word being translated or its translation.
+        Slower than discard, but also catches entries that translate into a word that has changed.'''
+        self.generation += 1
+        words = {word.lower() for word in words}
+        stale = [key for key, translation in self._entries.items() if key[1] in words or translation in words]
+        for key in stale:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        '''Removes all entries. The hit/miss counters are kept.'''
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> str:
+        '''Returns a summary of the cache usage.'''
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total > 0 else 0.0
+        return f"Cache: {len(self._entries)}/{self.max_size} entries, {self.hits} hits, {self.misses} misses ({ratio:.1f}% hit rate)."
@@ -0,0 +1,129 @@
+'''
+Load test for server.py. Sends translation requests from many concurrent keep-alive connections and reports the
+throughput and latency percentiles.
+
+Usage:
+    python loadtest.py [--host 127.0.0.1] [--port 8765 | --unix PATH] [--connections 16] [--requests 10000]
+    python loadtest.py --spawn lexicon.db ...     # Start a server on lexicon.db for the test, then stop it
+'''
+ # Library imports
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+ # Local imports
+from benchmark import percentiles
+
+class Client:
+    '''One keep-alive HTTP connection to the server.'''
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    @staticmethod
+    async def open(args: argparse.Namespace) -> "Client":
+        '''Connects to the server given on the command line.'''
+        if args.unix:
+            return Client(*await asyncio.open_unix_connection(args.unix))
+        return Client(*await asyncio.open_connection(args.host, args.port))
+
+    async def request(self, method: str, target: str, body: bytes = b"") -> tuple[int, dict]:
+        '''Sends a request and returns the status and JSON payload of the response.'''
+        self.writer.write(f"{method} {target} HTTP/1.1\r\nHost: fira\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1")+body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while (header := await self.reader.readline()) not in [b"\r\n", b""]:
+            name, _, value = header.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    async def close(self) -> None:
+        '''Closes the connection.'''
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def _worker(args: argparse.Namespace, targets: list[str], latencies: list[float], errors: list[int]) -> None:
+    '''Sends requests on one connection until targets is used up.'''
+    client = await Client.open(args)
+    try:
+        while len(targets) > 0:
+            target = targets.pop()
+            start = time.perf_counter()
+            status, _ = await client.request("GET", target)
+            latencies.append(time.perf_counter()-start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        await client.close()
+
+async def run(args: argparse.Namespace) -> dict:
+    '''Runs the load test and returns the results.'''
+    client = await Client.open(args)
+    _, listing = await client.request("GET", "/list?word=&type=r&limit=5000")
+    await client.close()
+    words = [row[0] for row in listing.get("rows", [])]
+    if len(words) == 0:
+        raise SystemExit("The database has no root words to translate.")
+    rng = random.Random(args.seed)
+    targets = [f"/translate?word={quote(word)}&to=f" for word in rng.choices(words, k=args.requests)]
+
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_worker(args, targets, latencies, errors) for _ in range(args.connections)))
+    elapsed = time.perf_counter()-start
+    results = percentiles(latencies)
+    results["requests_per_sec"] = len(latencies)/elapsed
+    results["errors"] = len(errors)
+    return results
+
+def _spawn(args: argparse.Namespace) -> subprocess.Popen:
+    '''Starts server.py on args.spawn and waits until it accepts connections.'''
+    where = ["--unix", args.unix] if args.unix else ["--host", args.host, "--port", str(args.port)]
+    server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"), "--db", args.spawn, *where])
+    for _ in range(100):
+        try:
+            if args.unix:
+                with socket.socket(socket.AF_UNIX) as probe:
+                    probe.connect(args.unix)
+            else:
+                socket.create_connection((args.host, args.port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit("The server did not start.")
+
+def main(argv: list[str] = None) -> None:
+    '''Command-line entry point.'''
+    parser = argparse.ArgumentParser(description="Load tests a running FiraScript translation server.")
+    parser.add_argument("--host", default="127.0.0.1", help="server address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="server port (default: 8765)")
+    parser.add_argument("--unix", help="connect to this Unix socket instead of a port")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent connections (default: 16)")
+    parser.add_argument("--requests", type=int, default=10000, help="total requests to send (default: 10000)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for choosing the words to translate")
+    parser.add_argument("--spawn", metavar="DB", help="start a server on this database for the test")
+    args = parser.parse_args(argv)
+
+    server = _spawn(args) if args.spawn else None
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    print(f"{results['count']} requests over {args.connections} connections: {results['requests_per_sec']:.0f} requests/sec, "
+          f"{results['errors']} errors")
+    print(f"Latency ms: p50 {results['p50_ms']:.2f}  p90 {results['p90_ms']:.2f}  p99 {results['p99_ms']:.2f}  max {results['max_ms']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,770 @@
+'''
+In-memory lexicon model.
+The tables are loaded once into __slots__ records with interned strings, indexed by dicts, so lookups and writes never
+go to SQLite. ModelRepository answers the same calls as LexiconRepository on top of the model, so Instructions can run
+entirely in memory, and saves the model back to the database when it is closed. Bulk operations (saving, ANALYSE,
+recomputing numbers) read the tables a column at a time.
+Rows keep their rowids, so lookups return rows in the same order as the SQLite queries in repository.STATEMENTS.
+
+Run as `python model.py <db path>` to load a database and print how much memory its model takes.
+'''
+import itertools
+import operator
+import sys
+import time
+import tracemalloc
+from array import array
+from collections import Counter
+from sqlite3 import Connection, Error
+from typing import Callable, Iterable, Iterator
+ # Local imports
+import fs_errors as Fs
+import search
+from repository import COLUMN_COUNTS, LANG_COLUMNS, LISTWORDS_COLUMNS, TABLE_NAMES
+
+def _intern(value):
+    '''Interns strings, so that an English word used by several rows (e.g. the dependencies) is stored once. Other values
+    are returned as they are. Fira words and notes are rarely repeated, so they aren't interned.'''
+    return sys.intern(value) if isinstance(value, str) else value
+
+class RootWord:
+    '''A row of rootWordTable.'''
+    __slots__ = ("rowid", "word_eng", "word_fira", "note")
+    COLUMNS = ("word_eng", "word_fira", "note")
+
+    def __init__(self, rowid: int, word_eng: str, word_fira: str, note: str | None) -> None:
+        self.rowid = rowid
+        self.word_eng = _intern(word_eng)
+        self.word_fira = word_fira
+        self.note = note
+
+    def row(self) -> tuple:
+        '''Returns the values of the row, as SELECT * would.'''
+        return (self.word_eng, self.word_fira, self.note)
+
+class ComplexWord:
+    '''A row of wordTable.'''
+    __slots__ = ("rowid", "word_eng", "word_fira", "formula", "note")
+    COLUMNS = ("word_eng", "word_fira", "formula", "note")
+
+    def __init__(self, rowid: int, word_eng: str, word_fira: str, formula: str, note: str | None) -> None:
+        self.rowid = rowid
+        self.word_eng = _intern(word_eng)
+        self.word_fira = word_fira
+        self.formula = formula
+        self.note = note
+
+    def row(self) -> tuple:
+        '''Returns the values of the row, as SELECT * would.'''
+        return (self.word_eng, self.word_fira, self.formula, self.note)
+
+class NumberWord:
+    '''A row of numTable.'''
+    __slots__ = ("rowid", "value", "word_eng", "word_fira", "note")
+    COLUMNS = ("value", "word_eng", "word_fira", "note")
+
+    def __init__(self, rowid: int, value: int, word_eng: str, word_fira: str, note: str | None) -> None:
+        self.rowid = rowid
+        self.value = value
+        self.word_eng = _intern(word_eng)
+        self.word_fira = word_fira
+        self.note = note
+
+    def row(self) -> tuple:
+        '''Returns the values of the row, as SELECT * would.'''
+        return (self.value, self.word_eng, self.word_fira, self.note)
+
+Record = RootWord | ComplexWord | NumberWord
+RECORD_TYPES = {"root": RootWord, "complex": ComplexWord, "num": NumberWord}
+SQL_COLUMNS = {"wordEng": "word_eng", "wordFira": "word_fira", "note": "note"} # LISTWORDS columns, as record attributes
+UNIQUE_COLUMNS = {"root": "rootWordTable.wordEng, rootWordTable.wordFira", "complex": "wordTable.wordEng, wordTable.wordFira",
+                  "num": "numTable.wordFira"} # Named in the error a Fira update that breaks the constraint raises
+ROWID = operator.attrgetter("rowid")
+MAX_LINK_LIST = 8 # Most dependents (or dependencies) of a word kept in a list before it becomes a set
+
+def _sort_key(value) -> tuple:
+    '''Returns a key that orders values as SQLite does, with numbers before text.'''
+    return (1, value) if isinstance(value, str) else (0, value)
+
+def _index_add(index: dict, key, record: Record) -> None:
+    '''Adds a record to a dict index. A key with one record maps to the record itself, so unique keys cost no list.'''
+    found = index.get(key)
+    if found is None:
+        index[key] = record
+    elif isinstance(found, list):
+        found.append(record)
+        if record.rowid < found[-2].rowid: # Put back by a rollback, or re-added after a change
+            found.sort(key=ROWID)
+    else:
+        index[key] = [found, record] if found.rowid < record.rowid else [record, found]
+
+def _index_remove(index: dict, key, record: Record) -> None:
+    '''Removes a record from a dict index.'''
+    found = index[key]
+    if not isinstance(found, list):
+        del index[key]
+        return
+    found.remove(record)
+    if len(found) == 1:
+        index[key] = found[0]
+
+def _index_get(index: dict, key) -> list[Record]:
+    '''Returns the records with a key, in rowid order.'''
+    found = index.get(key)
+    if found is None:
+        return []
+    return list(found) if isinstance(found, list) else [found]
+
+def _link(links: dict[str, str | list[str] | set[str]], key: str, word: str) -> bool:
+    '''Adds word to the words linked to key. Returns False if it already was.
+    One word is stored as it is and a few in a list, which take far less memory than sets. Only long lists become sets.'''
+    found = links.get(key)
+    if found is None:
+        links[key] = word
+    elif isinstance(found, str):
+        if found == word:
+            return False
+        links[key] = [found, word]
+    elif word in found:
+        return False
+    elif isinstance(found, set):
+        found.add(word)
+    elif len(found) < MAX_LINK_LIST:
+        found.append(word)
+    else:
+        links[key] = {*found, word}
+    return True
+
+def _unlink(links: dict[str, str | list[str] | set[str]], key: str, word: str) -> None:
+    '''Removes word from the words linked to key.'''
+    found = links[key]
+    if isinstance(found, str):
+        del links[key]
+        return
+    found.remove(word)
+    if len(found) == 1:
+        links[key] = next(iter(found))
+
+def _linked(links: dict[str, str | list[str] | set[str]], key: str) -> list[str]:
+    '''Returns the words linked to key.'''
+    found = links.get(key)
+    if found is None:
+        return []
+    return [found] if isinstance(found, str) else list(found)
+
+class Table:
+    '''The records of one table, in rowid order, indexed on the columns that are looked up.'''
+    def __init__(self, table_key: str, indexed: tuple[str, ...]) -> None:
+        self.table_key = table_key
+        self.record_type = RECORD_TYPES[table_key]
+        self._slots: list[Record | None] = [None] # The record with each rowid. None for deleted rows (and rowid 0)
+        self._count = 0
+        self._by_key: list[Record] | None = None # Word records sorted as the primary key index is, built when needed
+        self._indexes = {column: {} for column in indexed}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Record]:
+        '''Yields the records in rowid order.'''
+        return iter([record for record in self._slots if record is not None])
+
+    def find(self, column: str, key) -> list[Record]:
+        '''Returns the records whose column is key, in rowid order.'''
+        return _index_get(self._indexes[column], key)
+
+    def add(self, record: Record) -> None:
+        '''Adds a record. A record without a rowid is given the next one, as SQLite would, and a removed record is put back
+        in its old place.'''
+        if record.rowid == 0:
+            record.rowid = len(self._slots)
+            self._slots.append(record)
+        else:
+            self._slots[record.rowid] = record
+        self._count += 1
+        self._by_key = None
+        for column, index in self._indexes.items():
+            _index_add(index, getattr(record, column), record)
+
+    def remove(self, record: Record) -> None:
+        '''Removes a record.'''
+        self._slots[record.rowid] = None
+        self._count -= 1
+        self._by_key = None
+        for column, index in self._indexes.items():
+            _index_remove(index, getattr(record, column), record)
+
+    def set(self, record: Record, column: str, value) -> None:
+        '''Changes one value of a record, keeping the indexes up to date.'''
+        index = self._indexes.get(column)
+        if index is not None:
+            _index_remove(index, getattr(record, column), record)
+        setattr(record, column, value)
+        self._by_key = None
+        if index is not None:
+            _index_add(index, getattr(record, column), record)
+
+    def by_primary_key(self) -> list[Record]:
+        '''Returns the records of a word table in (wordEng, wordFira) order, the order SQLite scans its primary key index in.'''
+        if self._by_key is None:
+            self._by_key = sorted(self, key=lambda record: (_sort_key(record.word_eng), _sort_key(record.word_fira)))
+        return self._by_key
+
+    def columns(self, *names: str) -> list[list | array]:
+        '''Returns the named columns of every record, in rowid order. Integer columns are packed into arrays.'''
+        records = list(self)
+        return [array("q", map(operator.attrgetter(name), records)) if name == "value" else list(map(operator.attrgetter(name), records))
+                for name in names]
+
+class LexiconModel:
+    '''Every table of a lexicon, in memory.'''
+    def __init__(self) -> None:
+        self.root = Table("root", ("word_eng", "word_fira"))
+        self.complex = Table("complex", ("word_eng", "word_fira"))
+        self.num = Table("num", ("value", "word_eng", "word_fira"))
+        self.dependents: dict[str, str | list[str] | set[str]] = {} # wordEng: the complex words that use it, as stored by _link
+        self.dependencies: dict[str, str | list[str] | set[str]] = {} # The reverse, so a word's dependencies can be forgotten
+        self.imports: dict[str, dict[str, int]] = {} # File: {line: count}
+        self.import_rows: dict[tuple[str, str], list[tuple[str, str]]] = {} # (file, line): [(table key, word)]
+        self.import_users: Counter[tuple[str, str]] = Counter() # (table key, word): lines that define it
+        self.files: dict[str, tuple[str, str, str]] = {} # File applied with IMPORT-ONCE: (hash, stamp, imports)
+        self.progress: dict[str, tuple[str, int]] = {} # File READ ... RESUME didn't finish: (hash, line)
+
+    def table(self, table_key: str) -> Table:
+        '''Returns the table of word or number records.'''
+        return getattr(self, table_key)
+
+    @staticmethod
+    def load(connection: Connection) -> "LexiconModel":
+        '''Reads every table of the database into a new model.'''
+        model = LexiconModel()
+        try:
+            for table_key, record_type in RECORD_TYPES.items():
+                table = model.table(table_key)
+                for row in connection.execute(f"SELECT * FROM {TABLE_NAMES[table_key]} ORDER BY rowid"):
+                    table.add(record_type(0, *row)) # Numbered again from 1, as only the order of the rowids matters
+            for word_eng, dependent in connection.execute(f"SELECT * FROM {TABLE_NAMES['deps']}"):
+                model.add_dependency(word_eng, dependent)
+            for file, line, count in connection.execute(f"SELECT * FROM {TABLE_NAMES['imports']}"):
+                model.imports.setdefault(_intern(file), {})[line] = count
+            for file, line, table_key, word in connection.execute(f"SELECT * FROM {TABLE_NAMES['import_rows']} ORDER BY rowid"):
+                model.add_import_row(file, line, table_key, word)
+            for file, *record in connection.execute(f"SELECT * FROM {TABLE_NAMES['files']}"):
+                model.files[file] = tuple(record)
+            for file, *record in connection.execute(f"SELECT * FROM {TABLE_NAMES['progress']}"):
+                model.progress[file] = tuple(record)
+        except Error as e:
+            raise Fs.FSDatabaseError(f"DATABASE ERROR: Could not load the lexicon: {e}.") from e
+        return model
+
+    def save(self, connection: Connection, table_keys: Iterable[str] = TABLE_NAMES) -> None:
+        '''Replaces the contents of the database's tables (or only those in table_keys) with the model, in one transaction.'''
+        if connection.in_transaction:
+            connection.commit()
+        try:
+            connection.execute("BEGIN")
+            for table_key in [table_key for table_key in TABLE_NAMES if table_key in table_keys]:
+                connection.execute(f"DELETE FROM {TABLE_NAMES[table_key]}")
+                connection.executemany(f"INSERT INTO {TABLE_NAMES[table_key]} VALUES ({', '.join('?'*COLUMN_COUNTS[table_key])})", self.rows(table_key))
+            connection.commit()
+        except Error as e:
+            connection.rollback()
+            raise Fs.FSDatabaseError(f"DATABASE ERROR: Could not save the lexicon: {e}.") from e
+
+    def rows(self, table_key: str) -> Iterable[tuple]:
+        '''Returns the rows of a table, as they are saved.'''
+        match table_key:
+            case "root" | "complex" | "num":
+                table = self.table(table_key)
+                return zip(*table.columns(*table.record_type.COLUMNS))
+            case "deps":
+                return ((word_eng, dependent) for word_eng in self.dependents for dependent in _linked(self.dependents, word_eng))
+            case "imports":
+                return ((file, line, count) for file, lines in self.imports.items() for line, count in lines.items())
+            case "import_rows":
+                return ((file, line, *row) for (file, line), rows in self.import_rows.items() for row in rows)
+            case "files":
+                return ((file, *record) for file, record in self.files.items())
+            case _: # progress
+                return ((file, *record) for file, record in self.progress.items())
+
+    def add_dependency(self, word_eng: str, dependent: str) -> bool:
+        '''Records that dependent uses word_eng. Returns False if it already was.'''
+        word_eng, dependent = _intern(word_eng), _intern(dependent)
+        if not _link(self.dependents, word_eng, dependent):
+            return False
+        _link(self.dependencies, dependent, word_eng)
+        return True
+
+    def remove_dependency(self, word_eng: str, dependent: str) -> None:
+        '''Forgets that dependent uses word_eng.'''
+        _unlink(self.dependents, word_eng, dependent)
+        _unlink(self.dependencies, dependent, word_eng)
+
+    def add_import_row(self, file: str, line: str, table_key: str, word: str) -> None:
+        '''Records that a line of an incrementally read file defined a word.'''
+        self.import_rows.setdefault((_intern(file), line), []).append((_intern(table_key), _intern(word)))
+        self.import_users[(table_key, word)] += 1
+
+    def remove_import_rows(self, file: str, line: str) -> list[tuple[str, str]]:
+        '''Forgets the words a line defined. Returns them.'''
+        rows = self.import_rows.pop((file, line), [])
+        for row in rows:
+            self.import_users[row] -= 1
+            if self.import_users[row] == 0:
+                del self.import_users[row]
+        return rows
+
+class Rows:
+    '''Rows found by ModelRepository.list_words, with the parts of sqlite3.Cursor that callers use.'''
+    def __init__(self, rows: Iterator[tuple]) -> None:
+        self._rows = rows
+
+    def __iter__(self) -> Iterator[tuple]:
+        return self._rows
+
+    def fetchone(self) -> tuple | None:
+        '''Returns the next row, or None.'''
+        return next(self._rows, None)
+
+    def fetchall(self) -> list[tuple]:
+        '''Returns the remaining rows.'''
+        return list(self._rows)
+
+def _matcher(mode: str, word: str, max_distance: int) -> Callable[[str | None], bool]:
+    '''Returns a function that checks a value the way repository._match_condition's SQL condition would.'''
+    match mode:
+        case "EXACT":
+            return lambda text: text == word
+        case "PREFIX" if word == "":
+            return lambda text: text is not None
+        case "PREFIX":
+            bound = search.prefix_bound(word)
+            return lambda text: text is not None and word <= text < bound
+        case "GLOB":
+            return lambda text: search.glob(word, text)
+        case "REGEX":
+            return lambda text: search.regexp(word, text)
+        case "FUZZY":
+            return lambda text: search.fuzzy(word, max_distance, text)
+    raise Fs.FSSyntaxError(f"LISTWORDS ERROR: Invalid MATCH value 「{mode}」.")
+
+class ModelRepository:
+    '''Stand-in for LexiconRepository that reads and writes a LexiconModel, saving it to the connection when closed.
+    Writes made inside a transaction are journalled, so that a rollback can undo them.'''
+    def __init__(self, model: LexiconModel, connection: Connection) -> None:
+        self.model = model
+        self.connection = connection # Where the model is saved. Also used by EXPORT and DEBUG SCHEMA
+        self.depth = 0
+        self.changed: set[str] = set() # Keys of the tables written to since the model was saved
+        self._journal: list[tuple[Callable, tuple]] = [] # Undo steps of the open transaction, oldest first
+        self._savepoints: list[int] = [] # Length of the journal when each open savepoint was opened
+
+     # Transactions
+    @property
+    def in_transaction(self) -> bool:
+        '''Whether a transaction (e.g. from READ) is open.'''
+        return self.depth > 0
+
+    def begin(self) -> None:
+        '''Opens a transaction, or joins the one that is already open.'''
+        self.depth += 1
+
+    def commit(self) -> None:
+        '''Leaves the transaction, keeping its writes if this is the outermost level.'''
+        self.depth -= 1
+        if self.depth == 0:
+            self._journal.clear()
+
+    def rollback(self) -> None:
+        '''Leaves the transaction, undoing its writes if this is the outermost level.'''
+        self.depth -= 1
+        if self.depth == 0:
+            for undo, args in reversed(self._journal):
+                undo(*args)
+            self._journal.clear()
+
+    def checkpoint(self) -> None:
+        '''Keeps what the outermost transaction has written so far, so a rollback no longer undoes it. Does nothing if nested.
+        The model is still only saved to the database when the repository is closed.'''
+        if self.depth == 1:
+            self._journal.clear()
+
+    def savepoint(self) -> None:
+        '''Opens a savepoint inside the open transaction.'''
+        self._savepoints.append(len(self._journal))
+
+    def release_savepoint(self) -> None:
+        '''Closes the latest savepoint, keeping its writes.'''
+        self._savepoints.pop()
+
+    def rollback_to_savepoint(self) -> None:
+        '''Closes the latest savepoint, undoing its writes.'''
+        start = self._savepoints.pop()
+        for undo, args in reversed(self._journal[start:]):
+            undo(*args)
+        del self._journal[start:]
+
+    def flush(self) -> None:
+        '''Saves the model to the database, so that queries run on the connection directly see it.'''
+        if len(self.changed) > 0:
+            self.model.save(self.connection, self.changed)
+            self.changed.clear()
+
+    def close(self) -> None:
+        '''Saves the model and closes the connection.'''
+        self.flush()
+        self.connection.close()
+
+    def _did(self, table_key: str, undo: Callable, *args) -> None:
+        '''Notes a write to a table, and how to undo it if the open transaction is rolled back.'''
+        self.changed.add(table_key)
+        if self.depth > 0:
+            self._journal.append((undo, args))
+
+    def _add(self, table: Table, record: Record) -> None:
+        '''Adds a record.'''
+        table.add(record)
+        self._did(table.table_key, table.remove, record)
+
+    def _remove(self, table: Table, records: list[Record]) -> int:
+        '''Removes records. Returns how many were removed.'''
+        for record in records:
+            table.remove(record)
+            self._did(table.table_key, table.add, record)
+        return len(records)
+
+    def _set_fira(self, table: Table, records: list[Record], word_fira: str) -> int:
+        '''Sets the Fira of records, raising an FSDatabaseError instead if that would break a UNIQUE constraint, as SQLite
+        would. Returns the number of records changed.'''
+        for record in records:
+            if table.table_key == "num":
+                others = table.find("word_fira", word_fira)
+            else:
+                others = [other for other in table.find("word_eng", record.word_eng) if other.word_fira == word_fira]
+            if len(records) > 1 or any(other is not record for other in others):
+                raise Fs.FSDatabaseError(f"DATABASE ERROR: UNIQUE constraint failed: {UNIQUE_COLUMNS[table.table_key]} in {TABLE_NAMES[table.table_key]}.")
+        for record in records:
+            self._did(table.table_key, table.set, record, "word_fira", record.word_fira)
+            table.set(record, "word_fira", word_fira)
+        return len(records)
+
+     # Lookups
+    def lookup_by_eng(self, table_key: str, word_eng: str) -> list[str]:
+        '''Returns the Fira translations of an English word in one table.'''
+        return sorted(record.word_fira for record in self.model.table(table_key).find("word_eng", word_eng)) # As the primary key orders them
+
+    def lookup_by_fira(self, table_key: str, word_fira: str) -> list[str]:
+        '''Returns the English translations of a Fira word in one table.'''
+        return [record.word_eng for record in self.model.table(table_key).find("word_fira", word_fira)]
+
+    def lookup_by_value(self, value: int) -> list[str]:
+        '''Returns the Fira words for a number.'''
+        return [record.word_fira for record in self.model.num.find("value", value)]
+
+    def lookup_many(self, table_key: str, words: list, lang: str) -> dict:
+        '''Translates many words from one table. Returns {word: translation}, keeping the first row for each word.'''
+        if table_key == "num":
+            key_column, value_column = "value", "word_fira"
+        else:
+            key_column, value_column = ("word_fira", "word_eng") if lang == "e" else ("word_eng", "word_fira")
+        table = self.model.table(table_key)
+        found = {}
+        for word in dict.fromkeys(words):
+            records = table.find(key_column, word)
+            if len(records) > 0:
+                found[word] = getattr(records[0], value_column)
+        return found
+
+    def formulas(self, word_eng: str) -> list[tuple[str, str]]:
+        '''Returns (wordFira, formula) for each definition of a complex word.'''
+        return sorted((record.word_fira, record.formula) for record in self.model.complex.find("word_eng", word_eng))
+
+    def all_formulas(self) -> list[tuple[str, str]]:
+        '''Returns (wordEng, formula) for every complex word.'''
+        return list(zip(*self.model.complex.columns("word_eng", "formula")))
+
+    def all_words(self, table_key: str) -> list[tuple[str, str]]:
+        '''Returns (wordEng, wordFira) for every word in a word table.'''
+        return [(record.word_eng, record.word_fira) for record in self.model.table(table_key).by_primary_key()] # As SQLite scans them
+
+    def all_numbers(self) -> list[tuple[int, str]]:
+        '''Returns (value, wordFira) for every number.'''
+        return list(zip(*self.model.num.columns("value", "word_fira")))
+
+    def all_rows(self, table_key: str) -> Iterable[tuple]:
+        '''Returns every row of a word or number table, in the order they were stored.'''
+        return self.model.rows(table_key)
+
+    def dependents(self, word_eng: str) -> list[str]:
+        '''Returns the complex words whose formulas directly use word_eng.'''
+        return sorted(_linked(self.model.dependents, word_eng)) # As the primary key orders them
+
+    def import_lines(self, file: str) -> dict[str, int]:
+        '''Returns {line: number of times it appears} for the last version of a file read with READ ... INCREMENTAL.'''
+        return dict(self.model.imports.get(file, {}))
+
+    def read_progress(self, file: str) -> tuple[str, int] | None:
+        '''Returns (hash of the lines applied, number of lines applied) of a file READ ... RESUME didn't finish, or None.'''
+        return self.model.progress.get(file)
+
+    def file_record(self, file: str) -> tuple[str, str, list[str]] | None:
+        '''Returns (hash, stamp, imported files) of a file applied with IMPORT-ONCE, or None if it never was.'''
+        record = self.model.files.get(file)
+        return (record[0], record[1], record[2].split("\n") if record[2] != "" else []) if record is not None else None
+
+    def import_rows(self, file: str, line: str) -> list[tuple[str, str]]:
+        '''Returns (table key, word) for each word defined by a line of an incrementally read file.'''
+        return list(self.model.import_rows.get((file, line), []))
+
+    def import_row_users(self, table_key: str, word: str) -> int:
+        '''Returns how many lines of incrementally read files define a word.'''
+        return self.model.import_users.get((table_key, word), 0)
+
+    def list_words(self, table_key: str, columns: list[str], word: str = "", lang: str = "", mode: str = "EXACT",
+                   folded: bool = False, max_distance: int = 1, limit: int = -1) -> Rows:
+        '''Returns the rows of a word table that match word, in the order SQLite's query plan would return them.
+        The params are those of LexiconRepository.list_words.'''
+        if not set(columns) <= LISTWORDS_COLUMNS:
+            raise Fs.FSSyntaxError(f"LISTWORDS ERROR: Invalid columns {columns}.")
+        word = search.fold(search.normalise(word)) if folded else search.normalise(word)
+        matches = _matcher(mode, word, max_distance)
+        attributes = [SQL_COLUMNS[column] for column in LANG_COLUMNS[lang]]
+        table = self.model.table(table_key)
+        if mode in ["EXACT", "PREFIX"] and word != "" and not folded and len(attributes) > 0:
+             # Each column's index is searched in turn, skipping the rows an earlier index found
+            records = dict.fromkeys(record for attribute in attributes for record in self._search_index(table, attribute, word, mode, matches))
+        else:
+            values = [operator.attrgetter(attribute) for attribute in attributes]
+            if folded:
+                values = [lambda record, value=value: search.fold_value(value(record)) for value in values]
+             # A scan reads the primary key index if it holds every column selected, or else the table in rowid order.
+             # A search that can use the trigram index reads the rows it finds in rowid order
+            indexed = not folded and len(attributes) > 0 and search.trigram_filter(mode, word, max_distance) is not None
+            scanned = table.by_primary_key() if set(columns) <= {"wordEng", "wordFira"} and not indexed else table
+            records = (record for record in scanned if len(values) == 0 or any(matches(value(record)) for value in values))
+        getters = [operator.attrgetter(SQL_COLUMNS[column]) for column in columns if column != "*"]
+        rows = (record.row() if columns == ["*"] else tuple(getter(record) for getter in getters) for record in records)
+        return Rows(itertools.islice(rows, None if limit == -1 else limit))
+
+    @staticmethod
+    def _search_index(table: Table, attribute: str, word: str, mode: str, matches: Callable[[str | None], bool]) -> list[Record]:
+        '''Returns the records whose attribute is (or, for PREFIX, starts with) word, in the order of the column's index.'''
+        if mode == "EXACT":
+            found = table.find(attribute, word)
+        elif attribute == "word_eng":
+            return [record for record in table.by_primary_key() if matches(record.word_eng)]
+        else:
+            found = [record for record in table if matches(record.word_fira)]
+         # found is in rowid order. The primary key orders rows with the same wordEng by wordFira, and the wordFira index by rowid
+        return sorted(found, key=lambda record: _sort_key(record.word_fira))
+
+     # Writes
+    def insert(self, table_key: str, *values) -> None:
+        '''Adds a row, skipping it if it breaks a constraint (e.g. the word already exists).'''
+        match table_key:
+            case "root" | "complex" | "num":
+                table = self.model.table(table_key)
+                record = table.record_type(0, *values)
+                if any(getattr(record, column) is None for column in table.record_type.COLUMNS if column != "note"):
+                    return
+                if table_key == "num":
+                    if any(len(table.find(column, getattr(record, column))) > 0 for column in ("value", "word_eng", "word_fira")):
+                        return
+                elif any(other.word_fira == record.word_fira for other in table.find("word_eng", record.word_eng)):
+                    return
+                self._add(table, record)
+            case "deps":
+                if self.model.add_dependency(*values):
+                    self._did("deps", self.model.remove_dependency, *values)
+            case "import_rows":
+                file, line, row_table_key, word = values
+                self.model.add_import_row(file, line, row_table_key, word)
+                self._did("import_rows", self._undo_import_row, file, line)
+            case _:
+                raise Fs.FSDatabaseError(f"DATABASE ERROR: Can't insert into {TABLE_NAMES[table_key]} in memory.")
+
+    def _undo_import_row(self, file: str, line: str) -> None:
+        '''Forgets the last word recorded for a line of an incrementally read file.'''
+        rows = self.model.remove_import_rows(file, line)
+        for row in rows[:-1]:
+            self.model.add_import_row(file, line, *row)
+
+    def upsert(self, table_key: str, *values) -> None:
+        '''Adds a row, replacing any row it conflicts with. Only used for importTable, fileTable and progressTable.'''
+        if table_key in ["files", "progress"]:
+            file, *record = values
+            self._did(table_key, self._set_file, table_key, file, getattr(self.model, table_key).get(file))
+            self._set_file(table_key, file, tuple(record))
+            return
+        if table_key != "imports":
+            raise Fs.FSDatabaseError(f"DATABASE ERROR: Can't replace rows of {TABLE_NAMES[table_key]} in memory.")
+        file, line, count = values
+        lines = self.model.imports.setdefault(_intern(file), {})
+        self._did("imports", self._set_import_count, file, line, lines.get(line))
+        self._set_import_count(file, line, count)
+
+    def _set_import_count(self, file: str, line: str, count: int | None) -> None:
+        '''Sets how many times a line appears in an incrementally read file, or forgets the line if count is None.'''
+        lines = self.model.imports.setdefault(_intern(file), {})
+        if count is None:
+            lines.pop(line, None)
+        else:
+            lines[line] = count
+
+    def _set_file(self, table_key: str, file: str, record: tuple | None) -> None:
+        '''Sets the record of a file in fileTable or progressTable, or forgets the file if record is None.'''
+        if record is None:
+            getattr(self.model, table_key).pop(file, None)
+        else:
+            getattr(self.model, table_key)[_intern(file)] = record
+
+    def update_fira(self, table_key: str, word_eng: str, word_fira: str) -> int:
+        '''Sets the Fira translation of every row for an English word. Returns the number of rows changed.'''
+        table = self.model.table(table_key)
+        return self._set_fira(table, table.find("word_eng", word_eng), word_fira)
+
+    def update_complex_fira(self, word_eng: str, old_fira: str, new_fira: str) -> int:
+        '''Changes one computed translation of a complex word. Returns the number of rows changed.'''
+        records = [record for record in self.model.complex.find("word_eng", word_eng) if record.word_fira == old_fira]
+        return self._set_fira(self.model.complex, records, new_fira)
+
+    def update_formula(self, word_eng: str, word_fira: str, formula: str) -> int:
+        '''Changes the stored formula of one complex word. Returns the number of rows changed.'''
+        records = [record for record in self.model.complex.find("word_eng", word_eng) if record.word_fira == word_fira]
+        for record in records:
+            self._did("complex", self.model.complex.set, record, "formula", record.formula)
+            self.model.complex.set(record, "formula", formula)
+        return len(records)
+
+    @staticmethod
+    def _matching(table: Table, word: str, lang: str, mode: str) -> list[Record]:
+        '''Returns the records whose lang columns match word in one of search.PATTERN_MODES, in rowid order.'''
+        matches = _matcher(mode, word, 1)
+        attributes = [SQL_COLUMNS[column] for column in LANG_COLUMNS[lang]]
+        return [record for record in table if any(matches(getattr(record, attribute)) for attribute in attributes)]
+
+    def delete_matching(self, table_key: str, word: str, lang: str, mode: str) -> int:
+        '''Deletes every row of a word table whose lang columns match word. Returns the number of rows deleted.'''
+        table = self.model.table(table_key)
+        return self._remove(table, self._matching(table, search.normalise(word), lang, mode))
+
+    def rewrite_matching(self, table_key: str, word: str, lang: str, mode: str, replacement: str) -> int:
+        '''Rewrites the lang column ("e" or "f") of every row of a word table that matches word, raising an FSDatabaseError
+        instead if two rows would end up the same. Returns the number of rows changed.'''
+        table, word = self.model.table(table_key), search.normalise(word)
+        attribute = SQL_COLUMNS[LANG_COLUMNS[lang][0]]
+        pattern, template = search.substitution(mode, word, replacement)
+        records = self._matching(table, word, lang, mode)
+        changes = [(record, search.substitute(pattern, template, getattr(record, attribute))) for record in records]
+        keys = {(record.word_eng, record.word_fira) for record in table}-{(record.word_eng, record.word_fira) for record in records}
+        for record, value in changes:
+            key = (value, record.word_fira) if attribute == "word_eng" else (record.word_eng, value)
+            if key in keys:
+                raise Fs.FSDatabaseError(f"DATABASE ERROR: UNIQUE constraint failed: {UNIQUE_COLUMNS[table_key]} in {TABLE_NAMES[table_key]}.")
+            keys.add(key)
+        for record, value in changes:
+            self._did(table_key, table.set, record, attribute, getattr(record, attribute))
+            table.set(record, attribute, _intern(value) if attribute == "word_eng" else value)
+        return len(changes)
+
+    def delete_word(self, table_key: str, word: str) -> int:
+        '''Deletes every row where word is either the English or the Fira. Returns the number of rows deleted.'''
+        table = self.model.table(table_key)
+        records = dict.fromkeys(table.find("word_eng", word)+table.find("word_fira", word))
+        return self._remove(table, list(records))
+
+    def update_number(self, value: int, word_fira: str) -> int:
+        '''Changes the Fira of a number. Returns the number of rows changed.'''
+        return self._set_fira(self.model.num, self.model.num.find("value", value), word_fira)
+
+    def delete_eng(self, table_key: str, word: str) -> int:
+        '''Deletes every row of an English word (or a value, for numTable). Returns the number of rows deleted.'''
+        table = self.model.table(table_key)
+        return self._remove(table, table.find("value", int(word)) if table_key == "num" else table.find("word_eng", word))
+
+    def set_import_line(self, file: str, line: str, count: int) -> None:
+        '''Records how many times a line appears in an incrementally read file, forgetting it (and its words) if count is 0.'''
+        if count != 0:
+            self.upsert("imports", file, line, count)
+            return
+        self._did("imports", self._set_import_count, file, line, self.model.imports.get(file, {}).get(line))
+        self._set_import_count(file, line, None)
+        rows = self.model.remove_import_rows(file, line)
+        self._did("import_rows", self._restore_import_rows, file, line, rows)
+
+    def set_progress(self, file: str, digest: str, line: int) -> None:
+        '''Records how far READ ... RESUME has got through a file.'''
+        self.upsert("progress", file, digest, line)
+
+    def clear_progress(self, file: str) -> None:
+        '''Forgets how far READ ... RESUME got through a file, once it has finished.'''
+        if file in self.model.progress:
+            self._did("progress", self._set_file, "progress", file, self.model.progress[file])
+            self._set_file("progress", file, None)
+
+    def set_file_record(self, file: str, digest: str, stamp: str, imports: list[str]) -> None:
+        '''Records that a file was applied with IMPORT-ONCE, and the files it imports.'''
+        self.upsert("files", file, digest, stamp, "\n".join(imports))
+
+    def _restore_import_rows(self, file: str, line: str, rows: list[tuple[str, str]]) -> None:
+        '''Puts back the words a line of an incrementally read file defined.'''
+        for row in rows:
+            self.model.add_import_row(file, line, *row)
+
+    def delete_dependencies(self, dependent: str) -> int:
+        '''Forgets what a complex word depends on.'''
+        words = _linked(self.model.dependencies, dependent)
+        for word_eng in words:
+            self.model.remove_dependency(word_eng, dependent)
+            self._did("deps", self.model.add_dependency, word_eng, dependent)
+        return len(words)
+
+    def delete_all(self, table_key: str) -> int:
+        '''Deletes every row of a table.'''
+        match table_key:
+            case "root" | "complex" | "num":
+                table = self.model.table(table_key)
+                return self._remove(table, list(table))
+            case "deps":
+                pairs = [(word_eng, dependent) for word_eng in self.model.dependents for dependent in _linked(self.model.dependents, word_eng)]
+                for pair in pairs:
+                    self.model.remove_dependency(*pair)
+                    self._did("deps", self.model.add_dependency, *pair)
+                return len(pairs)
+            case "imports":
+                lines = [(file, line, count) for file, counts in self.model.imports.items() for line, count in counts.items()]
+                for file, line, count in lines:
+                    self._set_import_count(file, line, None)
+                    self._did("imports", self._set_import_count, file, line, count)
+                return len(lines)
+            case "import_rows":
+                keys = list(self.model.import_rows)
+                for file, line in keys:
+                    self._did("import_rows", self._restore_import_rows, file, line, self.model.remove_import_rows(file, line))
+                return len(keys)
+            case "files" | "progress":
+                files = list(getattr(self.model, table_key).items())
+                for file, record in files:
+                    self._set_file(table_key, file, None)
+                    self._did(table_key, self._set_file, table_key, file, record)
+                return len(files)
+        return 0
+
+
+if __name__ == "__main__":
+    from zemia import sql
+    from fs import FiraScript
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python model.py <db path>")
+    sql_connection = sql.connect(sys.argv[1])
+    FiraScript.create_tables(sql_connection)
+    tracemalloc.start()
+    start = time.perf_counter()
+    lexicon_model = LexiconModel.load(sql_connection)
+    elapsed = time.perf_counter()-start
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = len(lexicon_model.root)+len(lexicon_model.complex)+len(lexicon_model.num)
+    print(f"Loaded {len(lexicon_model.root)} root, {len(lexicon_model.complex)} complex and {len(lexicon_model.num)} number words in {elapsed:.2f}s.")
+    print(f"Memory: {size/2**20:.1f} MiB ({size/max(rows, 1):.0f} bytes per word), peak {peak/2**20:.1f} MiB while loading.")
@@ -0,0 +1,87 @@
+'''
+Numeral engine for the Fira number system (see understanding_fira.md#Numbers).
+Non-zero digits are listed in order, joined by dashes. A run of zeros is written as 'Zero', followed by the length
+of the run if it is more than one, followed by 'And' if more digits follow.
+'''
+from typing import Callable
+ # Local imports
+import fs_errors as Fs
+
+DIGIT_WORDS = ["Zero", "One", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine"]
+AND_WORD = "And"
+
+def encode(value: int, digits: list[str], and_word: str) -> list[str]:
+    '''Returns the words of a numeral, given the words for each digit (digits[0] is also used for 'Zero') and for 'And'.'''
+    if value < 0:
+        raise Fs.FSSyntaxError(f"NUMERALS ERROR: Negative numbers can't be written in Fira: 「{value}」.")
+    words, zero_count = [], 0
+    for digit in str(value):
+        if digit == "0":
+            zero_count += 1
+            continue
+        if zero_count > 0:
+            words += _zero_run(zero_count, digits, and_word)+[and_word]
+            zero_count = 0
+        words.append(digits[int(digit)])
+    if zero_count > 0: # Trailing zeros
+        words += _zero_run(zero_count, digits, and_word)
+    return words
+
+def _zero_run(count: int, digits: list[str], and_word: str) -> list[str]:
+    '''Returns the words for a run of count zeros.'''
+    return [digits[0]] if count == 1 else [digits[0]]+encode(count, digits, and_word)
+
+def english(value: int) -> str:
+    '''Returns the English form of a numeral, e.g. One-Zero-And-One for 101.'''
+    return "-".join(encode(value, DIGIT_WORDS, AND_WORD))
+
+class NumeralEngine:
+    '''Translates any integer to Fira and back, using digit words looked up once and then reused.'''
+    def __init__(self, lookup: Callable[[str], str]) -> None:
+        self.lookup = lookup # Translates an English word to Fira, raising an FSError if it can't
+        self.generation = -1 # Generation of the translation cache that the forms were loaded at
+        self._digits: list[str] = []
+        self._and = ""
+        self._values: dict[str, int] = {}
+
+    def load(self, generation: int) -> None:
+        '''(Re)loads the Fira digit, Zero and And forms if the lexicon has changed since they were loaded.'''
+        if generation == self.generation and len(self._digits) > 0:
+            return
+        self._digits = [self.lookup(word).lower() for word in DIGIT_WORDS]
+        self._and = self.lookup(AND_WORD).lower()
+        self._values = {word: value for value, word in enumerate(self._digits)}
+        self.generation = generation
+
+    def to_fira(self, value: int) -> str:
+        '''Returns the Fira numeral for value. load must have been called.'''
+        return "-".join(encode(value, self._digits, self._and))
+
+    def to_int(self, numeral: str) -> int:
+        '''Parses a Fira numeral back into an integer. Raises FSSyntaxError if it isn't one. load must have been called.'''
+        words = numeral.lower().split("-")
+        digits, _ = self._parse(words, 0, numeral)
+        return int(digits)
+
+    def _parse(self, words: list[str], i: int, numeral: str) -> tuple[str, int]:
+        '''Parses words from index i until the end or an 'And' that closes a zero count. Returns the digits and the index reached.'''
+        digits = ""
+        while i < len(words):
+            word = words[i]
+            if word == self._digits[0]:
+                count_words = [] # The length of the zero run runs until the next 'And'
+                i += 1
+                while i < len(words) and words[i] != self._and:
+                    count_words.append(words[i])
+                    i += 1
+                count = int(self._parse(count_words, 0, numeral)[0]) if len(count_words) > 0 else 1
+                digits += "0"*count
+                i += 1 # Skip the 'And'
+            elif word in self._values:
+                digits += str(self._values[word])
+                i += 1
+            else:
+                raise Fs.FSSyntaxError(f"NUMERALS ERROR: 「{numeral}」 is not a Fira numeral.")
+        if digits == "":
+            raise Fs.FSSyntaxError(f"NUMERALS ERROR: 「{numeral}」 is not a Fira numeral.")
+        return digits, i
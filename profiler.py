@@ -0,0 +1,133 @@
+'''
+Profiling for DEBUG PROFILE.
+Each command is timed per instruction and per READ file line, along with the SQL statements it ran (counted with the
+connection's trace callback), the rows it changed (total_changes) and how deeply DEBUG recursed.
+Totals are inclusive, so a READ line also counts everything done by the file it reads.
+'''
+import functools
+import json
+import time
+from contextlib import contextmanager
+from sqlite3 import Connection
+from typing import Callable, Iterator
+
+REPORT_COLUMNS = ["calls", "seconds", "statements", "rows", "max_depth"]
+
+class ProfileStats:
+    '''Totals for one instruction or one line of a file.'''
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.max_depth = 0
+
+    def add(self, seconds: float, statements: int, rows: int, depth: int) -> None:
+        '''Adds one run of the command.'''
+        self.calls += 1
+        self.seconds += seconds
+        self.statements += statements
+        self.rows += rows
+        self.max_depth = max(self.max_depth, depth)
+
+    def as_dict(self) -> dict[str, int|float]:
+        '''Returns the totals, keyed on REPORT_COLUMNS.'''
+        return {column: getattr(self, column) for column in REPORT_COLUMNS}
+
+class Profiler:
+    '''Collects ProfileStats while enabled. Does nothing (beyond one check per command) while disabled.'''
+    def __init__(self) -> None:
+        self.enabled = False
+        self.connection: Connection = None
+        self.by_instruction: dict[str, ProfileStats] = {}
+        self.by_line: dict[tuple[str, int], ProfileStats] = {}
+        self.line_text: dict[tuple[str, int], str] = {}
+        self.statements = 0
+        self.depth = 0
+        self.max_depth = 0
+
+    def start(self, connection: Connection) -> None:
+        '''Starts profiling the commands run on connection.'''
+        self.connection = connection
+        self.enabled = True
+        connection.set_trace_callback(self._trace)
+
+    def stop(self) -> None:
+        '''Stops profiling. The collected data is kept until reset.'''
+        self.enabled = False
+        if self.connection is not None:
+            self.connection.set_trace_callback(None)
+
+    def reset(self) -> None:
+        '''Forgets all collected data.'''
+        self.by_instruction.clear()
+        self.by_line.clear()
+        self.line_text.clear()
+
+    def _trace(self, _statement: str) -> None:
+        '''Trace callback, called by sqlite3 for every statement executed.'''
+        self.statements += 1
+
+    @contextmanager
+    def measure(self, instruction: str, source: tuple[str, int] | None = None, text: str = "") -> Iterator[None]:
+        '''Records the time, SQL statements, changed rows and recursion depth of the code run inside the with block.
+        source is the (file, line number) the command was read from, if any.'''
+        if not self.enabled:
+            yield
+            return
+        outer_max_depth, self.max_depth = self.max_depth, 0
+        start_statements, start_changes = self.statements, self.connection.total_changes
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            measured = (time.perf_counter()-start, self.statements-start_statements,
+                        self.connection.total_changes-start_changes, self.max_depth)
+            self.by_instruction.setdefault(instruction, ProfileStats()).add(*measured)
+            if source is not None:
+                self.by_line.setdefault(source, ProfileStats()).add(*measured)
+                self.line_text[source] = text
+            self.max_depth = max(outer_max_depth, self.max_depth)
+
+    def report(self, limit: int = 10) -> list[str]:
+        '''Returns the lines of a report of the instructions and file lines that took the most time.'''
+        header = f"{'calls':>8} {'total ms':>10} {'mean ms':>9} {'SQL':>8} {'rows':>8} {'depth':>5}"
+        def row(stats: ProfileStats) -> str:
+            return (f"{stats.calls:>8} {stats.seconds*1000:>10.2f} {stats.seconds*1000/stats.calls:>9.3f} "
+                    f"{stats.statements:>8} {stats.rows:>8} {stats.max_depth:>5}")
+        lines = [f"{'Instruction':<12} {header}"]
+        for instruction, stats in sorted(self.by_instruction.items(), key=lambda item: -item[1].seconds):
+            lines.append(f"{instruction:<12} {row(stats)}")
+        if len(self.by_line) > 0:
+            lines.append(f"Slowest {min(limit, len(self.by_line))} of {len(self.by_line)} file lines:")
+            lines.append(f"{'':<12} {header}")
+            for source, stats in sorted(self.by_line.items(), key=lambda item: -item[1].seconds)[:limit]:
+                lines.append(f"{'':<12} {row(stats)}  {source[0]}:{source[1]} | {self.line_text[source]}")
+        return lines
+
+    def dump(self, path: str) -> None:
+        '''Writes all collected data to a JSON file.'''
+        data = {
+            "instructions": {instruction: stats.as_dict() for instruction, stats in self.by_instruction.items()},
+            "lines": [
+                {"file": source[0], "line": source[1], "text": self.line_text[source], **stats.as_dict()}
+                for source, stats in sorted(self.by_line.items(), key=lambda item: -item[1].seconds)
+            ],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+def tracks_depth(method: Callable) -> Callable:
+    '''Decorates a (possibly recursive) Instructions method so the profiler records how deep it goes.'''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profiler = self.profiler
+        if not profiler.enabled:
+            return method(self, *args, **kwargs)
+        profiler.depth += 1
+        profiler.max_depth = max(profiler.max_depth, profiler.depth)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            profiler.depth -= 1
+    return wrapper
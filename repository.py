@@ -0,0 +1,441 @@
+'''
+Data-access layer for the FiraScript tables.
+Every query is parameterised and built once in STATEMENTS, so sqlite3's per-connection statement cache
+prepares each access pattern once and reuses it, and words containing quotes are stored safely.
+
+Lexicons in other files can be attached as namespaces and layered over the main one, e.g. draft -> dialect -> main.
+Lookups then go through every layer in one query and the first layer that has the word wins; every other query and
+every write only sees the top layer.
+'''
+from sqlite3 import Connection, Cursor, Error
+ # Local imports
+import fs_errors as Fs
+import search
+from bulk import BulkWriter
+
+TABLE_NAMES = {"root": "rootWordTable", "complex": "wordTable", "num": "numTable", "deps": "dependencyTable",
+               "imports": "importTable", "import_rows": "importRowTable", "files": "fileTable",
+               "progress": "progressTable"}
+WORD_TABLES = ["root", "complex"] # Tables with wordEng/wordFira that TRANSLATE, LISTWORDS and DELETE search
+COLUMN_COUNTS = {"root": 3, "complex": 4, "num": 4, "deps": 2, "imports": 3, "import_rows": 4, "files": 4, "progress": 3}
+
+def _build_statements(namespace: str = "main") -> dict[tuple[str, str], str]:
+    '''Returns the SQL of every access pattern on the tables of one namespace, keyed on (pattern, table key).'''
+    names = {key: name if namespace == "main" else f"{namespace}.{name}" for key, name in TABLE_NAMES.items()}
+    statements = {}
+    for key, name in names.items():
+        placeholders = ", ".join("?"*COLUMN_COUNTS[key])
+        statements[("insert", key)] = f"INSERT OR IGNORE INTO {name} VALUES ({placeholders})"
+        statements[("upsert", key)] = f"INSERT OR REPLACE INTO {name} VALUES ({placeholders})"
+        statements[("delete_all", key)] = f"DELETE FROM {name}"
+    for key in WORD_TABLES:
+        name = names[key]
+        statements[("by_eng", key)] = f"SELECT wordFira FROM {name} WHERE wordEng = ?"
+        statements[("by_fira", key)] = f"SELECT wordEng FROM {name} WHERE wordFira = ?"
+        statements[("update_fira", key)] = f"UPDATE {name} SET wordFira = ? WHERE wordEng = ?"
+        statements[("delete_word", key)] = f"DELETE FROM {name} WHERE wordEng = ? OR wordFira = ?"
+        statements[("delete_eng", key)] = f"DELETE FROM {name} WHERE wordEng = ?"
+        statements[("all_words", key)] = f"SELECT wordEng, wordFira FROM {name}"
+    for key in ["root", "complex", "num"]:
+        statements[("all_rows", key)] = f"SELECT * FROM {names[key]} ORDER BY rowid"
+    statements[("by_value", "num")] = f"SELECT wordFira FROM {names['num']} WHERE value = ?"
+    statements[("delete_eng", "num")] = f"DELETE FROM {names['num']} WHERE value = ?"
+    statements[("all_numbers", "num")] = f"SELECT value, wordFira FROM {names['num']}"
+    statements[("update_number", "num")] = f"UPDATE {names['num']} SET wordFira = ? WHERE value = ?"
+    statements[("formulas", "complex")] = f"SELECT wordFira, formula FROM {names['complex']} WHERE wordEng = ?"
+    statements[("all_formulas", "complex")] = f"SELECT wordEng, formula FROM {names['complex']}"
+    statements[("update_formula", "complex")] = f"UPDATE {names['complex']} SET formula = ? WHERE wordEng = ? AND wordFira = ?"
+    statements[("update_formula_fira", "complex")] = f"UPDATE {names['complex']} SET wordFira = ? WHERE wordEng = ? AND wordFira = ?"
+    statements[("dependents", "deps")] = f"SELECT dependent FROM {names['deps']} WHERE wordEng = ?"
+    statements[("delete_dependent", "deps")] = f"DELETE FROM {names['deps']} WHERE dependent = ?"
+    statements[("lines", "imports")] = f"SELECT line, count FROM {names['imports']} WHERE file = ?"
+    statements[("delete_line", "imports")] = f"DELETE FROM {names['imports']} WHERE file = ? AND line = ?"
+    statements[("rows", "import_rows")] = f"SELECT tableKey, word FROM {names['import_rows']} WHERE file = ? AND line = ?"
+    statements[("delete_line", "import_rows")] = f"DELETE FROM {names['import_rows']} WHERE file = ? AND line = ?"
+    statements[("users", "import_rows")] = f"SELECT COUNT(*) FROM {names['import_rows']} WHERE tableKey = ? AND word = ?"
+    statements[("file", "files")] = f"SELECT hash, stamp, imports FROM {names['files']} WHERE file = ?"
+    statements[("file", "progress")] = f"SELECT hash, line FROM {names['progress']} WHERE file = ?"
+    statements[("delete_file", "progress")] = f"DELETE FROM {names['progress']} WHERE file = ?"
+    return statements
+
+def _layered(select: str, table_name: str, condition: str, order: str, layers: list[str]) -> str:
+    '''Returns a query over the same table in each layer, with the rows of earlier layers first.
+    Each layer has its own copy of the condition's params.'''
+    branches = [f"SELECT {i} AS layer, rowid AS position, {select} FROM {layer}.{table_name} WHERE {condition}"
+                for i, layer in enumerate(layers)]
+    return f"SELECT {select} FROM ({' UNION ALL '.join(branches)}) ORDER BY layer, {order}"
+
+LAYERED = {("by_eng", "root"), ("by_eng", "complex"), ("by_fira", "root"), ("by_fira", "complex"), ("by_value", "num")}
+
+def _build_layered_statements(layers: list[str]) -> dict[tuple[str, str], str]:
+    '''Returns the LAYERED lookups, which go through every layer, in the order each layer's index would return its rows.'''
+    statements = {}
+    for key in WORD_TABLES:
+        statements[("by_eng", key)] = _layered("wordFira", TABLE_NAMES[key], "wordEng = ?", "wordFira", layers)
+        statements[("by_fira", key)] = _layered("wordEng", TABLE_NAMES[key], "wordFira = ?", "position", layers)
+    statements[("by_value", "num")] = _layered("wordFira", "numTable", "value = ?", "position", layers)
+    return statements
+
+STATEMENTS = _build_statements()
+MAX_BATCH = 512 # Most words looked up by one IN (...) query. Batches are padded to a power of 2 so few statements are prepared
+LISTWORDS_COLUMNS = {"*", "wordEng", "wordFira", "note"}
+LANG_COLUMNS = {"": [], "both": ["wordEng", "wordFira"], "e": ["wordEng"], "f": ["wordFira"]} # Columns LISTWORDS searches
+
+def _match_condition(column: str, mode: str, word: str, max_distance: int, folded: bool = False) -> tuple[str, list]:
+    '''Returns the WHERE condition and its params for matching column (folded if asked) against word in one of
+    search.MODES. EXACT and PREFIX are answered from the indexes on wordEng and wordFira (unless the column is folded).
+    FUZZY only calls fira_fuzzy on words of about the right length, which folding doesn't change if they are stable.'''
+    value = f"fira_fold({column})" if folded else column
+    match mode:
+        case "EXACT":
+            return f"{value} = ?", [word]
+        case "PREFIX" if word == "":
+            return f"{value} IS NOT NULL", []
+        case "PREFIX":
+            return f"{value} >= ? AND {value} < ?", [word, search.prefix_bound(word)]
+        case "GLOB":
+            return f"{value} GLOB ?", [word]
+        case "REGEX":
+            return f"fira_regexp(?, {value})", [word]
+        case "FUZZY":
+            length = f"(length({column}) BETWEEN ? AND ? OR {column} GLOB ?)"
+            return f"{length} AND fira_fuzzy(?, ?, {value})", [len(word)-max_distance, len(word)+max_distance, search.UNSTABLE_TEXT, word, max_distance]
+    raise Fs.FSSyntaxError(f"LISTWORDS ERROR: Invalid MATCH value 「{mode}」.")
+
+def _candidates(table: str, word: str, lang: str, mode: str, folded: bool, max_distance: int) -> tuple[str, list]:
+    '''Returns a query for the rowids of a word table's rows that can match word, from its trigram index and the index
+    of its unstable words, and its params, or "" if the index can't be used. Folded values aren't indexed.'''
+    found = search.trigram_filter(mode, word, max_distance) if not folded and lang != "" else None
+    if found is None:
+        return "", []
+    terms, threshold = found
+    columns = f"{{{' '.join(LANG_COLUMNS[lang])}}}"
+    indexed = " UNION ALL ".join(f"SELECT rowid FROM {table}_trigram(?)" for _ in terms)
+    if len(terms) > 1:
+        indexed = f"SELECT rowid FROM ({indexed}) GROUP BY rowid HAVING count(*) >= {threshold}"
+    return f"{indexed} UNION SELECT rowid FROM {table} WHERE {search.UNSTABLE_WORDS}", [f"{columns} : {term}" for term in terms]
+
+def _where(table: str, word: str, lang: str, mode: str, folded: bool = False, max_distance: int = 1) -> tuple[str, list]:
+    '''Returns the WHERE clause and its params for the rows of a word table whose lang columns match word (every row if
+    lang is ""). Where search.trigram_filter can narrow down the rows, only its candidates are read, in rowid order.'''
+    conditions, params = [], []
+    for column in LANG_COLUMNS[lang]:
+        condition, condition_params = _match_condition(column, mode, word, max_distance, folded)
+        conditions.append(f"({condition})")
+        params += condition_params
+    candidates, candidate_params = _candidates(table, word, lang, mode, folded, max_distance)
+    if candidates != "":
+        return f"WHERE rowid IN ({candidates}) AND ({' OR '.join(conditions)})", candidate_params+params
+    return f"WHERE {' OR '.join(conditions)}" if len(conditions) > 0 else "", params
+
+class LexiconRepository:
+    '''Reads and writes words on one connection. Writes go through a BulkWriter while a transaction is open.'''
+    def __init__(self, connection: Connection, batch_size: int = 1000) -> None:
+        self.connection = connection
+        self.bulk = BulkWriter(connection, batch_size)
+        self.layers = ["main"] # Namespaces lookups go through, top first. Everything else only uses the top one
+        self.statements = STATEMENTS
+        search.register(connection)
+
+     # Transactions
+    @property
+    def in_transaction(self) -> bool:
+        '''Whether a transaction (e.g. from READ) is open.'''
+        return self.bulk.active
+
+    def begin(self) -> None:
+        '''Opens a transaction, or joins the one that is already open.'''
+        self.bulk.begin()
+
+    def commit(self) -> None:
+        '''Leaves the transaction, committing it if this is the outermost level.'''
+        self.bulk.commit()
+
+    def rollback(self) -> None:
+        '''Leaves the transaction, rolling it back if this is the outermost level.'''
+        self.bulk.rollback()
+
+    def flush(self) -> None:
+        '''Writes any buffered rows, so that queries run on the connection directly see them.'''
+        if self.bulk.active:
+            self.bulk.flush()
+
+    def checkpoint(self) -> None:
+        '''Commits what the outermost transaction has written so far and carries on in a new one. Does nothing if nested.'''
+        self.bulk.checkpoint()
+
+    def savepoint(self) -> None:
+        '''Opens a savepoint inside the open transaction.'''
+        self.bulk.savepoint()
+
+    def release_savepoint(self) -> None:
+        '''Closes the latest savepoint, keeping its writes.'''
+        self.bulk.release_savepoint()
+
+    def rollback_to_savepoint(self) -> None:
+        '''Closes the latest savepoint, undoing its writes.'''
+        self.bulk.rollback_to_savepoint()
+
+    def close(self) -> None:
+        '''Closes the connection.'''
+        self.connection.close()
+
+     # Namespaces
+    def _table(self, table_key: str) -> str:
+        '''Returns the name of a table in the top layer.'''
+        return TABLE_NAMES[table_key] if self.layers[0] == "main" else f"{self.layers[0]}.{TABLE_NAMES[table_key]}"
+
+    def namespaces(self) -> dict[str, str]:
+        '''Returns {namespace: file} for the main database and each attached one.'''
+        return {row[1]: row[2] for row in self.connection.execute("PRAGMA database_list") if row[1] != "temp"}
+
+    def attach(self, namespace: str, path: str) -> None:
+        '''Attaches the database in a file as a namespace. Its tables must already exist.'''
+        self.flush()
+        try:
+            self.connection.execute(f"ATTACH DATABASE ? AS {namespace}", (path,))
+        except Error as e:
+            raise Fs.FSDatabaseError(f"DATABASE ERROR: Could not attach 「{path}」 as {namespace}: {e}.") from e
+
+    def detach(self, namespace: str) -> None:
+        '''Detaches a namespace that isn't layered.'''
+        try:
+            self.connection.execute(f"DETACH DATABASE {namespace}")
+        except Error as e:
+            raise Fs.FSDatabaseError(f"DATABASE ERROR: Could not detach {namespace}: {e}.") from e
+
+    def set_layers(self, layers: list[str]) -> None:
+        '''Sets the namespaces lookups go through, top first. Writes and every other query use the top one.'''
+        self.flush()
+        self.layers = list(layers)
+        self.statements = _build_statements(layers[0]) if layers[0] != "main" else STATEMENTS
+        if len(layers) > 1:
+            self.statements = {**self.statements, **_build_layered_statements(layers)}
+
+    def merge(self, source: str, target: str) -> list[str]:
+        '''Moves every word, number and dependency of one namespace into another in one set of INSERT ... SELECT
+        statements, replacing the definitions the target had of the same words, and empties the source.
+        Returns the English words that were moved, so what is built from them can be recomputed.'''
+        self.begin()
+        try:
+            self.bulk.flush()
+            moved = [row[0] for key in WORD_TABLES for row in self.connection.execute(f"SELECT DISTINCT wordEng FROM {source}.{TABLE_NAMES[key]}")]
+            for key in WORD_TABLES: # The source's definitions of a word replace all of the target's
+                name = TABLE_NAMES[key]
+                self.connection.execute(f"DELETE FROM {target}.{name} WHERE wordEng IN (SELECT wordEng FROM {source}.{name})")
+            self.connection.execute(f"DELETE FROM {target}.dependencyTable WHERE dependent IN (SELECT wordEng FROM {source}.wordTable)")
+            for key in ["root", "complex", "num", "deps"]:
+                name = TABLE_NAMES[key]
+                self.connection.execute(f"INSERT OR REPLACE INTO {target}.{name} SELECT * FROM {source}.{name} ORDER BY rowid")
+                self.connection.execute(f"DELETE FROM {source}.{name}")
+        except Error as e:
+            self.rollback()
+            raise Fs.FSDatabaseError(f"DATABASE ERROR: Could not merge {source} into {target}: {e}.") from e
+        except Exception:
+            self.rollback()
+            raise
+        self.commit()
+        return moved
+
+    def _read(self, pattern: str, table_key: str, *params) -> list[tuple]:
+        '''Runs a prepared query, after writing any buffered rows so that it sees them.'''
+        if self.bulk.active:
+            self.bulk.flush()
+        if len(self.layers) > 1 and (pattern, table_key) in LAYERED:
+            params *= len(self.layers)
+        return self.connection.execute(self.statements[(pattern, table_key)], params).fetchall()
+
+    def _write(self, pattern: str, table_key: str, *params) -> int:
+        '''Runs a prepared write, committing it unless a transaction is open. Returns the number of rows changed.'''
+        return self._write_sql(self.statements[(pattern, table_key)], params, table_key)
+
+    def _write_sql(self, sql: str, params: tuple | list, table_key: str) -> int:
+        '''Runs a write on a table, committing it unless a transaction is open. Returns the number of rows changed.'''
+        try:
+            if self.bulk.active:
+                return self.bulk.execute(sql, params).rowcount
+            cursor = self.connection.execute(sql, params)
+            self.connection.commit()
+            return cursor.rowcount
+        except Error as e:
+            raise Fs.FSDatabaseError(f"DATABASE ERROR: {e} in {self._table(table_key)}.") from e
+
+     # Lookups
+    def lookup_by_eng(self, table_key: str, word_eng: str) -> list[str]:
+        '''Returns the Fira translations of an English word in one table.'''
+        return [row[0] for row in self._read("by_eng", table_key, word_eng)]
+
+    def lookup_by_fira(self, table_key: str, word_fira: str) -> list[str]:
+        '''Returns the English translations of a Fira word in one table.'''
+        return [row[0] for row in self._read("by_fira", table_key, word_fira)]
+
+    def lookup_by_value(self, value: int) -> list[str]:
+        '''Returns the Fira words for a number.'''
+        return [row[0] for row in self._read("by_value", "num", value)]
+
+    def lookup_many(self, table_key: str, words: list, lang: str) -> dict:
+        '''Translates many words from one table, with one IN (...) query per MAX_BATCH words.
+        lang is the language to translate into ("e" or "f", or "f" for numTable values).
+        Returns {word: translation}, keeping the first row for each word like the single lookups. Words not found are left out.'''
+        if table_key == "num":
+            key_column, value_column = "value", "wordFira"
+        else:
+            key_column, value_column = ("wordFira", "wordEng") if lang == "e" else ("wordEng", "wordFira")
+        if self.bulk.active:
+            self.bulk.flush()
+        found = {}
+        unique = list(dict.fromkeys(words))
+        for start in range(0, len(unique), MAX_BATCH):
+            batch = unique[start:start+MAX_BATCH]
+            size = 1
+            while size < len(batch):
+                size *= 2
+            batch += [batch[0]]*(size-len(batch)) # Padding repeats a word, which doesn't change the result
+            if len(self.layers) == 1:
+                query = f"SELECT {key_column}, {value_column} FROM {self._table(table_key)} WHERE {key_column} IN ({', '.join('?'*size)}) ORDER BY rowid"
+            else:
+                condition = f"{key_column} IN ({', '.join('?'*size)})"
+                query = _layered(f"{key_column}, {value_column}", TABLE_NAMES[table_key], condition, "position", self.layers)
+                batch *= len(self.layers)
+            for key, value in self.connection.execute(query, batch):
+                found.setdefault(key if table_key == "num" else str(key), value) # Words that look like numbers are stored as them
+        return found
+
+    def formulas(self, word_eng: str) -> list[tuple[str, str]]:
+        '''Returns (wordFira, formula) for each definition of a complex word.'''
+        return self._read("formulas", "complex", word_eng)
+
+    def all_formulas(self) -> list[tuple[str, str]]:
+        '''Returns (wordEng, formula) for every complex word.'''
+        return self._read("all_formulas", "complex")
+
+    def all_words(self, table_key: str) -> list[tuple[str, str]]:
+        '''Returns (wordEng, wordFira) for every word in a word table.'''
+        return self._read("all_words", table_key)
+
+    def all_numbers(self) -> list[tuple[int, str]]:
+        '''Returns (value, wordFira) for every number.'''
+        return self._read("all_numbers", "num")
+
+    def all_rows(self, table_key: str) -> Cursor:
+        '''Returns a cursor over every row of a word or number table, in the order they were stored, read as needed.'''
+        if self.bulk.active:
+            self.bulk.flush()
+        return self.connection.execute(self.statements[("all_rows", table_key)])
+
+    def dependents(self, word_eng: str) -> list[str]:
+        '''Returns the complex words whose formulas directly use word_eng.'''
+        return [row[0] for row in self._read("dependents", "deps", word_eng)]
+
+    def import_lines(self, file: str) -> dict[str, int]:
+        '''Returns {line: number of times it appears} for the last version of a file read with READ ... INCREMENTAL.'''
+        return dict(self._read("lines", "imports", file))
+
+    def import_rows(self, file: str, line: str) -> list[tuple[str, str]]:
+        '''Returns (table key, word) for each word defined by a line of an incrementally read file.'''
+        return self._read("rows", "import_rows", file, line)
+
+    def import_row_users(self, table_key: str, word: str) -> int:
+        '''Returns how many lines of incrementally read files define a word.'''
+        return self._read("users", "import_rows", table_key, word)[0][0]
+
+    def file_record(self, file: str) -> tuple[str, str, list[str]] | None:
+        '''Returns (hash, stamp, imported files) of a file applied with IMPORT-ONCE, or None if it never was.'''
+        rows = self._read("file", "files", file)
+        return (rows[0][0], rows[0][1], rows[0][2].split("\n") if rows[0][2] != "" else []) if len(rows) > 0 else None
+
+    def read_progress(self, file: str) -> tuple[str, int] | None:
+        '''Returns (hash of the lines applied, number of lines applied) of a file READ ... RESUME didn't finish, or None.'''
+        rows = self._read("file", "progress", file)
+        return rows[0] if len(rows) > 0 else None
+
+    def list_words(self, table_key: str, columns: list[str], word: str = "", lang: str = "", mode: str = "EXACT",
+                   folded: bool = False, max_distance: int = 1, limit: int = -1) -> Cursor:
+        '''Returns a cursor over the rows of a word table that match word. lang is "" (all rows), "both", "e" or "f".
+        mode is one of search.MODES, folded ignores diacritics and limit caps the number of rows (-1 for no cap).'''
+        if not set(columns) <= LISTWORDS_COLUMNS:
+            raise Fs.FSSyntaxError(f"LISTWORDS ERROR: Invalid columns {columns}.")
+        word = search.fold(search.normalise(word)) if folded else search.normalise(word)
+        where, params = _where(self._table(table_key), word, lang, mode, folded, max_distance)
+        if self.bulk.active:
+            self.bulk.flush()
+        return self.connection.execute(f"SELECT {', '.join(columns)} FROM {self._table(table_key)} {where} LIMIT ?", params+[limit])
+
+     # Writes
+    def insert(self, table_key: str, *values) -> None:
+        '''Adds a row, skipping it if it breaks a constraint (e.g. the word already exists). Buffered inside a transaction.'''
+        if self.bulk.active:
+            self.bulk.add(self._table(table_key), *values)
+        else:
+            self._write("insert", table_key, *values)
+
+    def upsert(self, table_key: str, *values) -> None:
+        '''Adds a row, replacing any row it conflicts with.'''
+        self._write("upsert", table_key, *values)
+
+    def update_fira(self, table_key: str, word_eng: str, word_fira: str) -> int:
+        '''Sets the Fira translation of every row for an English word. Returns the number of rows changed.'''
+        return self._write("update_fira", table_key, word_fira, word_eng)
+
+    def update_complex_fira(self, word_eng: str, old_fira: str, new_fira: str) -> int:
+        '''Changes one computed translation of a complex word. Returns the number of rows changed.'''
+        return self._write("update_formula_fira", "complex", new_fira, word_eng, old_fira)
+
+    def update_formula(self, word_eng: str, word_fira: str, formula: str) -> int:
+        '''Changes the stored formula of one complex word. Returns the number of rows changed.'''
+        return self._write("update_formula", "complex", formula, word_eng, word_fira)
+
+    def delete_matching(self, table_key: str, word: str, lang: str, mode: str) -> int:
+        '''Deletes every row of a word table whose lang columns match word in one of search.PATTERN_MODES, with one
+        statement. Returns the number of rows deleted.'''
+        where, params = _where(self._table(table_key), search.normalise(word), lang, mode)
+        return self._write_sql(f"DELETE FROM {self._table(table_key)} {where}", params, table_key)
+
+    def rewrite_matching(self, table_key: str, word: str, lang: str, mode: str, replacement: str) -> int:
+        '''Rewrites the lang column ("e" or "f") of every row of a word table that matches word, replacing the matched
+        part with replacement as search.substitution describes, with one statement. Returns the number of rows changed.'''
+        word = search.normalise(word)
+        column = LANG_COLUMNS[lang][0]
+        where, params = _where(self._table(table_key), word, lang, mode)
+        sql = f"UPDATE {self._table(table_key)} SET {column} = fira_sub(?, ?, {column}) {where}"
+        return self._write_sql(sql, [*search.substitution(mode, word, replacement), *params], table_key)
+
+    def delete_word(self, table_key: str, word: str) -> int:
+        '''Deletes every row where word is either the English or the Fira. Returns the number of rows deleted.'''
+        return self._write("delete_word", table_key, word, word)
+
+    def update_number(self, value: int, word_fira: str) -> int:
+        '''Changes the Fira of a number. Returns the number of rows changed.'''
+        return self._write("update_number", "num", word_fira, value)
+
+    def delete_eng(self, table_key: str, word: str) -> int:
+        '''Deletes every row of an English word (or a value, for numTable). Returns the number of rows deleted.'''
+        return self._write("delete_eng", table_key, int(word) if table_key == "num" else word)
+
+    def set_import_line(self, file: str, line: str, count: int) -> None:
+        '''Records how many times a line appears in an incrementally read file, forgetting it (and its words) if count is 0.'''
+        if count == 0:
+            self._write("delete_line", "imports", file, line)
+            self._write("delete_line", "import_rows", file, line)
+        else:
+            self.upsert("imports", file, line, count)
+
+    def set_file_record(self, file: str, digest: str, stamp: str, imports: list[str]) -> None:
+        '''Records that a file was applied with IMPORT-ONCE, and the files it imports.'''
+        self.upsert("files", file, digest, stamp, "\n".join(imports))
+
+    def set_progress(self, file: str, digest: str, line: int) -> None:
+        '''Records how far READ ... RESUME has got through a file.'''
+        self.upsert("progress", file, digest, line)
+
+    def clear_progress(self, file: str) -> None:
+        '''Forgets how far READ ... RESUME got through a file, once it has finished.'''
+        self._write("delete_file", "progress", file)
+
+    def delete_dependencies(self, dependent: str) -> int:
+        '''Forgets what a complex word depends on.'''
+        return self._write("delete_dependent", "deps", dependent)
+
+    def delete_all(self, table_key: str) -> int:
+        '''Deletes every row of a table.'''
+        return self._write("delete_all", table_key)
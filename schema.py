@@ -0,0 +1,116 @@
+'''
+Versioning of the FiraScript database schema.
+The version is stored in SQLite's user_version and each migration upgrades the database by one version, in place.
+Run as `python schema.py <db path>` to upgrade a database and check that lookups still use indexes.
+'''
+import sys
+from sqlite3 import Connection, Error
+ # Local imports
+import fs_errors as Fs
+import search
+
+def _trigram_index(table: str) -> list[str]:
+    '''Returns the statements that create and fill an FTS5 trigram index of a word table's wordEng and wordFira, and
+    the triggers that keep it up to date, and index the words it can't be used for. A row left behind by INSERT OR
+    REPLACE (which doesn't fire delete triggers) only makes a search read one more row, and is replaced when its rowid
+    is used again.'''
+    index = f"{table}_trigram"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(wordEng, wordFira, tokenize='trigram', detail=column)",
+        f"INSERT INTO {index} (rowid, wordEng, wordFira) SELECT rowid, wordEng, wordFira FROM {table}",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table} BEGIN DELETE FROM {index} WHERE rowid = new.rowid; "
+        f"INSERT INTO {index} (rowid, wordEng, wordFira) VALUES (new.rowid, new.wordEng, new.wordFira); END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table} BEGIN DELETE FROM {index} WHERE rowid = old.rowid; END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF wordEng, wordFira ON {table} BEGIN "
+        f"UPDATE {index} SET wordEng = new.wordEng, wordFira = new.wordFira WHERE rowid = old.rowid; END",
+        f"CREATE INDEX IF NOT EXISTS {table}_unstable ON {table} (wordEng, wordFira) WHERE {search.UNSTABLE_WORDS}",
+    ]
+
+# Each migration is (version it upgrades to, description, statements). Never edit a released migration - add a new one.
+MIGRATIONS: list[tuple[int, str, list[str]]] = [
+    (1, "Index Fira lookups and dependents", [
+        # wordEng lookups already use the (wordEng, wordFira) primary keys. Words are lowercased before they are stored
+        # or looked up, so these plain indexes are the case-normalised ones.
+        "CREATE INDEX IF NOT EXISTS rootWordTable_wordFira ON rootWordTable (wordFira)",
+        "CREATE INDEX IF NOT EXISTS wordTable_wordFira ON wordTable (wordFira)",
+        "CREATE INDEX IF NOT EXISTS dependencyTable_dependent ON dependencyTable (dependent)",
+    ]),
+    (2, "Index the words defined by incrementally read files", [
+        "CREATE INDEX IF NOT EXISTS importRowTable_line ON importRowTable (file, line)",
+        "CREATE INDEX IF NOT EXISTS importRowTable_word ON importRowTable (tableKey, word)",
+    ]),
+    (3, "Index the trigrams of words for LISTWORDS MATCH REGEX and FUZZY", _trigram_index("rootWordTable")+_trigram_index("wordTable")),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Queries that must be answered with an index, as (description, query). Used by check_query_plans.
+INDEXED_QUERIES: list[tuple[str, str]] = [
+    ("TRANSLATE TO f (root)", "SELECT wordFira FROM rootWordTable WHERE wordEng = ?"),
+    ("TRANSLATE TO f (complex)", "SELECT wordFira FROM wordTable WHERE wordEng = ?"),
+    ("TRANSLATE TO f (number)", "SELECT wordFira FROM numTable WHERE value = ?"),
+    ("TRANSLATE TO e (root)", "SELECT wordEng FROM rootWordTable WHERE wordFira = ?"),
+    ("TRANSLATE TO e (complex)", "SELECT wordEng FROM wordTable WHERE wordFira = ?"),
+    ("LISTWORDS LANG f", "SELECT wordEng, wordFira FROM wordTable WHERE wordFira = ?"),
+    ("LISTWORDS PREFIX (root)", "SELECT wordEng, wordFira FROM rootWordTable WHERE (wordEng >= ? AND wordEng < ?) OR (wordFira >= ? AND wordFira < ?)"),
+    ("LISTWORDS PREFIX (complex)", "SELECT wordEng, wordFira FROM wordTable WHERE (wordEng >= ? AND wordEng < ?) OR (wordFira >= ? AND wordFira < ?)"),
+    ("DELETE (root)", "DELETE FROM rootWordTable WHERE wordEng = ? OR wordFira = ?"),
+    ("DELETE (complex)", "DELETE FROM wordTable WHERE wordEng = ? OR wordFira = ?"),
+    ("DELETE (dependencies)", "DELETE FROM dependencyTable WHERE dependent = ?"),
+    ("UPDATE dependents", "SELECT dependent FROM dependencyTable WHERE wordEng = ?"),
+    ("READ INCREMENTAL lines", "SELECT line, count FROM importTable WHERE file = ?"),
+    ("READ INCREMENTAL rows", "SELECT tableKey, word FROM importRowTable WHERE file = ? AND line = ?"),
+    ("READ INCREMENTAL users", "SELECT COUNT(*) FROM importRowTable WHERE tableKey = ? AND word = ?"),
+    ("IMPORT-ONCE file", "SELECT hash, stamp, imports FROM fileTable WHERE file = ?"),
+    ("READ RESUME progress", "SELECT hash, line FROM progressTable WHERE file = ?"),
+    ("READ INCREMENTAL delete (root)", "DELETE FROM rootWordTable WHERE wordEng = ?"),
+]
+
+def get_version(connection: Connection) -> int:
+    '''Returns the schema version of the database.'''
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(connection: Connection) -> int:
+    '''Upgrades the database to SCHEMA_VERSION, one migration per transaction. Returns the number of migrations applied.'''
+    version = get_version(connection)
+    if version > SCHEMA_VERSION:
+        raise Fs.FSDatabaseError(f"ERROR: Database schema version {version} is newer than this interpreter supports ({SCHEMA_VERSION}).")
+    applied = 0
+    for target, description, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        if connection.in_transaction:
+            connection.commit()
+        try:
+            connection.execute("BEGIN")
+            for statement in statements:
+                connection.execute(statement)
+            connection.execute(f"PRAGMA user_version = {target}")
+            connection.commit()
+        except Error as e:
+            connection.rollback()
+            raise Fs.FSDatabaseError(f"ERROR: Could not upgrade the database to version {target} ({description}): {e}") from e
+        applied += 1
+    return applied
+
+def check_query_plans(connection: Connection) -> list[str]:
+    '''Returns a description of every query in INDEXED_QUERIES that would scan a whole table. Empty if all use indexes.'''
+    problems = []
+    for description, query in INDEXED_QUERIES:
+        params = ["x"]*query.count("?")
+        for row in connection.execute(f"EXPLAIN QUERY PLAN {query}", params):
+            detail = row[-1]
+            if detail.startswith("SCAN"):
+                problems.append(f"{description}: {detail}")
+    return problems
+
+
+if __name__ == "__main__":
+    from zemia import sql
+    from fs import FiraScript
+    sql_connection = sql.connect(sys.argv[1] if len(sys.argv) > 1 else "fira.db")
+    FiraScript.create_tables(sql_connection) # Also migrates
+    print(f"Schema version {get_version(sql_connection)}.")
+    regressions = check_query_plans(sql_connection)
+    for regression in regressions:
+        print(f"Full table scan: {regression}")
+    sys.exit(1 if regressions else 0)
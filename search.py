@@ -0,0 +1,187 @@
+'''
+Word matching used by LISTWORDS, and by the pattern forms of UPDATE and DELETE.
+The matchers are registered on the connection as SQL functions, so SQLite filters and pages the rows itself and they
+are streamed from the cursor instead of being loaded and filtered in Python. Patterns are rewritten the same way, so
+UPDATE changes every matching word with one statement.
+The functions are only called on rows that can match where possible: REGEX reads the rows whose trigram index (kept by
+schema.py's triggers) has every trigram of its literal text, FUZZY the rows that share enough trigrams with the term
+(or, for short terms, words of about the right length), and both also read the few words with unstable characters.
+'''
+import re
+import unicodedata
+from functools import lru_cache
+from sqlite3 import Connection
+from typing import Iterable
+
+MODES = ["EXACT", "PREFIX", "GLOB", "REGEX", "FUZZY"]
+PATTERN_MODES = ["EXACT", "PREFIX", "GLOB", "REGEX"] # Modes UPDATE can rewrite words with
+# Letters with a stroke or bar don't decompose into a base letter and a combining mark, so they are folded by hand
+STROKED_LETTERS = str.maketrans("łŁƶƵđĐħĦŧŦøØıƀɨ", "lLzZdDhHtToOibi")
+# Characters that are already composed and stay one character when lowercased or folded, whose case the trigram index
+# folds the way Python does (but for i and ı, which a regex ignoring case also equates). Words with any other character
+# are always read, using the partial index migration 3 made on UNSTABLE_WORDS - so never change them
+STABLE_CHARACTERS = "\x01-\u012f\u0131-\u02ff\u1e00-\u1eff"
+UNSTABLE_TEXT = f"*[^{STABLE_CHARACTERS}]*" # A GLOB
+UNSTABLE_WORDS = f"wordEng GLOB '{UNSTABLE_TEXT}' OR wordFira GLOB '{UNSTABLE_TEXT}'"
+STABLE = re.compile(f"[{STABLE_CHARACTERS}]")
+TRIGRAM_VARIANTS = {"i": "iı", "ı": "iı"}
+REPEAT = re.compile(r"\{\d*(,\d*)?\}") # A {m,n} repeat. Any other { is literal
+
+def normalise(text: str) -> str:
+    '''Returns text in composed (NFC) form, so that e.g. ş typed as s + cedilla matches the stored ş.'''
+    return unicodedata.normalize("NFC", text)
+
+def fold(text: str) -> str:
+    '''Returns text with its diacritics removed, e.g. ṉonū-şū -> nonu-su. Case is kept.'''
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).translate(STROKED_LETTERS)
+
+def prefix_bound(prefix: str) -> str:
+    '''Returns the smallest string greater than every string that starts with prefix.'''
+    if prefix[-1] == chr(0x10FFFF):
+        return prefix+chr(0x10FFFF)
+    return prefix[:-1]+chr(ord(prefix[-1])+1)
+
+@lru_cache(maxsize=64)
+def compile_pattern(pattern: str) -> re.Pattern:
+    '''Compiles a LISTWORDS regex. Matching ignores case. Raises re.error if the pattern is invalid.'''
+    return re.compile(normalise(pattern), re.IGNORECASE)
+
+@lru_cache(maxsize=64)
+def glob_regex(pattern: str) -> str:
+    '''Returns a regex that matches what SQLite's GLOB matches, with a group for each *, ? and [...] in the pattern.'''
+    parts, i = [], 0
+    while i < len(pattern):
+        char = pattern[i]
+        end = pattern.find("]", i+2) if char == "[" else -1
+        if char == "*":
+            parts.append("(.*)")
+        elif char == "?":
+            parts.append("(.)")
+        elif end != -1: # A class, negated by ^ (or ! as in shells)
+            negated = pattern[i+1] in "^!"
+            members = pattern[i+1+negated:end]
+            parts.append(f"([{'^' if negated else ''}{members.replace(chr(92), chr(92)*2)}])")
+            i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "^"+"".join(parts)+"$"
+
+def glob(pattern: str, text: str | None) -> bool:
+    '''Whether text matches a GLOB pattern, as SQLite's GLOB would (case-sensitive).'''
+    return text is not None and re.fullmatch(glob_regex(pattern), text, re.DOTALL) is not None
+
+def substitution(mode: str, word: str, replacement: str) -> tuple[str, str]:
+    '''Returns the regex and the re.sub template that rewrite a word matched by word in one of PATTERN_MODES.
+    EXACT replaces the whole word, PREFIX the prefix and REGEX every match. Each * or ? in the replacement of a GLOB
+    stands for what the next *, ? or [...] of the pattern matched.'''
+    template = replacement.replace("\\", "\\\\")
+    match mode:
+        case "EXACT":
+            return f"^{re.escape(word)}$", template
+        case "PREFIX":
+            return f"^{re.escape(word)}", template
+        case "GLOB":
+            groups = iter(range(1, re.compile(glob_regex(word)).groups+1))
+            return glob_regex(word), re.sub(r"[*?]", lambda _: f"\\g<{next(groups, 0)}>", template)
+    return word, replacement
+
+def substitute(pattern: str, replacement: str, text: str | None) -> str | None:
+    '''Rewrites every match of a regex from substitution in text. Registered as the SQL function fira_sub(pattern, replacement, text).'''
+    return None if text is None else compile_pattern(pattern).sub(replacement, normalise(str(text))) # Numeric words are stored as numbers
+
+def required_literals(pattern: str) -> list[str]:
+    '''Returns runs of stable characters that every text a regex matches contains (ignoring case). Only literal
+    characters outside groups, classes and optional repeats are used, and a regex with alternatives or flags has none.'''
+    runs, run, depth, i = [], "", 0, 0
+    if "(?" in pattern:
+        return []
+    while i < len(pattern):
+        char, literal = pattern[i], None
+        if char == "[": # Skip the class, whose ] may come first or be escaped
+            i += 2 if pattern[i+1:i+2] == "^" else 1
+            i += 1 if pattern[i:i+1] == "]" else 0
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+        elif char == "\\":
+            i += 1
+            literal = pattern[i:i+1] if not pattern[i:i+1].isalnum() else None # \d, \b, \1... aren't literal
+        elif char in "*?" or char == "{" and REPEAT.match(pattern, i): # The last character is optional
+            run = run[:-1]
+            i = REPEAT.match(pattern, i).end()-1 if char == "{" else i
+            i += 1 if pattern[i+1:i+2] in ["?", "+"] else 0 # Lazy or possessive
+        elif char == "+": # The last character may repeat, so the run goes on from it
+            i += 1 if pattern[i+1:i+2] in ["?", "+"] else 0
+            runs.append(run)
+            literal, run = run[-1:] or None, ""
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return []
+        elif char not in ".^$":
+            literal = char
+        if literal is not None and STABLE.fullmatch(literal) and depth == 0:
+            run += literal
+        else:
+            runs.append(run)
+            run = ""
+        i += 1
+    return [run.lower() for run in runs+[run] if run != ""]
+
+def _trigram_terms(runs: Iterable[str]) -> list[str]:
+    '''Returns an FTS5 query on the trigram index for each distinct trigram of runs of stable characters.'''
+    terms = []
+    for trigram in dict.fromkeys(run[i:i+3] for run in runs for i in range(len(run)-2)):
+        variants = [""]
+        for char in trigram:
+            variants = [variant+other for variant in variants for other in TRIGRAM_VARIANTS.get(char, char)]
+        terms.append("("+" OR ".join('"'+variant.replace('"', '""')+'"' for variant in variants)+")")
+    return terms
+
+def trigram_filter(mode: str, word: str, max_distance: int) -> tuple[list[str], int] | None:
+    '''Returns FTS5 queries on the trigram index and how many of them a stable word must match to match word (a
+    normalised pattern or term) in mode, or None if the index can't narrow down the words. A REGEX needs all of its
+    trigrams, which is one query, and an edit loses at most 3 of a FUZZY term's.'''
+    if mode == "REGEX":
+        terms = _trigram_terms(required_literals(word))
+        return ([" AND ".join(terms)], 1) if len(terms) > 0 else None
+    if mode == "FUZZY":
+        terms = _trigram_terms(re.split(f"[^{STABLE_CHARACTERS}]", word))
+        return (terms, len(terms)-3*max_distance) if len(terms)-3*max_distance > 0 else None
+    return None
+
+def within_distance(term: str, word: str, max_distance: int) -> bool:
+    '''Whether word can be made from term with at most max_distance insertions, deletions or substitutions.'''
+    if abs(len(term)-len(word)) > max_distance:
+        return False
+    previous = list(range(len(word)+1))
+    for i, term_char in enumerate(term, 1):
+        current = [i]
+        for j, word_char in enumerate(word, 1):
+            current.append(min(previous[j]+1, current[j-1]+1, previous[j-1]+(term_char != word_char)))
+        if min(current) > max_distance: # Every later row is at least as far away
+            return False
+        previous = current
+    return previous[-1] <= max_distance
+
+def regexp(pattern: str, text: str | None) -> bool:
+    '''Whether a LISTWORDS regex matches text. Registered as the SQL function fira_regexp(pattern, text).'''
+    return text is not None and compile_pattern(pattern).search(normalise(str(text))) is not None # Numeric words are stored as numbers
+
+def fuzzy(term: str, max_distance: int, text: str | None) -> bool:
+    '''Whether text is within max_distance edits of term. Registered as the SQL function fira_fuzzy(term, max distance, text).'''
+    return text is not None and within_distance(term, normalise(str(text)).lower(), max_distance)
+
+def fold_value(text: str | None) -> str | None:
+    '''Returns a stored value folded for FOLD matching. Registered as the SQL function fira_fold(text).'''
+    return None if text is None else fold(normalise(str(text)))
+
+def register(connection: Connection) -> None:
+    '''Makes fira_regexp, fira_fuzzy, fira_fold and fira_sub available to queries on connection.'''
+    connection.create_function("fira_regexp", 2, regexp, deterministic=True)
+    connection.create_function("fira_fuzzy", 3, fuzzy, deterministic=True)
+    connection.create_function("fira_fold", 1, fold_value, deterministic=True)
+    connection.create_function("fira_sub", 3, substitute, deterministic=True)
@@ -0,0 +1,226 @@
+'''
+Local translation server for FiraScript lexicons.
+Requests are answered over HTTP (on a TCP port or a Unix socket) by an asyncio event loop. Lookups run concurrently on a
+pool of read-only connections to the database in WAL mode, while writes are run one at a time on the only writable connection.
+
+Usage:
+    python server.py [--db fira.db] [--host 127.0.0.1] [--port 8765] [--unix PATH] [--readers N]
+
+Endpoints (all respond with JSON):
+    GET  /translate?word=<word>&to=<e|f>
+    POST /translate                 {"words": [...], "to": "e"|"f"}
+    GET  /list?word=<word>[&lang=e|f][&type=r|c][&match=EXACT|PREFIX|REGEX|FUZZY][&distance=N][&fold=1][&note=1][&limit=N][&offset=N]
+    GET  /numeral?value=<int>  or  /numeral?fira=<numeral>
+    POST /execute                   FiraScript DEFROOT, DEFWORD, DEFNUM, UPDATE and DELETE lines, run in one transaction
+'''
+ # Library imports
+import argparse
+import asyncio
+import io
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from urllib.parse import parse_qs, quote, urlsplit
+ # Local imports
+import fs_errors as Fs
+import fs_parser
+from fs import FiraScript
+from instructions import Instructions
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+LIST_FLAGS = {"fold": "FOLD", "note": "NOTE"} # /list params that map to LISTWORDS subcommands without a value
+LIST_PARAMS = {"lang": "LANG", "type": "TYPE", "limit": "LIMIT", "offset": "OFFSET"}
+ # What POST /execute may run. Other instructions read files, change settings or leave the process, which clients mustn't do
+EXECUTE_INSTRUCTIONS = ["", "#", "DEFROOT", "DEFWORD", "DEFNUM", "UPDATE", "DELETE"]
+
+class ReaderPool:
+    '''Read-only Instructions, each with its own connection, lent to one request at a time.'''
+    def __init__(self, db_path: str, size: int) -> None:
+        self.generation = 0 # Increased after every write, so readers know to drop their cached translations
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="fira-reader")
+        self._idle: asyncio.Queue[tuple[Instructions, int]] = asyncio.Queue()
+        for _ in range(size):
+            connection = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True, check_same_thread=False)
+            instructions = Instructions()
+            instructions.set_connection(connection)
+            self._idle.put_nowait((instructions, self.generation))
+
+    async def run(self, function: Callable, *args):
+        '''Runs function(instructions, *args) on an idle reader's thread and returns the result.'''
+        instructions, generation = await self._idle.get()
+        if generation != self.generation:
+            instructions.cache.clear()
+        generation = self.generation # Anything cached from now on was read after every write up to this one
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, function, instructions, *args)
+        finally:
+            self._idle.put_nowait((instructions, generation))
+
+class Writer:
+    '''The writable connection. Its single thread runs one write at a time.'''
+    def __init__(self, db_path: str) -> None:
+        connection = sqlite3.connect(db_path, check_same_thread=False)
+        FiraScript.create_tables(connection)
+        connection.execute("PRAGMA journal_mode=WAL") # Readers keep reading while a write is in progress
+        self.instructions = Instructions()
+        self.instructions.set_connection(connection)
+        self.instructions.db_path = db_path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fira-writer")
+
+    def _execute(self, text: str) -> str:
+        '''Runs FiraScript lines in one transaction, like READ. Returns what they printed.
+        Raises FSSyntaxError before running any line if one isn't in EXECUTE_INSTRUCTIONS.'''
+        commands = list(fs_parser.parse(text))
+        for line_number, command in enumerate(commands, 1):
+            if command.instruction not in EXECUTE_INSTRUCTIONS:
+                raise Fs.FSSyntaxError(f"ERROR: Error at line {line_number}: Only {', '.join(EXECUTE_INSTRUCTIONS[2:])} can be executed, not 「{command.instruction}」.")
+        output = io.StringIO()
+        repo = self.instructions.repo
+        repo.begin()
+        self.instructions.output = output
+        try:
+            for line_number, command in enumerate(commands, 1):
+                try:
+                    self.instructions.execute(command)
+                except Fs.FSSyntaxError as e:
+                    raise Fs.FSSyntaxError(f"ERROR: Error at line {line_number}: {e}") from e
+        except Exception:
+            repo.rollback()
+            self.instructions.cache.clear()
+            raise
+        finally:
+            self.instructions.output = None
+        repo.commit()
+        return output.getvalue()
+
+    async def execute(self, text: str) -> str:
+        '''Queues FiraScript lines to be run after any writes already queued.'''
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._execute, text)
+
+ # Request handlers. Each runs on a reader thread with that reader's Instructions
+def _translate(instructions: Instructions, word: str, lang: str) -> dict:
+    return {"word": word, "to": lang, "translation": instructions.translate([word, "TO", lang])}
+
+def _translate_many(instructions: Instructions, words: list[str], lang: str) -> dict:
+    translations = instructions.translate_many([word.lower() for word in words], lang)
+    return {"to": lang, "translations": translations, "missing": [word for word in words if word.lower() not in translations]}
+
+def _list(instructions: Instructions, command_list: list[str]) -> dict:
+    return {"rows": [list(row) for row in instructions.search_words(command_list)]}
+
+def _numeral(instructions: Instructions, value: str | None, fira: str | None) -> dict:
+    engine = instructions.numeral_engine()
+    if value is not None:
+        if not value.isdigit():
+            raise Fs.FSSyntaxError(f"NUMERAL ERROR: Invalid value 「{value}」.")
+        return {"value": int(value), "fira": engine.to_fira(int(value))}
+    return {"value": engine.to_int(fira), "fira": fira}
+
+class TranslationServer:
+    '''Parses HTTP requests and routes them to the reader pool or the writer.'''
+    def __init__(self, db_path: str, readers: int) -> None:
+        self.writer = Writer(db_path) # First, so that the tables exist and WAL is on before readers connect
+        self.readers = ReaderPool(db_path, readers)
+
+    async def route(self, method: str, target: str, body: bytes) -> tuple[int, dict]:
+        '''Returns the status and JSON payload of a request.'''
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        match method, url.path:
+            case "GET", "/translate":
+                if "word" not in query:
+                    return 400, {"error": "Missing word."}
+                return 200, await self.readers.run(_translate, query["word"], query.get("to", "f"))
+            case "POST", "/translate":
+                request = json.loads(body or b"{}")
+                if not isinstance(request, dict) or not isinstance(request.get("words"), list) or request.get("to", "f") not in ["e", "f"]:
+                    return 400, {"error": "Expected {\"words\": [...], \"to\": \"e\"|\"f\"}."}
+                return 200, await self.readers.run(_translate_many, [str(word) for word in request["words"]], request.get("to", "f"))
+            case "GET", "/list":
+                command_list = [query.get("word", "")]
+                for param, subcommand in LIST_PARAMS.items():
+                    if param in query:
+                        command_list += [subcommand, query[param]]
+                for param, subcommand in LIST_FLAGS.items():
+                    if query.get(param, "0") not in ["", "0", "false"]:
+                        command_list.append(subcommand)
+                if "match" in query:
+                    command_list += ["MATCH", query["match"].upper()]+([query["distance"]] if "distance" in query else [])
+                return 200, await self.readers.run(_list, command_list)
+            case "GET", "/numeral":
+                if ("value" in query) == ("fira" in query):
+                    return 400, {"error": "Expected one of value or fira."}
+                return 200, await self.readers.run(_numeral, query.get("value"), query.get("fira"))
+            case "POST", "/execute":
+                output = await self.writer.execute(body.decode("utf-8"))
+                self.readers.generation += 1
+                return 200, {"output": output}
+            case _, "/translate" | "/list" | "/numeral" | "/execute":
+                return 405, {"error": f"{method} is not allowed on {url.path}."}
+        return 404, {"error": f"No endpoint {url.path}."}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''Serves the requests sent on one connection, keeping it open between requests.'''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (header := await reader.readline()) not in [b"\r\n", b"\n", b""]:
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                try:
+                    status, payload = await self.route(method, target, body)
+                except Fs.FSError as e:
+                    status, payload = 400, {"error": str(e)}
+                except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                    status, payload = 400, {"error": f"Invalid request body: {e}"}
+                except Exception as e: # pylint: disable=W0718
+                    status, payload = 500, {"error": repr(e)}
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1")+data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError): # Client went away or sent something that isn't HTTP
+            pass
+        finally:
+            writer.close()
+
+async def serve(args: argparse.Namespace) -> None:
+    '''Starts the server and runs it until it is interrupted.'''
+    server = TranslationServer(args.db, args.readers)
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle, path=args.unix)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port)
+        where = f"http://{args.host}:{args.port}"
+    print(f"Serving {args.db} on {where} with {args.readers} readers.", file=sys.stderr, flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+def main(argv: list[str] = None) -> None:
+    '''Command-line entry point.'''
+    parser = argparse.ArgumentParser(description="Serves translations from a FiraScript database.")
+    parser.add_argument("--db", default="fira.db", help="database file to serve (default: fira.db)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of a port")
+    parser.add_argument("--readers", type=int, default=min(8, os.cpu_count() or 1), help="read-only connections to open")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
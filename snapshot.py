@@ -0,0 +1,212 @@
+'''
+Compiled, read-only lexicon snapshots.
+EXPORT SNAPSHOT compiles the word and number tables into one binary file. SnapshotRepository memory-maps it to answer
+translations without opening SQLite: opening one only reads the header, and lookups read the file in place.
+
+Layout (all integers are little-endian u32):
+    header      magic, format version, string count, strings offset, pool offset, pool size, index count
+    indexes     per index: name, entries offset, entry count, slots offset, slot count
+    strings     (pool offset, length) of every distinct string. Each string is stored once, however often it is used
+    pool        the UTF-8 bytes of the strings
+    entries     per index: (key string, value string) pairs, sorted by key
+    slots       per index: open-addressing hash table (crc32 of the key, linear probing) of entry number + 1, 0 if empty
+'''
+import mmap
+import os
+import struct
+import sys
+import zlib
+from sqlite3 import Connection
+from typing import Iterable
+ # Local imports
+import fs_errors as Fs
+
+MAGIC = b"FIRASNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIIIII")
+INDEX = struct.Struct("<16sIIII")
+STRING = struct.Struct("<II")
+ENTRY = struct.Struct("<II")
+SLOT = struct.Struct("<I")
+# Each index is built from (key, value) rows in the order the repository's lookups return them,
+# so the first value stored for a key is the one LexiconRepository would have returned
+INDEX_QUERIES = {
+    "by_eng/root": "SELECT wordEng, wordFira FROM rootWordTable ORDER BY wordEng, wordFira",
+    "by_fira/root": "SELECT wordFira, wordEng FROM rootWordTable ORDER BY wordFira, rowid",
+    "by_eng/complex": "SELECT wordEng, wordFira FROM wordTable ORDER BY wordEng, wordFira",
+    "by_fira/complex": "SELECT wordFira, wordEng FROM wordTable ORDER BY wordFira, rowid",
+    "by_value/num": "SELECT value, wordFira FROM numTable ORDER BY value",
+}
+
+def export(connection: Connection, path: str, index_names: Iterable[str] = INDEX_QUERIES) -> dict[str, int]:
+    '''Compiles the lexicon in the database into a snapshot file, with only the indexes in index_names if given (for
+    snapshots that only need some lookups). Returns the number of entries in each index.'''
+    strings: dict[str, int] = {}
+    def intern(string: str) -> int:
+        return strings.setdefault(string, len(strings))
+
+    indexes = []
+    for name, query in [(name, INDEX_QUERIES[name]) for name in index_names]:
+        first: dict[str, str] = {}
+        for key, value in connection.execute(query):
+            first.setdefault(str(key), str(value)) # Words that look like numbers are stored as them
+        entries = sorted((key.encode("utf-8"), intern(key), intern(value)) for key, value in first.items())
+        slot_count = 1
+        while slot_count < 2*len(entries): # At most half full, so probes stay short
+            slot_count *= 2
+        slots = [0]*slot_count
+        for number, (key_bytes, _, _) in enumerate(entries, 1):
+            slot = zlib.crc32(key_bytes) & (slot_count-1)
+            while slots[slot] != 0:
+                slot = (slot+1) & (slot_count-1)
+            slots[slot] = number
+        indexes.append((name, entries, slots))
+
+    encoded = [string.encode("utf-8") for string in strings]
+    pool = b"".join(encoded)
+    pool += b"\0"*(-len(pool) % 4)
+    strings_offset = HEADER.size+INDEX.size*len(indexes)
+    pool_offset = strings_offset+STRING.size*len(encoded)
+    offset = pool_offset+len(pool)
+
+    parts = [b"", b""] # Header and index table, filled in once the offsets are known
+    index_table = []
+    pool_position = 0
+    string_table = bytearray()
+    for string in encoded:
+        string_table += STRING.pack(pool_position, len(string))
+        pool_position += len(string)
+    parts += [bytes(string_table), pool]
+    for name, entries, slots in indexes:
+        entry_bytes = b"".join(ENTRY.pack(key_id, value_id) for _, key_id, value_id in entries)
+        slot_bytes = struct.pack(f"<{len(slots)}I", *slots)
+        index_table.append(INDEX.pack(name.encode("ascii"), offset, len(entries), offset+len(entry_bytes), len(slots)))
+        parts += [entry_bytes, slot_bytes]
+        offset += len(entry_bytes)+len(slot_bytes)
+    parts[0] = HEADER.pack(MAGIC, FORMAT_VERSION, len(encoded), strings_offset, pool_offset, len(pool), len(indexes))
+    parts[1] = b"".join(index_table)
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.writelines(parts)
+    os.replace(temporary_path, path) # Readers never see a half-written snapshot
+    return {name: len(entries) for name, entries, _ in indexes}
+
+class SnapshotRepository:
+    '''Read-only stand-in for LexiconRepository that answers lookups from a memory-mapped snapshot file.'''
+    def __init__(self, path: str) -> None:
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e: # ValueError if the file is empty
+            raise Fs.FSOSError(f"ERROR: Could not open snapshot 「{path}」: {e}.") from e
+        self._view = memoryview(self._map)
+        if len(self._map) < HEADER.size:
+            raise Fs.FSDatabaseError(f"ERROR: 「{path}」 is not a FiraScript snapshot.")
+        magic, version, _, self._strings_offset, self._pool_offset, _, index_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise Fs.FSDatabaseError(f"ERROR: 「{path}」 is not a FiraScript snapshot.")
+        if version != FORMAT_VERSION:
+            raise Fs.FSDatabaseError(f"ERROR: Snapshot 「{path}」 has format version {version}, expected {FORMAT_VERSION}. Export it again.")
+        self._indexes: dict[str, tuple[int, int, int]] = {}
+        for number in range(index_count):
+            name, entries_offset, _, slots_offset, slot_count = INDEX.unpack_from(self._map, HEADER.size+number*INDEX.size)
+            self._indexes[name.rstrip(b"\0").decode("ascii")] = (entries_offset, slots_offset, slot_count)
+
+    def close(self) -> None:
+        '''Unmaps the file.'''
+        self._view.release()
+        self._map.close()
+
+    def _string(self, string_id: int) -> memoryview:
+        '''Returns the UTF-8 bytes of a string, as a view into the file.'''
+        offset, length = STRING.unpack_from(self._map, self._strings_offset+string_id*STRING.size)
+        start = self._pool_offset+offset
+        return self._view[start:start+length]
+
+    def _get(self, index_name: str, key: str) -> str | None:
+        '''Returns the value stored for key in an index, or None.'''
+        entries_offset, slots_offset, slot_count = self._indexes[index_name]
+        key_bytes = key.encode("utf-8")
+        slot = zlib.crc32(key_bytes) & (slot_count-1)
+        while True:
+            (number,) = SLOT.unpack_from(self._map, slots_offset+slot*SLOT.size)
+            if number == 0:
+                return None
+            key_id, value_id = ENTRY.unpack_from(self._map, entries_offset+(number-1)*ENTRY.size)
+            if self._string(key_id) == key_bytes:
+                return str(self._string(value_id), "utf-8")
+            slot = (slot+1) & (slot_count-1)
+
+     # Transactions. There is nothing to write, so these only let READ run lookup-only files
+    in_transaction = False
+
+    def begin(self) -> None:
+        '''Does nothing.'''
+
+    def commit(self) -> None:
+        '''Does nothing.'''
+
+    def rollback(self) -> None:
+        '''Does nothing.'''
+
+    def flush(self) -> None:
+        '''Does nothing.'''
+
+     # Lookups, as in LexiconRepository
+    def lookup_by_eng(self, table_key: str, word_eng: str) -> list[str]:
+        '''Returns the Fira translation of an English word in one table.'''
+        value = self._get(f"by_eng/{table_key}", word_eng)
+        return [] if value is None else [value]
+
+    def lookup_by_fira(self, table_key: str, word_fira: str) -> list[str]:
+        '''Returns the English translation of a Fira word in one table.'''
+        value = self._get(f"by_fira/{table_key}", word_fira)
+        return [] if value is None else [value]
+
+    def lookup_by_value(self, value: int) -> list[str]:
+        '''Returns the Fira word for a number.'''
+        word = self._get("by_value/num", str(value))
+        return [] if word is None else [word]
+
+    def lookup_many(self, table_key: str, words: list, lang: str) -> dict:
+        '''Translates many words from one table. Returns {word: translation}, leaving out words not found.'''
+        index_name = "by_value/num" if table_key == "num" else f"{'by_fira' if lang == 'e' else 'by_eng'}/{table_key}"
+        found = {}
+        for word in dict.fromkeys(words):
+            value = self._get(index_name, str(word))
+            if value is not None:
+                found[word] = value
+        return found
+
+    def all_words(self, table_key: str) -> list[tuple[str, str]]:
+        '''Returns (wordEng, wordFira) for every Fira word in one table.'''
+        entries_offset, slots_offset, _ = self._indexes[f"by_fira/{table_key}"]
+        words = []
+        for offset in range(entries_offset, slots_offset, ENTRY.size):
+            key_id, value_id = ENTRY.unpack_from(self._map, offset)
+            words.append((str(self._string(value_id), "utf-8"), str(self._string(key_id), "utf-8")))
+        return words
+
+    def _read_only(self, *_args, **_kwargs):
+        '''Raises an FSDatabaseError, as snapshots can only translate.'''
+        raise Fs.FSDatabaseError("DATABASE ERROR: Snapshots are read-only and can only be used to translate.")
+
+    insert = upsert = update_fira = update_complex_fira = delete_word = delete_dependencies = delete_all = _read_only
+    update_formula = delete_matching = rewrite_matching = _read_only
+    list_words = formulas = all_formulas = all_rows = dependents = file_record = set_file_record = _read_only
+    read_progress = set_progress = clear_progress = checkpoint = savepoint = release_savepoint = rollback_to_savepoint = _read_only
+    delete_eng = all_numbers = update_number = import_lines = import_rows = import_row_users = set_import_line = _read_only
+    namespaces = attach = detach = merge = set_layers = _read_only
+    connection = property(_read_only) # DEBUG SCHEMA and PROFILE read the database directly
+
+
+if __name__ == "__main__":
+    from zemia import sql
+    from fs import FiraScript
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python snapshot.py <db path> <snapshot path>")
+    sql_connection = sql.connect(sys.argv[1])
+    FiraScript.create_tables(sql_connection)
+    for index_name, count in export(sql_connection, sys.argv[2]).items():
+        print(f"{index_name}: {count} entries")
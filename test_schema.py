@@ -0,0 +1,33 @@
+'''
+Checks that the lookups in schema.INDEXED_QUERIES are answered with indexes on a freshly created database.
+Run with `python -m unittest test_schema` (or pytest).
+'''
+ # Library imports
+import unittest
+from zemia import sql
+ # Local imports
+import schema
+from fs import FiraScript
+
+class QueryPlanTest(unittest.TestCase):
+    '''Fails if a schema or query change makes an indexed lookup scan a whole table.'''
+    def setUp(self) -> None:
+        self.connection = sql.connect(":memory:")
+        FiraScript.create_tables(self.connection) # Also migrates
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+    def test_latest_version(self) -> None:
+        self.assertEqual(schema.get_version(self.connection), schema.SCHEMA_VERSION)
+
+    def test_no_full_table_scans(self) -> None:
+        self.assertEqual(schema.check_query_plans(self.connection), [])
+
+    def test_scan_is_reported(self) -> None:
+        self.connection.execute("DROP INDEX dependencyTable_dependent")
+        self.assertTrue(any(problem.startswith("DELETE (dependencies)") for problem in schema.check_query_plans(self.connection)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+'''
+Streaming EXPORT and IMPORT of the word and number tables.
+Rows are read from a cursor and written a line at a time, and files are read back a line at a time, so a lexicon of any
+size is moved in constant memory. Three formats are supported:
+    CSV     a header of FIELDS, then one row per word. Fields a table doesn't have are left empty
+    JSONL   one JSON object per word, with the fields of its table
+    FIRA    a FiraScript file of DEFROOT, DEFWORD and DEFNUM lines, each regenerated in canonical form from the stored
+            word or formula. It is imported with READ PARALLEL, which recomputes every word
+CSV and JSONL rows already hold the Fira forms, so IMPORT inserts them as they are, without running any lines.
+'''
+import csv
+import json
+import os
+from typing import Iterable, Iterator
+ # Local imports
+import derivation
+import fs_errors as Fs
+import fs_parser
+
+FORMATS = ["CSV", "JSONL", "FIRA"]
+TABLES = ["root", "complex", "num"] # Exported in this order, so root words are defined before the words built from them
+FIELDS = ["table", "value", "wordEng", "wordFira", "formula", "note"]
+COLUMNS = { # Columns of each table, in the order they are stored
+    "root": ["wordEng", "wordFira", "note"],
+    "complex": ["wordEng", "wordFira", "formula", "note"],
+    "num": ["value", "wordEng", "wordFira", "note"],
+}
+
+def records(repo) -> Iterator[tuple[str, tuple]]:
+    '''Yields (table key, row) for every word and number, table by table in the order the rows were stored.'''
+    for table_key in TABLES:
+        for row in repo.all_rows(table_key):
+            yield table_key, row
+
+def _fira_line(table_key: str, row: tuple) -> str:
+    '''Returns the canonical FiraScript line that defines a row.'''
+    fields = dict(zip(COLUMNS[table_key], row))
+    note = ["NOTE", fields["note"]] if fields["note"] not in ["", None] else []
+    match table_key:
+        case "root":
+            params = [fields["wordEng"], str(fields["wordFira"]), *note]
+        case "num":
+            params = [fields["wordEng"], str(fields["value"]), *note]
+        case _:
+            try:
+                return derivation.to_line(derivation.compile_formula(fields["formula"]))
+            except (Fs.FSError, ValueError): # Can't be written more canonically than it was
+                return fields["formula"]
+    return " ".join([f"DEF{table_key.upper()}", *(fs_parser.quote(param) for param in params)])
+
+def _lines(file_format: str, rows: Iterable[tuple[str, tuple]]) -> Iterator[str]:
+    '''Yields the lines of an export file, each ending in a newline.'''
+    match file_format:
+        case "CSV":
+            buffer = _LineBuffer()
+            writer = csv.DictWriter(buffer, FIELDS, lineterminator="\n")
+            writer.writeheader()
+            yield buffer.pop()
+            for table_key, row in rows:
+                writer.writerow({"table": table_key, **dict(zip(COLUMNS[table_key], row))})
+                yield buffer.pop()
+        case "JSONL":
+            for table_key, row in rows:
+                yield json.dumps({"table": table_key, **dict(zip(COLUMNS[table_key], row))}, ensure_ascii=False)+"\n"
+        case "FIRA":
+            yield "# Exported from a FiraScript database\n"
+            for table_key, row in rows:
+                yield _fira_line(table_key, row)+"\n"
+
+class _LineBuffer:
+    '''File-like target for csv.writer that hands back each line as soon as it is written.'''
+    def __init__(self) -> None:
+        self.text = ""
+
+    def write(self, text: str) -> None:
+        self.text += text
+
+    def pop(self) -> str:
+        text, self.text = self.text, ""
+        return text
+
+def export(repo, file_format: str, path: str) -> int:
+    '''Writes every word and number to a file in one of FORMATS. Returns the number of rows written.'''
+    count = 0
+    def counted(rows: Iterable[tuple[str, tuple]]) -> Iterator[tuple[str, tuple]]:
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8", newline="") as f:
+        f.writelines(_lines(file_format, counted(records(repo))))
+    os.replace(temporary_path, path) # Readers never see a half-written export
+    return count
+
+def _check(fields: dict, where: str) -> tuple[str, tuple]:
+    '''Returns (table key, row) for the fields of an imported record. Raises FSSyntaxError if they are invalid.'''
+    table_key = fields.get("table")
+    if table_key not in TABLES:
+        raise Fs.FSSyntaxError(f"IMPORT ERROR: Invalid table 「{table_key}」 {where}.")
+    values = {column: fields.get(column) for column in COLUMNS[table_key]}
+    values["note"] = values["note"] or ""
+    for column in ["wordEng", "wordFira"]:
+        if isinstance(values[column], (int, float)): # A Fira word SQLite stored as a number
+            values[column] = str(values[column])
+        if not isinstance(values[column], str) or (column == "wordEng" and values[column] == ""): # Some words have no Fira
+            raise Fs.FSSyntaxError(f"IMPORT ERROR: Missing {column} {where}.")
+        values[column] = values[column].lower()
+    match table_key:
+        case "complex":
+            if not isinstance(values["formula"], str):
+                raise Fs.FSSyntaxError(f"IMPORT ERROR: Missing formula {where}.")
+            try:
+                derivation.compile_formula(values["formula"])
+            except Fs.FSError as e:
+                raise Fs.FSSyntaxError(f"IMPORT ERROR: Invalid formula {where}: {e}") from e
+        case "num":
+            try:
+                values["value"] = int(values["value"])
+            except (TypeError, ValueError) as e:
+                raise Fs.FSSyntaxError(f"IMPORT ERROR: Invalid value 「{values['value']}」 {where}.") from e
+    return table_key, tuple(values[column] for column in COLUMNS[table_key])
+
+def read_records(file_format: str, path: str) -> Iterator[tuple[str, tuple]]:
+    '''Yields (table key, row) for each record of a CSV or JSONL export, checking each as it is read.
+    Raises FSSyntaxError, naming the line, at the first invalid record.'''
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            if file_format == "CSV":
+                reader = csv.DictReader(f)
+                if reader.fieldnames is None or not {"table", "wordEng", "wordFira"} <= set(reader.fieldnames):
+                    raise Fs.FSSyntaxError(f"IMPORT ERROR: 「{path}」 has no header of {', '.join(FIELDS)}.")
+                for fields in reader:
+                    yield _check(fields, f"in 「{path}」 at line {reader.line_num}")
+                return
+            for line_number, line in enumerate(f, 1):
+                if line.strip() == "":
+                    continue
+                try:
+                    fields = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise Fs.FSSyntaxError(f"IMPORT ERROR: Invalid JSON in 「{path}」 at line {line_number}: {e}.") from e
+                if not isinstance(fields, dict):
+                    raise Fs.FSSyntaxError(f"IMPORT ERROR: Expected an object in 「{path}」 at line {line_number}.")
+                yield _check(fields, f"in 「{path}」 at line {line_number}")
+    except FileNotFoundError as e:
+        raise Fs.FSSyntaxError(f"IMPORT ERROR: File not found: 「{path}」.") from e
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise Fs.FSOSError(f"IMPORT ERROR: Could not read 「{path}」: {e}.") from e
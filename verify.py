@@ -0,0 +1,184 @@
+'''
+Parallel audit of complex words for VERIFY.
+Every stored formula is compiled and evaluated again against the current lexicon, and the result is compared with the
+stored Fira. The lexicon is compiled into a snapshot first, so that a pool of worker processes can look words up in it
+at the same time without SQLite: each worker memory-maps the snapshot once and evaluates a chunk of formulas at a time.
+Words are looked up as TRANSLATE <word> TO f would, so a word is only reported if running its line again would change it.
+
+Findings:
+    DRIFT       the formula now gives a different Fira form than the one stored
+    MISSING     a word the formula uses can't be translated
+    INVALID     the stored formula isn't a valid DEFWORD line
+    CYCLE       complex words whose formulas use each other
+'''
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Iterable, Iterator, NamedTuple
+ # Local imports
+import derivation
+import fs_errors as Fs
+from numerals import NumeralEngine
+from repository import WORD_TABLES
+from snapshot import SnapshotRepository
+
+CHUNK_SIZE = 4096 # Formulas sent to a worker at a time
+KINDS = ["DRIFT", "MISSING", "INVALID", "CYCLE"]
+INDEXES = ["by_eng/root", "by_eng/complex", "by_value/num"] # The snapshot indexes lookup uses
+_snapshot: SnapshotRepository | None = None # Opened once in each process by open_snapshot
+_numerals: NumeralEngine | None = None
+_found: dict[str, tuple[str, str]] = {} # English word: (table key, Fira) of the words looked up so far
+
+class Finding(NamedTuple):
+    '''A complex word whose stored Fira doesn't agree with its formula.'''
+    kind: str # One of KINDS
+    word_eng: str
+    word_fira: str # As stored
+    detail: str # The Fira the formula gives now for DRIFT, otherwise what is wrong
+
+    def __str__(self) -> str:
+        if self.kind == "DRIFT":
+            return f"DRIFT {self.word_eng}: stored 「{self.word_fira}」, formula gives 「{self.detail}」"
+        return f"{self.kind} {self.word_eng}: {self.detail}"
+
+def open_snapshot(path: str) -> None:
+    '''Opens the snapshot that this process looks words up in.'''
+    global _snapshot, _numerals
+    _snapshot = SnapshotRepository(path)
+    _numerals = NumeralEngine(lookup)
+    _found.clear()
+
+def close_snapshot() -> None:
+    '''Closes the snapshot opened by open_snapshot.'''
+    global _snapshot, _numerals
+    if _snapshot is not None:
+        _snapshot.close()
+    _snapshot, _numerals = None, None
+    _found.clear()
+
+def _find(key: str) -> tuple[str, str] | None:
+    '''Returns (table key, Fira) of a lowercase English word as TRANSLATE <word> TO f would find it, or None.'''
+    if key not in _found:
+        for table_key in WORD_TABLES:
+            found = _snapshot.lookup_by_eng(table_key, key)
+            if table_key == "complex" and key.isascii() and key.isdigit():
+                found = _snapshot.lookup_by_value(int(key)) or found
+            if len(found) > 0:
+                _found[key] = (table_key, found[0])
+                break
+        else:
+            return None
+    return _found[key]
+
+def lookup(word: str) -> str:
+    '''Translates an English word to Fira as TRANSLATE <word> TO f would. Raises FSSyntaxError if it can't.'''
+    found = _find(word.lower())
+    if found is not None:
+        return found[1]
+    if word.isascii() and word.isdigit(): # Numbers don't need to be stored
+        try:
+            _numerals.load(0)
+            return _numerals.to_fira(int(word))
+        except Fs.FSError:
+            pass
+    raise Fs.FSSyntaxError(f"TRANSLATE ERROR: No translation found for 「{word} TO f」.")
+
+def _check_chunk(rows: list[tuple[str, str, str]]) -> tuple[list[Finding], list[tuple[str, list[str]]]]:
+    '''Evaluates a chunk of (wordEng, wordFira, formula) rows. Returns the findings and, for each word that uses other
+    complex words, (word, those words), from which cycles are found.'''
+    findings, uses = [], []
+    for word_eng, word_fira, formula in rows:
+        word_fira = str(word_fira)
+        try:
+            plan = derivation.compile_formula(formula, cache=False)
+        except Fs.FSError as e:
+            findings.append(Finding("INVALID", word_eng, word_fira, str(e)))
+            continue
+        try:
+            expected = derivation.assemble(plan, derivation.resolve(plan, lookup)).lower()
+        except Fs.FSError as e:
+            findings.append(Finding("MISSING", word_eng, word_fira, str(e)))
+            continue
+        if expected != word_fira:
+            findings.append(Finding("DRIFT", word_eng, word_fira, expected))
+        complex_words = []
+        for word in dict.fromkeys(word.lower() for word in plan.dependencies):
+            found = _find(word) # None for numbers translated without being stored
+            if found is not None and found[0] == "complex":
+                complex_words.append(word)
+        if len(complex_words) > 0:
+            uses.append((word_eng, complex_words))
+    return findings, uses
+
+def _chunks(rows: Iterable[tuple]) -> Iterator[list[tuple]]:
+    '''Groups rows into lists of CHUNK_SIZE.'''
+    chunk = []
+    for row in rows:
+        chunk.append(row[:3])
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+def _results(pool: Executor | None, rows: Iterable[tuple], jobs: int) -> Iterator[tuple[list[Finding], list]]:
+    '''Yields the results of _check_chunk over rows in order, with at most two chunks per worker in flight.'''
+    if pool is None:
+        yield from map(_check_chunk, _chunks(rows))
+        return
+    pending: deque[Future] = deque()
+    for chunk in _chunks(rows):
+        pending.append(pool.submit(_check_chunk, chunk))
+        if len(pending) >= 2*jobs:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def cycles(uses: dict[str, list[str]]) -> list[list[str]]:
+    '''Returns each cycle in the graph of complex words and the complex words they use, as the words around it, once.'''
+    found, state = [], {} # word: 1 while on the path, 2 when done
+    for start in uses:
+        if start in state:
+            continue
+        path, stack = [start], [iter(uses.get(start, []))]
+        state[start] = 1
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                state[path.pop()] = 2
+                stack.pop()
+            elif state.get(child) == 1:
+                found.append(path[path.index(child):]+[child])
+            elif child not in state:
+                state[child] = 1
+                path.append(child)
+                stack.append(iter(uses.get(child, [])))
+    return found
+
+def verify(rows: Iterable[tuple], snapshot_path: str, jobs: int = 1) -> tuple[int, list[Finding], set[str]]:
+    '''Checks (wordEng, wordFira, formula, ...) rows of wordTable against a snapshot of the lexicon with jobs worker
+    processes. Returns the number of rows checked, the findings (cycles last) and the words that are part of a cycle.'''
+    checked, findings, uses = 0, [], {}
+    def counted(rows: Iterable[tuple]) -> Iterator[tuple]:
+        nonlocal checked
+        for row in rows:
+            checked += 1
+            yield row
+
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=open_snapshot, initargs=(snapshot_path,)) if jobs > 1 else None
+    if pool is None:
+        open_snapshot(snapshot_path)
+    try:
+        for chunk_findings, chunk_uses in _results(pool, counted(rows), jobs):
+            findings += chunk_findings
+            for word_eng, words in chunk_uses:
+                uses.setdefault(word_eng, []).extend(words)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        else:
+            close_snapshot()
+    cyclic = set()
+    for cycle in cycles(uses):
+        findings.append(Finding("CYCLE", cycle[0], "", " -> ".join(cycle)))
+        cyclic.update(cycle)
+    return checked, findings, cyclic